@@ -18,30 +18,150 @@ PDB="$BASE_DIR/pdb/complex.pdb"
 rec_chains="B"
 # 配体蛋白链（改造目标）
 lig_chains="A"
+#批量模式：复合物清单（CSV 表头 pdb,rec_chains,lig_chains，或同样字段的 YAML 列表），设置后忽略上面三项，
+#清单中的所有复合物由同一个调度器在 THREAD 个核上交错执行，各自输出到 out/<name>_out
+MANIFEST=""
 #并行线程数
 THREAD=20
+#调度方式：dag（按任务依赖并发执行各模块）/ serial（按顺序依次执行）
+SCHEDULER="dag"
+#结果缓存目录（跨运行共享，留空则关闭缓存）及容量上限（超出后按最近最少使用淘汰）
+CACHE_DIR="$BASE_DIR/cache"
+CACHE_MAX_SIZE="200G"
+#FoldX 能量小文件合并为 NPZ 存储后是否删除原 .fxout 文件（1 删除 / 0 保留）
+FXOUT_CLEANUP=0
+#自适应构象采样（1 开启 / 0 关闭）：WT/突变体精修与对接按批生成构象，最优打分收敛后提前停止，nstruct 作为上限
+ADAPTIVE_SAMPLING=0
+#突变体评估步骤[4]-[7]逐突变体流水线执行（1）/ 按步骤整体执行（0），步骤[8]随后对全部结构批量执行
+MUTANT_PIPELINE=1
+#外部程序资源记录（1 开启 / 0 关闭）：每次调用的耗时、CPU、峰值内存写入 log/<name>_trace.jsonl，结束时输出汇总
+TRACE=1
+#内存预算（略低于 --mem，留空则不限制）：relax/docking/FoldX 等按以往的峰值内存准入，预计超出预算时等待
+MEM_BUDGET="60G"
+#尚无峰值记录的程序按此预留内存
+MEM_DEFAULT_JOB="2G"
+#外部程序超时（如 "24h"，可按程序分别设置 "docking_protocol=48h,PositionScan=2h,24h"，留空不限时）与失败重试次数（重试时换用新随机种子）
+JOB_TIMEOUT="24h"
+JOB_RETRIES=2
+#分片采样末尾为落后的分片在空闲核上启动副本，先完成者胜出（1 开启 / 0 关闭）
+SPECULATE=1
+#突变体评估步骤[4]-[7]的执行后端：local（在本作业内运行）/ slurm（各突变体的任务以作业数组提交，可分布到多个节点，out/ 需位于共享文件系统）
+BACKEND="local"
+#slurm 后端：同时占用的核数上限与附加的 sbatch 参数（每个数组任务的 --cpus-per-task 由调度器按任务分配）
+SLURM_CORES=200
+SLURM_ARGS="--mem=8G --time=2-00:00:00"
+#节点本地暂存（1 开启 / 0 关闭）：FoldX 扫描、FixBB/精修/对接分片、界面评估在本地目录中运行，只把打分和最优构象写回 out/
+STAGING=1
+#暂存目录（留空则使用运行节点的 $TMPDIR，再缺省为 /tmp）
+SCRATCH_DIR=""
+#PLIP 界面裁剪（Å，0 关闭）：只保留距另一侧重原子不超过该距离的残基再运行 PLIP，大受体可明显缩短互作分析时间
+PLIP_CROP=0
+#结构坐标库（1 开启 / 0 关闭）：评估结束后把突变体、精修与对接构象打包为 out/<name>_out/structures.trim（内存映射，供分析工具直接读取）
+COORD_STORE=0
+#对接构象聚类（1 开启 / 0 关闭）：步骤[7]按界面 RMSD 聚类每个突变体的全部对接构象，取平均总分最低且成员足够多的一类的中心构象，代替单个最低分构象
+CLUSTER_DECOYS=1
 #======================================================================================
 
 
+export TRIM_CACHE_DIR="$CACHE_DIR"
+export TRIM_CACHE_MAX_SIZE="$CACHE_MAX_SIZE"
+export TRIM_FXOUT_CLEANUP="$FXOUT_CLEANUP"
+export TRIM_ADAPTIVE_SAMPLING="$ADAPTIVE_SAMPLING"
+export TRIM_MUTANT_PIPELINE="$MUTANT_PIPELINE"
+export TRIM_MEM_BUDGET="$MEM_BUDGET"
+export TRIM_MEM_DEFAULT="$MEM_DEFAULT_JOB"
+export TRIM_JOB_TIMEOUT="$JOB_TIMEOUT"
+export TRIM_JOB_RETRIES="$JOB_RETRIES"
+export TRIM_SPECULATE="$SPECULATE"
+export TRIM_BACKEND="$BACKEND"
+export TRIM_SLURM_CORES="$SLURM_CORES"
+export TRIM_SLURM_ARGS="$SLURM_ARGS"
+export TRIM_STAGING="$STAGING"
+export TRIM_SCRATCH="$SCRATCH_DIR"
+export TRIM_PLIP_CROP="$PLIP_CROP"
+export TRIM_COORD_STORE="$COORD_STORE"
+export TRIM_CLUSTER_DECOYS="$CLUSTER_DECOYS"
+
 OUTDIR="$BASE_DIR/out"
 pdb_name=$(basename "$PDB" .pdb)
+# 本次运行的名称（日志、资源记录）：单个复合物为结构名，批量模式为清单文件名
+run_name="$pdb_name"
+[[ -n "$MANIFEST" ]] && run_name=$(basename "${MANIFEST%.*}")
+trace="$BASE_DIR/log/${run_name}_trace.jsonl"
+run_start=$(date +%s)
+[[ "$TRACE" == "1" ]] && export TRIM_TRACE="$trace"
+
+echo "============== Processing $run_name =============="
+exec 1>>"$BASE_DIR/log/${run_name}.out" 2>>"$BASE_DIR/log/${run_name}.err"
+if [[ -n "$MANIFEST" ]]; then
+    # 批量模式：内存账本与失败清单由清单中的所有复合物共用
+    mkdir -p "$OUTDIR"
+    export TRIM_MEM_LEDGER="$OUTDIR/.mem_ledger.json"
+    failures="$OUTDIR/${run_name}_failed_jobs.tsv"
+else
+    out="$OUTDIR/${pdb_name}_out"
+    mkdir -p "$out"
+    # 各程序的内存峰值记录与运行中任务的预留（同一复合物的多次运行共用）
+    export TRIM_MEM_LEDGER="$out/.mem_ledger.json"
 
-echo "============== Processing $pdb_name =============="
-exec 1>>"$BASE_DIR/log/${pdb_name}.out" 2>>"$BASE_DIR/log/${pdb_name}.err"
-out="$OUTDIR/${pdb_name}_out"
-mkdir -p "$out"
+    mutout="$out/mutation"
+    energy_out="$out/energy"
+    result="$out/result"
+    mkdir -p "$mutout" "$energy_out" "$result"
+    failures="$result/failed_jobs.tsv"
+fi
+# 失败清单：本次运行中重试后仍失败的任务及原因
+rm -f "$failures"
+export TRIM_FAILURES="$failures"
 
-mutout="$out/mutation"
-energy_out="$out/energy"
-result="$out/result"
-mkdir -p "$mutout" "$energy_out" "$result"
+if [[ -n "$MANIFEST" ]]; then
+    # 批量模式：所有复合物的任务放入同一任务图，共享THREAD个核
+    source $CONDA_BASE/etc/profile.d/conda.sh
+    conda activate trim
+    python $BASE_DIR/tools/dag_runner.py \
+        --manifest "$MANIFEST" \
+        --outdir "$OUTDIR" \
+        --base-dir "$BASE_DIR" \
+        --conda-base "$CONDA_BASE" \
+        --foldx "$FOLDX_DIR" \
+        --rosetta "$ROSETTA_DIR" \
+        --threads "$THREAD"
+    conda deactivate
+elif [[ "$SCHEDULER" == "dag" ]]; then
+    # 任务图调度：WT精修/链提取与PLIP、FoldX模块并行，共享THREAD个核
+    source $CONDA_BASE/etc/profile.d/conda.sh
+    conda activate trim
+    python $BASE_DIR/tools/dag_runner.py \
+        --pdb "$PDB" \
+        --out "$out" \
+        --rec "$rec_chains" \
+        --lig "$lig_chains" \
+        --base-dir "$BASE_DIR" \
+        --conda-base "$CONDA_BASE" \
+        --foldx "$FOLDX_DIR" \
+        --rosetta "$ROSETTA_DIR" \
+        --threads "$THREAD"
+    conda deactivate
+else
+    # 蛋白互作分析模块
+    bash $BASE_DIR/script/interaction_analysis.sh "$PDB" "$out" "$rec_chains" "$lig_chains" "$pdb_name" "$BASE_DIR" "$CONDA_BASE" "$result"
 
-# 蛋白互作分析模块
-bash $BASE_DIR/script/interaction_analysis.sh "$PDB" "$out" "$rec_chains" "$lig_chains" "$pdb_name" "$BASE_DIR" "$CONDA_BASE" "$result"
+    # 饱和突变模拟模块
+    bash $BASE_DIR/script/Energy_calculate.sh "$PDB" "$out" "$rec_chains" "$lig_chains" "$pdb_name" "$mutout" "$energy_out" "$result" "$FOLDX_DIR" "$BASE_DIR" "$CONDA_BASE" "$THREAD"
 
-# 饱和突变模拟模块
-bash $BASE_DIR/script/Energy_calculate.sh "$PDB" "$out" "$rec_chains" "$lig_chains" "$pdb_name" "$mutout" "$energy_out" "$result" "$FOLDX_DIR" "$BASE_DIR" "$CONDA_BASE" "$THREAD"
+    # 突变体评估模块 
+    bash $BASE_DIR/script/mutation_evaluate.sh "$PDB" "$out" "$rec_chains" "$lig_chains" "$result"  "$ROSETTA_DIR" "$BASE_DIR" "$CONDA_BASE" "$THREAD"
+fi
 
-# 突变体评估模块 
-bash $BASE_DIR/script/mutation_evaluate.sh "$PDB" "$out" "$rec_chains" "$lig_chains" "$result"  "$ROSETTA_DIR" "$BASE_DIR" "$CONDA_BASE" "$THREAD"
-echo "============== Processing $pdb_name Done=============="
+if [[ "$TRACE" == "1" && -s "$trace" ]]; then
+    # 各阶段耗时、核利用率、关键路径与异常耗时任务
+    source $CONDA_BASE/etc/profile.d/conda.sh
+    conda activate trim
+    python $BASE_DIR/tools/job_trace.py report "$trace" --cores "$THREAD" --since "$run_start"
+    conda deactivate
+fi
+if [[ -s "$failures" ]]; then
+    echo "[WARNING] $(( $(wc -l < "$failures") - 1 )) 个任务失败，详见 $failures"
+    column -t -s $'\t' "$failures" | cut -c1-200
+fi
+echo "============== Processing $run_name Done=============="
@@ -16,6 +16,10 @@ cd $BASE_DIR
 
 source $CONDA_BASE/etc/profile.d/conda.sh
 source $BASE_DIR/utils.sh
+conda activate trim
+
+# 断点续跑的完成标记目录
+state="$out/.done"
 
 echo "========================================================================="
 echo "=================Saturation Mutagenesis Simulation Start================="
@@ -27,66 +31,165 @@ echo "所有突变位点：${PLIP_MUT}"
 
 echo "[1] Repair PDB Strat"
 #修复蛋白结构
-$foldx/foldx \
-    --command=RepairPDB \
-    --pdb-dir=$(dirname "$pdb") \
-    --pdb=$(basename "$pdb") \
-    --output-dir=$mutout \
-    --screen=false \
-    >>"$BASE_DIR/log/${base}_folx.out" 2>>"$BASE_DIR/log/${base}_foldx.err"
+if unit_done "$state/repair/${base}.done"; then
+    echo "  [SKIP] ${base}_Repair.pdb 已完成"
+else
+    traced RepairPDB $foldx/foldx \
+        --command=RepairPDB \
+        --pdb-dir=$(dirname "$pdb") \
+        --pdb=$(basename "$pdb") \
+        --output-dir=$mutout \
+        --screen=false \
+        >>"$BASE_DIR/log/${base}_folx.out" 2>>"$BASE_DIR/log/${base}_foldx.err" \
+        && mark_done "$state/repair/${base}.done" "$mutout/${base}_Repair.pdb"
+fi
 echo -e "[1] Repair PDB End\n"
 
 cd $mutout
 
 echo "[2] Build Mutants Library Start"
-#构建突变体库
-$foldx/foldx \
+#构建突变体库：按位点拆分 PositionScan，各位点在独立临时目录中并行计算
+scan_dir="$mutout/scan"
+if unit_done "$state/position_scan/${base}.done"; then
+    echo "  [SKIP] 突变体库已构建"
+else
+    echo "$PLIP_MUT" | tr ',' '\n' | grep -v '^$' |
+    xargs -P $THREAD -I {} bash -c '
+    pos="$1"; foldx="$2"; mutout="$3"; scan_dir="$4"; state="$5"; base="$6"
+
+    marker="$state/position_scan/${base}_${pos}.done"
+    unit_done "$marker" && exit 0
+
+    workdir="$scan_dir/$pos"
+    rm -rf "$workdir"
+    mkdir -p "$workdir"
+    # TRIM_STAGING=1 时在节点本地暂存目录中扫描，结束后只写回突变体结构与能量表
+    rundir=$(scratch_dir "scan_${pos}")
+    if [[ -n "$rundir" ]]; then
+        trap "rm -rf \"$rundir\"" EXIT
+    else
+        rundir="$workdir"
+    fi
+    cd "$rundir"
+    TRIM_MUTANT="$pos" traced PositionScan "$foldx" \
         --command=PositionScan \
+        --pdb-dir="$mutout" \
         --pdb=${base}_Repair.pdb \
-        --positions=$PLIP_MUT \
-        --output-dir=$mutout \
-        --screen=false \
-        >>"$BASE_DIR/log/${base}_folx.out" 2>>"$BASE_DIR/log/${base}_foldx.err"
+        --positions=$pos \
+        --output-dir="$rundir" \
+        --screen=false || exit 1
+
+    # 突变体结构移回 mutation 目录，其余输出留待合并
+    mutants=("$rundir"/*_${base}_Repair.pdb)
+    [[ -f "${mutants[0]}" ]] || exit 1
+    mv -f "${mutants[@]}" "$mutout"/
+    if [[ "$rundir" != "$workdir" ]]; then
+        # 能量表写回扫描目录，其余结构（如野生型副本）随暂存目录删除
+        for f in "$rundir"/*; do
+            [[ -f "$f" && "$f" != *.pdb ]] && mv -f "$f" "$workdir"/
+        done
+    fi
+    mark_done "$marker" "${mutants[@]/#$rundir/$mutout}"
+    echo "  [+] $pos Done"
+    ' _ {} "$foldx/foldx" "$mutout" "$scan_dir" "$state" "$base" \
+    >>"$BASE_DIR/log/${base}_folx.out" 2>>"$BASE_DIR/log/${base}_foldx.err"
+
+    # 按位点顺序合并各分片的能量表（PS_*.fxout 等），与单进程扫描的输出布局一致
+    complete=1
+    for pos in $(echo "$PLIP_MUT" | tr ',' ' '); do
+        if ! unit_done "$state/position_scan/${base}_${pos}.done"; then
+            echo "  [ERROR] 位点 $pos 扫描失败"
+            complete=0
+        fi
+    done
+    if (( complete )); then
+        rm -f "$mutout"/*.merged
+        for pos in $(echo "$PLIP_MUT" | tr ',' ' '); do
+            [[ -d "$scan_dir/$pos" ]] || continue
+            for f in "$scan_dir/$pos"/*; do
+                [[ -f "$f" ]] && cat "$f" >> "$mutout/$(basename "$f").merged"
+            done
+        done
+        for f in "$mutout"/*.merged; do
+            [[ -f "$f" ]] && mv -f "$f" "${f%.merged}"
+        done
+        rm -rf "$scan_dir"
+        mark_done "$state/position_scan/${base}.done" $mutout/*_${base}_Repair.pdb
+    fi
+fi
 echo -e "[2] Build Mutants Library End\n"
 
 echo "[3] Calculate Mutants Energy Start"
-#计算突变体能量变化
+#计算突变体能量变化：突变体按批写入 pdb-list，每个 foldx 进程处理一批，同义突变不再计算
 COMPLEX="${rec_chains},${lig_chains}"
-
-find . -maxdepth 1 -name "*.pdb" -print0 |
-xargs -0 -P $THREAD -I {} bash -c '
-mutpdb="$1"
-complex="$2"
-foldx="$3"
-energy_out="$4"
-
-name=$(basename "$mutpdb" .pdb)
-echo "--> Calculating $name"
-
-"$foldx" --command=AnalyseComplex \
-  --pdb="$mutpdb" \
+FOLDX_VERSION=$(tool_version "$foldx/foldx")
+batch_dir="$mutout/batches"
+# 所有 fxout 小文件合并后的列式存储
+store="$energy_out/${base}_fxout.npz"
+
+# 后台流式汇总 ΔΔG：计算过程中 $result 下的 ΔΔG 表会持续更新
+stream_stop="$energy_out/.ddg_stream_stop"
+rm -f "$stream_stop"
+python $BASE_DIR/tools/ddg_stream.py \
+        --wt $energy_out/Summary_${base}_Repair_AC.fxout \
+        --indir $energy_out \
+        --outdir $result \
+        --name $base \
+        --positions "$PLIP_MUT" \
+        --stop-file "$stream_stop" &
+stream_pid=$!
+
+python $BASE_DIR/tools/foldx_batch.py plan \
+    --mutdir "$mutout" \
+    --base "$base" \
+    --positions "$PLIP_MUT" \
+    --chains "$COMPLEX" \
+    --energy-out "$energy_out" \
+    --state "$state" \
+    --listdir "$batch_dir" \
+    --workers "$THREAD" \
+    --foldx-version "$FOLDX_VERSION" \
+    --store "$store" |
+xargs -P $THREAD -I {} bash -c '
+list="$1"; foldx="$2"; mutout="$3"; complex="$4"; energy_out="$5"; state="$6"; version="$7"; tools="$8"
+
+echo "--> Calculating $(wc -l < "$list") mutants in $(basename "$list")"
+traced AnalyseComplex "$foldx" --command=AnalyseComplex \
+  --pdb-dir="$mutout" \
+  --pdb-list="$list" \
   --analyseComplexChains="$complex" \
   --output-dir="$energy_out" \
-' _ {} "$COMPLEX" "$foldx/foldx" "$energy_out"
+  --screen=false
+
+python "$tools/foldx_batch.py" collect \
+  --list "$list" \
+  --mutdir "$mutout" \
+  --chains "$complex" \
+  --energy-out "$energy_out" \
+  --state "$state" \
+  --foldx-version "$version"
+' _ {} "$foldx/foldx" "$mutout" "$COMPLEX" "$energy_out" "$state" "$FOLDX_VERSION" "$BASE_DIR/tools" \
 >>"$BASE_DIR/log/${base}_folx.out" 2>>"$BASE_DIR/log/${base}_foldx.err"
+rm -rf "$batch_dir"
+touch "$stream_stop"
 echo -e "[3] Calculate Mutants Energy End\n"
 
 cd $BASE_DIR
 
-# 将单字母格式转化为三字母格式
-CONVERTED=$(convert_to_three_letter "$PLIP_MUT")
-
-# 移除原氨基酸的能量计算结果
-for res in $(echo "$CONVERTED" | tr ',' ' '); do
-    rm -f $energy_out/*$res*
-done
-
 echo "[4] Calculate DDG of Mutants Start"
-conda activate trim
-#计算突变体的能量变化
-python $BASE_DIR/tools/calculate_ddg_by_position.py \
-        --wt $energy_out/Summary_${base}_Repair_AC.fxout \
+#等待流式汇总结束，再把 fxout 小文件合并进 NPZ 存储，由存储写出最终的 ΔΔG 表
+wait $stream_pid
+rm -f "$stream_stop"
+cleanup=()
+[[ "${TRIM_FXOUT_CLEANUP:-0}" == "1" ]] && cleanup=(--delete)
+python $BASE_DIR/tools/fxout_store.py ingest \
         --indir $energy_out \
+        --out "$store" \
+        --base $base \
+        --positions "$PLIP_MUT" \
+        "${cleanup[@]}"
+python $BASE_DIR/tools/calculate_ddg_by_position.py \
+        --store "$store" \
         --outdir $result \
         --name $base
 echo -e "[4] Calculate DDG of Mutants End\n"
@@ -94,6 +197,7 @@ echo "[5] Screen mutants Start"
 #依据阈值筛选突变体
 python $BASE_DIR/tools/filter_high_ddg_mutations.py \
         --dir $result \
+        --store "$store" \
         --chain "$lig_chains" 
 #筛选结果可视化
 python $BASE_DIR/tools/bubble_heatmap.py \
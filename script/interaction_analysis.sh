@@ -24,19 +24,44 @@ chain="[[$rec], [$lig]]"
 echo "受体链：${rec}"
 echo "配体链：${lig}"
 
+marker="$out/.done/interaction/${base}.done"
+residues="$out/PLIP_${base}_chain${lig_chains}_residues.txt"
+if unit_done "$marker"; then
+    echo "  [SKIP] ${base} 互作分析已完成"
+    conda deactivate
+    exit 0
+fi
+
+#界面裁剪：PLIP 只分析界面壳层内的残基（TRIM_PLIP_CROP 为外扩距离，0 关闭），裁剪失败时分析完整结构
+plip_input="$pdb"
+if [[ "${TRIM_PLIP_CROP:-0}" != "0" ]]; then
+    crop_dir=$(scratch_dir "plip_crop_${base}" "$out")
+    trap 'rm -rf "$crop_dir"' EXIT
+    python $BASE_DIR/tools/interface_crop.py crop -i "$pdb" -o "$crop_dir/$(basename "$pdb")" \
+        -r "$rec_chains" -l "$lig_chains" --margin "$TRIM_PLIP_CROP" \
+        && plip_input="$crop_dir/$(basename "$pdb")"
+fi
+
 #PLIP分析
-plip -f "$pdb" -o "$out" --chains "$chain" -qxy --name $base
+traced plip plip -f "$plip_input" -o "$out" --chains "$chain" -qxy --name $base
 
 # 提取PLIP挖掘得到的互作残基
 for xml in $out/*.xml; do
     python $BASE_DIR/tools/plip_extract.py -i "$xml" -o "$out"
 done
 
+# 快速界面接触检测与 PLIP 位点的一致性，供调整链划分时参考（不影响后续突变位点）
+python $BASE_DIR/tools/contact_scan.py compare -i "$pdb" -r "$rec_chains" -l "$lig_chains" \
+    --plip "$out/PLIP_${base}_*.csv" -o "$out/result/Contact_Agreement_${base}.tsv" \
+    || echo "  [WARN] ${base} 界面接触一致性报告生成失败"
+
 mv $out/*.pse result
-rm $out/*.pdb
+# 仅删除PLIP生成的加氢结构，避免误删并行任务写入 $out 的结构
+rm -f $out/plipfixed.*.pdb $out/*_protonated.pdb
 
 #蛋白互作残基可视化
-python $BASE_DIR/tools/interaction_plot.py -p ${out}/PLIP_${base} -o $out/result/Chord_Interaction.pdf -e $lig_chains
+python $BASE_DIR/tools/interaction_plot.py -p ${out}/PLIP_${base} -o $out/result/Chord_Interaction.pdf -e $lig_chains \
+    && mark_done "$marker" $out/PLIP_${base}_*.csv "$residues"
 
 conda deactivate
 
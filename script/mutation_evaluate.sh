@@ -9,6 +9,10 @@ ROSETTA_DIR="$6"
 BASE_DIR="$7"
 CONDA_BASE="$8"
 THREAD="$9"
+# 执行的步骤范围（默认全部，如 "1-2" 仅做WT预处理）
+STEPS="${10:-1-9}"
+# 只处理单个突变体（如 A24R；wt 表示野生型的界面评估），由 tools/mutant_pipeline.py 逐步骤调用
+MUTANT="${11:-}"
 
 cd $BASE_DIR
 
@@ -21,250 +25,502 @@ pdb_name=$(basename "$pdb" .pdb)
 rec=$(echo "$rec_chains" | sed -E "s/(.)/'\1', /g" | sed 's/, $//')
 lig=$(echo "$lig_chains" | sed -E "s/(.)/'\1', /g" | sed 's/, $//')
 chain="[[$rec], [$lig]]"
-
-echo "========================================================================="
-echo "=================Mutant Interaction Assessment Start====================="
-echo -e "=========================================================================\n"
-
-echo "[1] Relax WT Protein Start"
-
-"$ROSETTA_DIR"/relax.linuxgccrelease \
-    -s "$pdb" \
-    -relax:fast \
-    -relax:constrain_relax_to_start_coords \
-    -use_input_sc \
-    -nstruct 20 \
-    -ex1 -ex2 \
-    -score:weights ref2015 \
-    -mute all \
-    -out:path:all "$out" \
-    -out:suffix "_relax" \
-    -overwrite \
-    >> "$BASE_DIR/log/${pdb_name}_rosetta.out" \
-    2>> "$BASE_DIR/log/${pdb_name}_rosetta.err"
-
-bestwt=$(awk 'NR>2 {print $2, $NF}' ${out}/score_relax.sc | sort -n | head -1 | awk '{print $2}')
-echo "Best structure: $bestwt"
-mv ${out}/${bestwt}.pdb ${out}/${pdb_name}.pdb
-rm -f ${out}/*_relax_*.pdb
 wtpdb="${out}/${pdb_name}.pdb"
+# 资源记录（job_trace）中的突变体标识，与结构名一致
+case "$MUTANT" in
+    "") ;;
+    wt) export TRIM_MUTANT="$pdb_name" ;;
+    *)  export TRIM_MUTANT="${pdb_name}_${MUTANT}" ;;
+esac
+# 断点续跑的完成标记目录
+state="$out/.done"
+# Rosetta 日志：逐突变体流水线的任务并发运行，各写一份日志，流水线结束后按突变体顺序追加到总日志
+rosetta_log="$BASE_DIR/log/${pdb_name}_rosetta"
+if [[ -n "$MUTANT" ]]; then
+    mkdir -p "$BASE_DIR/log/${pdb_name}_mutants"
+    rosetta_log="$BASE_DIR/log/${pdb_name}_mutants/${MUTANT}_rosetta"
+fi
+
+# Rosetta 协议参数（同时作为结果缓存键的一部分）
+WT_RELAX_FLAGS="-relax:fast -relax:constrain_relax_to_start_coords -use_input_sc -ex1 -ex2 -score:weights ref2015"
+WT_RELAX_NSTRUCT=20
+FIXBB_FLAGS="-ex1 -ex2 -use_input_sc -nstruct 1"
+RELAX_FLAGS="-relax:fast -relax:constrain_relax_to_start_coords -use_input_sc -ex1 -ex2 -score:weights ref2015"
+RELAX_NSTRUCT=10
+DOCK_FLAGS="-docking_local_refine -use_input_sc -docking:sc_min -ex1 -ex2aro -spin -no_optH false -flip_HNQ true -score:weights ref2015"
+DOCK_NSTRUCT=100
+# WT 精修与对接的 nstruct 拆成多个分片并行采样，第 i 个分片的随机种子为 SHARD_SEED+i
+SHARD_SEED=1111
+# 自适应采样：按批生成构象，最优总分改进 ≤ tol 且前 k 个构象分数极差 ≤ spread（REU）时提前停止，
+# nstruct 作为上限；各突变体实际使用的构象数写入 $result/decoy_sampling_*.tsv
+if [[ "${TRIM_ADAPTIVE_SAMPLING:-0}" == "1" ]]; then
+    WT_RELAX_SAMPLING="--batch 5 --min-decoys 10 --top-k 3 --tol 0.5 --spread 2.0"
+    RELAX_SAMPLING="--batch 5 --min-decoys 5 --top-k 3 --tol 0.5 --spread 2.0"
+    DOCK_SAMPLING="--batch 20 --min-decoys 40 --top-k 5 --tol 0.5 --spread 2.0"
+else
+    WT_RELAX_SAMPLING=""
+    RELAX_SAMPLING=""
+    DOCK_SAMPLING=""
+fi
+# 软件版本指纹：顶层调用计算一次并导出，逐突变体流水线的各任务直接继承，不再重复哈希可执行文件
+export TRIM_RELAX_VERSION="${TRIM_RELAX_VERSION:-$(tool_version "$ROSETTA_DIR/relax.linuxgccrelease")}"
+export TRIM_FIXBB_VERSION="${TRIM_FIXBB_VERSION:-$(tool_version "$ROSETTA_DIR/fixbb.linuxgccrelease")}"
+export TRIM_DOCK_VERSION="${TRIM_DOCK_VERSION:-$(tool_version "$ROSETTA_DIR/docking_protocol.linuxgccrelease")}"
+RELAX_VERSION="$TRIM_RELAX_VERSION"
+FIXBB_VERSION="$TRIM_FIXBB_VERSION"
+DOCK_VERSION="$TRIM_DOCK_VERSION"
+# 节点本地暂存（TRIM_STAGING=1）：精修与对接只写回打分和最优构象，FixBB 中间结构留在暂存目录
+KEEP_DECOYS=0
+[[ "${TRIM_STAGING:-0}" == "1" ]] && KEEP_DECOYS=1
+# 对接构象聚类（TRIM_CLUSTER_DECOYS=1）：步骤 [7] 需要全部对接构象，静默文件不做筛减
+DOCK_KEEP="$KEEP_DECOYS"
+[[ "${TRIM_CLUSTER_DECOYS:-0}" == "1" ]] && DOCK_KEEP=0
+
+if [[ -z "$MUTANT" ]]; then
+    echo "========================================================================="
+    echo "=================Mutant Interaction Assessment Start====================="
+    echo -e "=========================================================================\n"
+fi
+
+if step_enabled 1 "$STEPS"; then
+    echo "[1] Relax WT Protein Start"
+
+    wt_key=$(cache_key -i "$pdb" -t relax -t "$WT_RELAX_FLAGS" -t "nstruct=$WT_RELAX_NSTRUCT" \
+        -t "seed=$SHARD_SEED" -t "sampling=$WT_RELAX_SAMPLING" -t "keep=$KEEP_DECOYS" \
+        -t "rosetta=$RELAX_VERSION")
+    if unit_done "$state/wt_relax/${pdb_name}.done"; then
+        echo "  [SKIP] WT 精修已完成"
+    elif cache_fetch "$wt_key" "$out"; then
+        echo "  [CACHED] WT 精修结构取自缓存"
+        mark_done "$state/wt_relax/${pdb_name}.done" "$wtpdb"
+    else
+        # Rosetta 会向已有打分文件追加记录，重跑前清理上次残留
+        rm -f ${out}/score_relax.sc ${out}/*_relax_*.pdb
+
+        # nstruct 拆成 THREAD 个分片并行，合并后的打分文件与单进程运行格式一致
+        echo "$pdb" | python $BASE_DIR/tools/rosetta_shards.py \
+            --app "$ROSETTA_DIR/relax.linuxgccrelease" \
+            --flags="$WT_RELAX_FLAGS" \
+            --nstruct "$WT_RELAX_NSTRUCT" \
+            --threads "$THREAD" \
+            --seed "$SHARD_SEED" \
+            --outdir "$out" \
+            --suffix "_relax" \
+            $WT_RELAX_SAMPLING \
+            --keep "$KEEP_DECOYS" \
+            --report "$result/decoy_sampling_wt_relax.tsv" \
+            --log-out "${rosetta_log}.out" \
+            --log-err "${rosetta_log}.err"
+
+        bestwt=$(python $BASE_DIR/tools/decoy_index.py top ${out}/score_relax.sc)
+        echo "Best structure: $bestwt"
+        mv ${out}/${bestwt}.pdb ${out}/${pdb_name}.pdb \
+            && cache_store "$wt_key" "$wtpdb" \
+            && mark_done "$state/wt_relax/${pdb_name}.done" "$wtpdb"
+        rm -f ${out}/*_relax_*.pdb
+    fi
 
-echo -e "[1] Relax WT Protein  End\n"
-
-echo "[2] Extract Protein Chains Start"
-#提取配体蛋白链
-pymol -cq -r $BASE_DIR/tools/pymol_chains.py -- extract \
-    -i $wtpdb \
-    -c $lig_chains \
-    -o "$out/${pdb_name}_${lig_chains}.pdb"
-echo "  [+] 已提取配体蛋白链->${out}/${pdb_name}_${lig_chains}.pdb"
-
-#提取受体蛋白链
-pymol -cq -r $BASE_DIR/tools/pymol_chains.py -- extract \
-    -i $wtpdb \
-    -c $rec_chains \
-    -o "$out/${pdb_name}_${rec_chains}.pdb"
-echo "  [+] 已提取配体蛋白链->${out}/${pdb_name}_${rec_chains}.pdb"
-echo -e "[2] Extract Protein Chains End\n"
+    echo -e "[1] Relax WT Protein  End\n"
+fi
+
+if step_enabled 2 "$STEPS"; then
+    echo "[2] Extract Protein Chains Start"
+    if unit_done "$state/chains/${pdb_name}.done"; then
+        echo "  [SKIP] 蛋白链已提取"
+    else
+        #提取配体蛋白链
+        python $BASE_DIR/tools/pdb_chains.py extract \
+            -i $wtpdb \
+            -c $lig_chains \
+            -o "$out/${pdb_name}_${lig_chains}.pdb"
+        echo "  [+] 已提取配体蛋白链->${out}/${pdb_name}_${lig_chains}.pdb"
+
+        #提取受体蛋白链
+        python $BASE_DIR/tools/pdb_chains.py extract \
+            -i $wtpdb \
+            -c $rec_chains \
+            -o "$out/${pdb_name}_${rec_chains}.pdb"
+        echo "  [+] 已提取配体蛋白链->${out}/${pdb_name}_${rec_chains}.pdb"
+
+        mark_done "$state/chains/${pdb_name}.done" \
+            "$out/${pdb_name}_${lig_chains}.pdb" "$out/${pdb_name}_${rec_chains}.pdb"
+    fi
+    echo -e "[2] Extract Protein Chains End\n"
+fi
 
 host_pdb="$out/${pdb_name}_${lig_chains}.pdb"
 virus_pdb="$out/${pdb_name}_${rec_chains}.pdb"
 RES="$result/filtered_ddg_mutations.csv"
 docking="$out/docking"
+joblist="$out/joblist.tsv"
 
 mkdir -p $out/resfiles
 mkdir -p $docking/best/plip_result
 mkdir -p $docking/best/analysis
 
-echo "[3] Create resfiles for mutation Start:"
-joblist="$out/joblist.tsv"
-: > "$joblist"
+if step_enabled 3 "$STEPS"; then
+    echo "[3] Create resfiles for mutation Start:"
+    : > "$joblist"
+
+    tail -n +2 "$RES" | while IFS=',' read -r chain resi mut_aa _; do
+        aa1=$(convert_to_one_letter "$mut_aa")
+        if [[ -z "$aa1" ]]; then
+            echo "  [WARNING] Unknown AA: $mut_aa"
+            continue
+        fi
+        mut_name="${chain}${resi}${aa1}"
+        workdir="$out/resfiles/$mut_name"
+        mkdir -p "$workdir"
+        create_resfile "$resi" "$chain" "$aa1" > "$workdir/resfile.txt"
+        echo -e "$mut_name\t$workdir" >> "$joblist"
+        echo "  [PREPARED] $mut_name"
+    done
+    echo -e "[3] Create resfiles for mutation End\n"
+fi
+
+# 指定 MUTANT 时只匹配该突变体的文件名前缀
+sel="${MUTANT:+${pdb_name}_${MUTANT}}"
+
+# stage_check <检查命令...>：逐突变体调用时检查本步骤结果，失败则以非零退出，下游步骤不再执行
+stage_check() {
+    [[ -z "$MUTANT" ]] && return 0
+    "$@" && return 0
+    echo "  [FAILED] $MUTANT"
+    record_failure "step${STEPS}" "check failed: $*"
+    exit 1
+}
+
+# 步骤 [4]-[7] 默认按突变体流水线执行：每个突变体完成一步即进入下一步，所有步骤共享 THREAD 个核；
+# 步骤 [8] 不拆分到突变体，流水线结束后对全部待评估结构一次批量运行（InterfaceAnalyzer 分组 -l、PLIP 单个进程池）
+PIPELINED=0
+if [[ -z "$MUTANT" && "${TRIM_MUTANT_PIPELINE:-1}" == "1" ]] \
+        && step_enabled 4 "$STEPS" && step_enabled 7 "$STEPS" && [[ -s "$joblist" ]]; then
+    echo "[4-7] Per-mutant Pipeline Start"
+    python $BASE_DIR/tools/mutant_pipeline.py --joblist "$joblist" --threads "$THREAD" -- \
+        bash "$BASE_DIR/script/mutation_evaluate.sh" "$pdb" "$out" "$rec_chains" "$lig_chains" \
+        "$result" "$ROSETTA_DIR" "$BASE_DIR" "$CONDA_BASE"
+    PIPELINED=1
+    for ext in out err; do
+        for mut_log in "$BASE_DIR/log/${pdb_name}_mutants"/*_rosetta.$ext; do
+            [[ -f "$mut_log" ]] || continue
+            { echo "==> $(basename "$mut_log" "_rosetta.$ext") <=="; cat "$mut_log"; } >> "${rosetta_log}.$ext"
+            rm -f "$mut_log"
+        done
+    done
+    rmdir "$BASE_DIR/log/${pdb_name}_mutants" 2>/dev/null
+    echo -e "[4-7] Per-mutant Pipeline End\n"
+fi
+
+if step_enabled 4 "$STEPS" && (( ! PIPELINED )); then
+    echo "[4] Mutate protein ${pdb_name} Start"
+    awk -F'\t' -v m="$MUTANT" 'm == "" || $1 == m' "$joblist" |
+    xargs -P "$THREAD" -n 2 bash -c '
+    mut_name="$1"
+    workdir="$2"
+    marker="'"$state"'/relax/${mut_name}.done"
+    export TRIM_MUTANT="'"$pdb_name"'_${mut_name}"
+
+    if unit_done "$marker"; then
+        echo "  [SKIP] $mut_name" >> "'"$BASE_DIR/log/${pdb_name}.out"'"
+        exit 0
+    fi
+    # 清理上次中断留下的结构和打分文件
+    rm -f "$workdir"/*.pdb "$workdir"/*.sc
+
+    key=$(cache_key -i "'"$host_pdb"'" -i "$workdir/resfile.txt" \
+        -t fixbb -t "'"$FIXBB_FLAGS"'" -t "rosetta='"$FIXBB_VERSION"'" \
+        -t relax -t "'"$RELAX_FLAGS"'" -t "nstruct='"$RELAX_NSTRUCT"'" -t "seed='"$SHARD_SEED"'" \
+        -t "sampling='"$RELAX_SAMPLING"'" -t "keep='"$KEEP_DECOYS"'" -t "rosetta='"$RELAX_VERSION"'")
+    if cache_fetch "$key" "$workdir"; then
+        mark_done "$marker" "$workdir/score_relax.sc" "$workdir"/*_relax_*.pdb || exit 1
+        echo "  [CACHED] $mut_name" >> "'"$BASE_DIR/log/${pdb_name}.out"'"
+        exit 0
+    fi
 
-tail -n +2 "$RES" | while IFS=',' read -r chain resi mut_aa _; do
-    aa1=$(convert_to_one_letter "$mut_aa")
-    if [[ -z "$aa1" ]]; then
-        echo "  [WARNING] Unknown AA: $mut_aa"
-        continue
+    echo "  [INFO] FixBB $mut_name" >> "'"$BASE_DIR/log/${pdb_name}.out"'"
+
+    fixbb_dir=$(scratch_dir "fixbb_${mut_name}")
+    if [[ -n "$fixbb_dir" ]]; then
+        trap "rm -rf \"$fixbb_dir\"" EXIT
+    else
+        fixbb_dir="$workdir"
     fi
-    mut_name="${chain}${resi}${aa1}"
-    workdir="$out/resfiles/$mut_name"
-    mkdir -p "$workdir"
-    create_resfile "$resi" "$chain" "$aa1" > "$workdir/resfile.txt"
-    echo -e "$mut_name\t$workdir" >> "$joblist"
-    echo "  [PREPARED] $mut_name"
-done
-echo -e "[3] Create resfiles for mutation End\n"
-
-echo "[4] Mutate protein ${pdb_name} Start"
-cat "$joblist" |
-xargs -P "$THREAD" -n 2 bash -c '
-mut_name="$1"
-workdir="$2"
-
-echo "  [INFO] FixBB $mut_name" >> "'"$BASE_DIR/log/${pdb_name}.out"'"
-
-'"$ROSETTA_DIR"'/fixbb.linuxgccrelease \
-    -s "'"$host_pdb"'" \
-    -resfile "$workdir/resfile.txt" \
-    -ex1 -ex2 -use_input_sc \
-    -nstruct 1 \
-    -mute all \
-    -out:path:all "$workdir" \
-    -out:suffix "_fixbb" \
-    -overwrite \
-    >> "'"$BASE_DIR/log/${pdb_name}_rosetta.out"'" \
-    2>> "'"$BASE_DIR/log/${pdb_name}_rosetta.err"'" || exit 1
-
-fixbb_pdb=$(ls "$workdir"/*_fixbb*.pdb 2>/dev/null | head -1)
-[[ -f "$fixbb_pdb" ]] || exit 1
-
-echo "  [INFO] Relax $mut_name" >> "'"$BASE_DIR/log/${pdb_name}.out"'"
-
-'"$ROSETTA_DIR"'/relax.linuxgccrelease \
-    -s "$fixbb_pdb" \
-    -relax:fast \
-    -relax:constrain_relax_to_start_coords \
-    -use_input_sc \
-    -nstruct 10 \
-    -ex1 -ex2 \
-    -score:weights ref2015 \
-    -mute all \
-    -out:path:all "$workdir" \
-    -out:suffix "_relax" \
-    -overwrite \
-    >> "'"$BASE_DIR/log/${pdb_name}_rosetta.out"'" \
-    2>> "'"$BASE_DIR/log/${pdb_name}_rosetta.err"'"
-
-echo "  [DONE] $mut_name" >> "'"$BASE_DIR/log/${pdb_name}.out"'"
-' _
+    traced fixbb '"$ROSETTA_DIR"'/fixbb.linuxgccrelease \
+        -s "'"$host_pdb"'" \
+        -resfile "$workdir/resfile.txt" \
+        '"$FIXBB_FLAGS"' \
+        -mute all \
+        -out:path:all "$fixbb_dir" \
+        -out:suffix "_fixbb" \
+        -overwrite \
+        >> "'"${rosetta_log}.out"'" \
+        2>> "'"${rosetta_log}.err"'" || exit 1
+
+    fixbb_pdb=$(ls "$fixbb_dir"/*_fixbb*.pdb 2>/dev/null | head -1)
+    if [[ ! -f "$fixbb_pdb" ]]; then
+        record_failure fixbb "no fixbb output in $fixbb_dir"
+        exit 1
+    fi
+
+    echo "  [INFO] Relax $mut_name" >> "'"$BASE_DIR/log/${pdb_name}.out"'"
+
+    # 各突变体已按 THREAD 并行，单个突变体的精修只占一个核
+    echo "$fixbb_pdb" | python "'"$BASE_DIR"'/tools/rosetta_shards.py" \
+        --app "'"$ROSETTA_DIR"'/relax.linuxgccrelease" \
+        --flags="'"$RELAX_FLAGS"'" \
+        --nstruct '"$RELAX_NSTRUCT"' \
+        --threads 1 \
+        --seed '"$SHARD_SEED"' \
+        --outdir "$workdir" \
+        --suffix "_relax" \
+        '"$RELAX_SAMPLING"' \
+        --keep '"$KEEP_DECOYS"' \
+        --report "$workdir/decoy_sampling.tsv" \
+        --log-out "'"${rosetta_log}.out"'" \
+        --log-err "'"${rosetta_log}.err"'" \
+        >> "'"$BASE_DIR/log/${pdb_name}.out"'" || exit 1
+
+    cache_store "$key" "$workdir/score_relax.sc" "$workdir"/*_relax_*.pdb
+    mark_done "$marker" "$workdir/score_relax.sc" "$workdir"/*_relax_*.pdb || exit 1
+    echo "  [DONE] $mut_name" >> "'"$BASE_DIR/log/${pdb_name}.out"'"
+    ' _
+
+    # 列出未完成的突变体，失败原因见失败清单
+    awk -F'\t' -v m="$MUTANT" 'm == "" || $1 == m {print $1}' "$joblist" | while read -r mut_name; do
+        unit_done "$state/relax/${mut_name}.done" || echo "  [FAILED] $mut_name 突变体精修未完成"
+    done
+    stage_check unit_done "$state/relax/${MUTANT}.done"
+    echo -e "[4] Mutate protein ${pdb_name} Done\n"
+fi
 
 shopt -s nullglob
-echo -e "[4] Mutate protein ${pdb_name} Done\n"
-
-echo "[5] Merge receptor-Ligand Chains Strat:"
-# 拼接配体-受体蛋白链
-for resdir in "$out/resfiles"/*/; do
-    res_name=$(basename "$resdir")
-    bestrelax=$(awk 'NR>2 {print $2, $NF}' ${resdir}/score_relax.sc | sort -n | head -1 | awk '{print $2}')
-    echo "Best structure: $bestrelax"
-    pymol -cq -r "$BASE_DIR/tools/pymol_chains.py" -- merge \
-        -i $resdir/${bestrelax}.pdb $out/${pdb_name}_${rec_chains}.pdb \
-        -o "$out/resfiles/${pdb_name}_${res_name}.pdb"
-    echo "Succeed in merging ${pdb_name}_${res_name}"
-done
-echo -e "[5] Merge receptor-Ligand Chains Done\n"
-
-echo "[6] Local_Docking Start:"
-# 对拼接蛋白进行局部对接
-find "$out/resfiles" -maxdepth 1 -name "*.pdb" -print0 |
-xargs -0 -P "$THREAD" -I {} bash -c '
-mut="$1"; partners="$2"; rosetta="$3"; docking="$4"; logdir="$5"
-
-pdbname=$(basename "$mut" .pdb)
-outlog="$logdir/'"$pdb_name"'_rosetta.out"
-errlog="$logdir/'"$pdb_name"'_rosetta.err"
-scriptoutlog=""$logdir/'"$pdb_name"'.out""
-scripterrlog=""$logdir/'"$pdb_name"'.err""
-{
-  echo "  [$(date "+%F %T")] [START docking] $pdbname  file=$mut"
-} >>"$scriptoutlog" 2>>"$scripterrlog"
-  "$rosetta"/docking_protocol.linuxgccrelease \
-    -s "$mut" \
-    -partners "$partners" \
-    -docking_local_refine \
-    -use_input_sc \
-    -docking:sc_min \
-    -ex1 -ex2aro -spin \
-    -no_optH false \
-    -flip_HNQ true \
-    -nstruct 100 \
-    -score:weights ref2015 \
-    -mute all \
-    -out:file:silent "${pdbname}_dock.out" \
-    -out:path:all "$docking" \
-    >>"$outlog" 2>>"$errlog"
-  rc=$?
-{  
-  echo "  [$(date "+%F %T")] [END docking] $pdbname  rc=$rc"
-} >>"$scriptoutlog" 2>>"$scripterrlog"
-  exit $rc
-' _ {} "${rec_chains}_${lig_chains}" "$ROSETTA_DIR" "$docking" "$BASE_DIR/log"
-echo -e "[6] Local_Docking Done!\n"
-
-echo "[7] Extract Protein Structure Start:"
-#从静默文件中提取蛋白结构
-for silent in $docking/*_dock.out; do
-    pdbname=$(basename "$silent" _dock.out)
-    best_tag=$(
-        awk '
-        $1=="SCORE:" {
-            if (!header_found) {
-                for (i=1;i<=NF;i++)
-                    if ($i=="score") col=i
-                header_found=1
-                next
-            }
-            print $col, $NF
-        }
-        ' "$silent" | sort -n | head -1 | awk '{print $2}'
-    )
-    # 提取该构象
-    (cd $docking/best
-    $ROSETTA_DIR/extract_pdbs.linuxgccrelease \
-        -mute all \
-        -in:file:silent "$silent" \
-        -in:file:tags "$best_tag") \
-        >>"$BASE_DIR/log/${pdb_name}_rosetta.out" 2>>"$BASE_DIR/log/${pdb_name}_rosetta.err"
-    echo "  [+] ${best_tag} Done"
-done
-echo -e "[7] Extract Protein Structure End\n"
-
-cp $wtpdb $docking/best
-
-echo "[8] Assess Protein Complex Interface Start"
-for pdb_best in $docking/best/*.pdb; do
-    basename=$(basename "$pdb_best" .pdb)
-
-    #对精修结构的互作界面进行评分
-    $ROSETTA_DIR/InterfaceAnalyzer.linuxgccrelease \
-        -s $pdb_best \
-        -interface ${rec_chains}_${lig_chains} \
-        -scorefxn ref2015 \
-        -pack_input false \
-        -pack_separated false \
-        -mute all \
-        -out:file:score_only $docking/best/score.sc \
-        >>"$BASE_DIR/log/${pdb_name}_rosetta.out" 2>>"$BASE_DIR/log/${pdb_name}_rosetta.err"
-    # 分析互作残基信息
-    plip -f $pdb_best -o $docking/best/plip_result --chains "$chain" -qx --name $basename >>"$BASE_DIR/log/${pdb_name}_rosetta.out" 2>>"$BASE_DIR/log/${pdb_name}_rosetta.err"
-    echo "[✓] $basename Done！"
-done
-
-# 提取互作残基信息
-for xml in $docking/best/plip_result/*.xml; do
-    python $BASE_DIR/tools/plip_extract.py -i $xml -o $docking/best/analysis
-done
-echo -e "[8] Assess Protein Complex Interface End\n"
-
-rm $docking/best/plip_result/*.pdb
-
-echo "[9] Summary Result Start"
-# 汇总残基信息以及界面评分
-python $BASE_DIR/tools/summary.py \
-        -p $docking/best/analysis \
-        -s $docking/best/score.sc \
-        -n $pdb_name \
-        -m $out/PLIP_${pdb_name}_chain${lig_chains}_residues.txt \
-        -o $result/interaction_summary.csv
-
-# 突变体评估结果可视化
-python $BASE_DIR/tools/evaluate_plot.py \
-        -i $result/interaction_summary.csv \
-        -o $result \
-        -n $pdb_name
-echo -e "[9] Summary Result End\n"
+
+if step_enabled 4 "$STEPS" && [[ -z "$MUTANT" ]]; then
+    # 汇总各突变体精修实际使用的构象数（第一列换成突变体名）
+    reports=("$out/resfiles"/*/decoy_sampling.tsv)
+    if [[ -f "${reports[0]}" ]]; then
+        {
+            head -1 "${reports[0]}"
+            for report in "${reports[@]}"; do
+                awk -v m="$(basename "$(dirname "$report")")" 'BEGIN{OFS="\t"} NR>1 {$1=m; print}' "$report"
+            done
+        } > "$result/decoy_sampling_relax.tsv"
+    fi
+fi
+
+if step_enabled 5 "$STEPS" && (( ! PIPELINED )); then
+    echo "[5] Merge receptor-Ligand Chains Strat:"
+    # 拼接配体-受体蛋白链
+    # 每个突变体选出最优精修构象，写入拼接清单后在一个进程内完成全部拼接
+    python $BASE_DIR/tools/decoy_index.py top --with-file "$out/resfiles"/${MUTANT:-*}/score_relax.sc |
+    while IFS=$'\t' read -r score_file bestrelax; do
+        resdir=$(dirname "$score_file")
+        res_name=$(basename "$resdir")
+        echo "Best structure: $bestrelax" >&2
+        printf '%s\t%s\t%s\n' "$out/resfiles/${pdb_name}_${res_name}.pdb" \
+            "$resdir/${bestrelax}.pdb" "$out/${pdb_name}_${rec_chains}.pdb"
+    done | python "$BASE_DIR/tools/pdb_chains.py" batch -m -
+    stage_check test -s "$out/resfiles/${sel}.pdb"
+    echo -e "[5] Merge receptor-Ligand Chains Done\n"
+fi
+
+if step_enabled 6 "$STEPS" && (( ! PIPELINED )); then
+    echo "[6] Local_Docking Start:"
+    # 对拼接蛋白进行局部对接
+    partners="${rec_chains}_${lig_chains}"
+    dock_tags=(-t docking -t "$partners" -t "$DOCK_FLAGS" -t "nstruct=$DOCK_NSTRUCT" \
+        -t "seed=$SHARD_SEED" -t "sampling=$DOCK_SAMPLING" -t "keep=$DOCK_KEEP" -t "rosetta=$DOCK_VERSION")
+    # 逐突变体流水线中多个对接步骤会并发执行，各自使用独立的输入列表和采样报告（步骤结束后合并）
+    dock_list=$(mktemp "$docking/dock_inputs.XXXXXX")
+    dock_report="$result/decoy_sampling_docking.tsv"
+    [[ -n "$MUTANT" ]] && dock_report="$docking/sampling/${sel}.tsv"
+    for mut in "$out/resfiles"/${sel:-*}.pdb; do
+        pdbname=$(basename "$mut" .pdb)
+        marker="$state/docking/${pdbname}.done"
+        unit_done "$marker" && continue
+        # 静默文件为追加写入，中断后需删除残缺文件再重跑
+        rm -f "$docking/${pdbname}_dock.out"
+        if cache_fetch "$(cache_key -i "$mut" "${dock_tags[@]}")" "$docking"; then
+            mark_done "$marker" "$docking/${pdbname}_dock.out"
+            echo "  [CACHED] $pdbname"
+            continue
+        fi
+        echo "$mut" >> "$dock_list"
+    done
+
+    # 所有突变体的对接分片共用一个进程池：突变体少于 THREAD 时每个突变体拆成更多分片
+    echo "  [$(date "+%F %T")] [START docking] $(wc -l < "$dock_list") mutants"
+    python $BASE_DIR/tools/rosetta_shards.py \
+        --app "$ROSETTA_DIR/docking_protocol.linuxgccrelease" \
+        --flags="-partners $partners $DOCK_FLAGS" \
+        --nstruct "$DOCK_NSTRUCT" \
+        --threads "$THREAD" \
+        --seed "$SHARD_SEED" \
+        --outdir "$docking" \
+        --silent "{name}_dock.out" \
+        --inputs "$dock_list" \
+        $DOCK_SAMPLING \
+        --keep "$DOCK_KEEP" \
+        --report "$dock_report" \
+        --log-out "${rosetta_log}.out" \
+        --log-err "${rosetta_log}.err"
+    while read -r mut; do
+        pdbname=$(basename "$mut" .pdb)
+        [[ -s "$docking/${pdbname}_dock.out" ]] || continue
+        cache_store "$(cache_key -i "$mut" "${dock_tags[@]}")" "$docking/${pdbname}_dock.out"
+        mark_done "$state/docking/${pdbname}.done" "$docking/${pdbname}_dock.out"
+    done < "$dock_list"
+    rm -f "$dock_list"
+    echo "  [$(date "+%F %T")] [END docking]"
+    stage_check unit_done "$state/docking/${sel}.done"
+    echo -e "[6] Local_Docking Done!\n"
+fi
+
+if step_enabled 6 "$STEPS" && [[ -z "$MUTANT" ]]; then
+    # 合并逐突变体对接任务的采样报告（同名记录以新报告为准）
+    reports=("$docking/sampling"/*.tsv)
+    if [[ -f "${reports[0]}" ]]; then
+        report="$result/decoy_sampling_docking.tsv"
+        previous=()
+        [[ -f "$report" ]] && previous=("$report")
+        {
+            head -1 "${reports[0]}"
+            awk -F'\t' 'FNR > 1 {rows[$1] = $0} END {for (name in rows) print rows[name]}' \
+                "${previous[@]}" "${reports[@]}" | LC_ALL=C sort
+        } > "$report.tmp" && mv -f "$report.tmp" "$report" && rm -f "${reports[@]}" "$docking/sampling"/.*.lock
+    fi
+fi
+
+if step_enabled 7 "$STEPS" && (( ! PIPELINED )); then
+    echo "[7] Extract Protein Structure Start:"
+    #从静默文件中提取蛋白结构
+    if [[ "${TRIM_CLUSTER_DECOYS:-0}" == "1" ]]; then
+        # 按界面 RMSD 聚类全部对接构象，取平均总分最低且成员足够多的一类的中心构象
+        python $BASE_DIR/tools/decoy_cluster.py \
+            --app "$ROSETTA_DIR/extract_pdbs.linuxgccrelease" \
+            --column score \
+            -r "$rec_chains" -l "$lig_chains" \
+            --outdir "$docking/best" \
+            --report-dir "$result/decoy_clusters" \
+            --threads "$THREAD" \
+            --log-out "${rosetta_log}.out" \
+            --log-err "${rosetta_log}.err" \
+            $docking/${sel:-*}_dock.out
+    else
+        # 索引各静默文件的 SCORE 行选出最优构象，分组后并行调用 extract_pdbs（每组一次）
+        python $BASE_DIR/tools/decoy_index.py extract \
+            --app "$ROSETTA_DIR/extract_pdbs.linuxgccrelease" \
+            --column score \
+            --outdir "$docking/best" \
+            --threads "$THREAD" \
+            --log-out "${rosetta_log}.out" \
+            --log-err "${rosetta_log}.err" \
+            $docking/${sel:-*}_dock.out
+    fi
+    stage_check test -n "$(compgen -G "$docking/best/${sel}_[0-9]*.pdb")"
+    echo -e "[7] Extract Protein Structure End\n"
+fi
+
+if step_enabled 8 "$STEPS"; then
+    case "$MUTANT" in
+        "")  structures=($docking/best/*.pdb) ;;
+        wt)  structures=("$docking/best/${pdb_name}.pdb") ;;
+        *)   structures=($docking/best/${sel}_[0-9]*.pdb) ;;
+    esac
+    if [[ -z "$MUTANT" || "$MUTANT" == "wt" ]]; then
+        cp $wtpdb $docking/best
+        structures=("$docking/best/${pdb_name}.pdb" "${structures[@]}")
+        structures=($(printf '%s\n' "${structures[@]}" | sort -u))
+    fi
+
+    echo "[8] Assess Protein Complex Interface Start"
+    mkdir -p $docking/best/scores
+    pending=()
+    for pdb_best in "${structures[@]}"; do
+        basename=$(basename "$pdb_best" .pdb)
+        if unit_done "$state/interface/${basename}.done" && [[ -s "$docking/best/scores/${basename}.sc" ]]; then
+            echo "[SKIP] $basename"
+            continue
+        fi
+        rm -f "$docking/best/scores/${basename}.sc"
+        pending+=("$pdb_best")
+    done
+
+    #对精修结构的互作界面进行评分：结构分成 THREAD 组，每个 InterfaceAnalyzer 进程通过 -l 处理一组，
+    #合并的打分输出再拆回每个结构的打分片段，最后按名称顺序合并
+    if (( ${#pending[@]} )); then
+        python $BASE_DIR/tools/interface_batch.py run \
+            --ia "$ROSETTA_DIR/InterfaceAnalyzer.linuxgccrelease" \
+            --interface "${rec_chains}_${lig_chains}" \
+            --threads "$THREAD" \
+            --scores-dir "$docking/best/scores" \
+            --log-out "${rosetta_log}.out" \
+            --log-err "${rosetta_log}.err" \
+            "${pending[@]}"
+    fi
+
+    # 分析互作残基信息：THREAD 个常驻进程直接调用 PLIP 的 Python API，互作残基直接写成 CSV
+    if (( ${#pending[@]} )); then
+        python $BASE_DIR/tools/plip_engine.py \
+            -i "${pending[@]}" \
+            -c "$chain" \
+            -o $docking/best/analysis \
+            -s $docking/best/plip_result \
+            -w "$THREAD" \
+            --crop-margin "${TRIM_PLIP_CROP:-0}" \
+            >>"${rosetta_log}.out" 2>>"${rosetta_log}.err"
+    fi
+    for pdb_best in "${pending[@]}"; do
+        basename=$(basename "$pdb_best" .pdb)
+        mark_done "$state/interface/${basename}.done" \
+            "$docking/best/plip_result/${basename}.json" "$docking/best/scores/${basename}.sc" \
+            && echo "[✓] $basename Done！"
+    done
+
+    if [[ -n "$MUTANT" ]]; then
+        for pdb_best in "${structures[@]}"; do
+            stage_check unit_done "$state/interface/$(basename "$pdb_best" .pdb).done"
+        done
+        stage_check test ${#structures[@]} -gt 0
+        exit 0
+    fi
+
+    # 按结构名顺序合并界面打分片段，供 summary.py 读取
+    python $BASE_DIR/tools/merge_scores.py -o $docking/best/score.sc "$docking/best/scores/*.sc"
+
+    echo -e "[8] Assess Protein Complex Interface End\n"
+fi
+
+if step_enabled 9 "$STEPS"; then
+    echo "[9] Summary Result Start"
+    # 汇总残基信息以及界面评分
+    python $BASE_DIR/tools/summary.py \
+            -p $docking/best/analysis \
+            -s $docking/best/score.sc \
+            -n $pdb_name \
+            -m $out/PLIP_${pdb_name}_chain${lig_chains}_residues.txt \
+            -o $result/interaction_summary.csv
+
+    # 突变体评估结果可视化
+    python $BASE_DIR/tools/evaluate_plot.py \
+            -i $result/interaction_summary.csv \
+            -o $result \
+            -n $pdb_name
+
+    # 突变体与构象结构打包为内存映射坐标库，下游分析可直接读取坐标（<坐标库>::<结构名>）
+    if [[ "${TRIM_COORD_STORE:-0}" == "1" ]]; then
+        python $BASE_DIR/tools/coord_store.py build -o $out/structures.trim \
+            "mutation=$out/mutation/*.pdb" \
+            "relax=$out/resfiles/*/*.pdb" \
+            "complex=$out/resfiles/*.pdb" \
+            "docking=$docking/best/*.pdb"
+    fi
+    echo -e "[9] Summary Result End\n"
+fi
 conda deactivate
 
-echo "========================================================================="
-echo "==================Mutant Interaction Assessment End======================"
-echo -e "=========================================================================\n"
+if [[ -z "$MUTANT" ]]; then
+    echo "========================================================================="
+    echo "==================Mutant Interaction Assessment End======================"
+    echo -e "=========================================================================\n"
+fi
@@ -0,0 +1,48 @@
+"""FoldX AnalyseComplex Summary 文件的数据行识别
+
+以 --pdb-dir=<绝对路径> 调用时 Pdb 列为绝对路径，以 find . 调用时为 ./<结构>.pdb，两种都应被读取
+"""
+import csv
+import os
+import subprocess
+import sys
+
+import pytest
+
+from calculate_ddg_by_position import read_foldx_energies
+from fxout_store import load_ddg
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+TOOLS = os.path.join(os.path.dirname(HERE), "tools")
+DATA = os.path.join(HERE, "data", "foldx")
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("Summary_cx_Repair_AC.fxout", (-12.50, 40.00)),
+    ("Summary_ALA24_cx_AC.fxout", (-10.25, 41.50)),
+    ("Summary_TRP24_cx_AC.fxout", (-14.00, 42.75)),
+])
+def test_read_foldx_energies(name, expected):
+    assert read_foldx_energies(os.path.join(DATA, name)) == expected
+
+
+def test_ddg_stream_absolute_pdb_column(tmp_path):
+    subprocess.run([sys.executable, os.path.join(TOOLS, "ddg_stream.py"), "--once",
+                    "--wt", os.path.join(DATA, "Summary_cx_Repair_AC.fxout"), "--indir", DATA,
+                    "--outdir", str(tmp_path), "--name", "cx"], check=True)
+    with open(tmp_path / "cx_binding_ddg.csv") as f:
+        rows = {row["Position"]: row for row in csv.DictReader(f)}
+    assert rows["24"]["ALA"] == "2.25"
+    assert rows["24"]["TRP"] == "-1.50"
+
+
+def test_fxout_store_matches_direct_read(tmp_path):
+    """入库（fxout_store ingest）与直接读取 Summary 文件得到相同的 ΔΔG"""
+    store = tmp_path / "cx_fxout.npz"
+    subprocess.run([sys.executable, os.path.join(TOOLS, "fxout_store.py"), "ingest", "--indir", DATA,
+                    "--out", str(store), "--base", "cx", "--positions", "WA24a"], check=True)
+    ddg = {(pos, mut): (bind, stab) for pos, mut, bind, stab in load_ddg(str(store))}
+    wt = read_foldx_energies(os.path.join(DATA, "Summary_cx_Repair_AC.fxout"))
+    for mut in ("ALA", "TRP"):
+        bind, stab = read_foldx_energies(os.path.join(DATA, f"Summary_{mut}24_cx_AC.fxout"))
+        assert ddg[(24, mut)] == (round(bind - wt[0], 2), round(stab - wt[1], 2))
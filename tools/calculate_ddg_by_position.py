@@ -10,6 +10,8 @@ import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
 
+from fxout_store import is_data_line
+
 AA3_ORDER = [
     "ALA","ARG","ASN","ASP","CYS",
     "GLN","GLU","GLY","HIS","ILE",
@@ -20,8 +22,9 @@ AA3_ORDER = [
 def read_foldx_energies(filename):
     with open(filename) as f:
         for line in f:
-            if line.startswith("./"):
-                cols = line.split()
+            # Pdb 列是交给 FoldX 的结构路径：以 find . 调用时为 ./<结构>.pdb，--pdb-dir 为绝对路径时为绝对路径
+            cols = line.split()
+            if is_data_line(cols):
                 try:
                     interaction = float(cols[5])
                     stability2 = float(cols[7])
@@ -32,24 +35,35 @@ def read_foldx_energies(filename):
 
 def main():
     parser = argparse.ArgumentParser(description="计算蛋白复合物结合能与稳定性变化")
-    parser.add_argument("--wt", required=True, help="野生型 Summary 文件路径")
+    parser.add_argument("--wt", help="野生型 Summary 文件路径（未指定 --store 时必需）")
     parser.add_argument("--indir", default=".", help="包含突变体 Summary 文件的目录")
     parser.add_argument("--pattern", default="Summary_*.fxout", help="突变体文件匹配模式")
     parser.add_argument("--outdir", help="输出路径")
     parser.add_argument("--name", help="输出文件名")
+    parser.add_argument("--store", help="fxout_store.py 生成的 NPZ 存储（指定后不再读取 fxout 小文件）")
     args = parser.parse_args()
 
-    # 读取 WT
-    wt_inter, wt_stab2 = read_foldx_energies(args.wt)
-
-    # 获取突变体文件
-    all_files = glob.glob(os.path.join(args.indir, args.pattern))
-    mut_files = [f for f in all_files if os.path.abspath(f) != os.path.abspath(args.wt)]
-
     # 数据存储
     binding_ddg = defaultdict(dict)
     stability_ddg = defaultdict(dict)
 
+    if args.store:
+        from fxout_store import load_ddg
+        for pos, aa3, bind, stab in load_ddg(args.store):
+            if aa3 in AA3_ORDER:
+                binding_ddg[str(pos)][aa3] = bind
+                stability_ddg[str(pos)][aa3] = stab
+        mut_files = []
+    else:
+        if not args.wt:
+            parser.error("未指定 --store 时必须提供 --wt")
+        # 读取 WT
+        wt_inter, wt_stab2 = read_foldx_energies(args.wt)
+
+        # 获取突变体文件
+        all_files = glob.glob(os.path.join(args.indir, args.pattern))
+        mut_files = [f for f in all_files if os.path.abspath(f) != os.path.abspath(args.wt)]
+
     for f in sorted(mut_files):
         fname = os.path.basename(f)
         # 提取突变信息
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+断点续跑的完成标记
+
+标记文件与 utils.sh 中的 mark_done/unit_done 格式一致（sha256sum 清单，绝对路径），
+Shell 与 Python 两侧写出的标记可以互相校验。
+"""
+import argparse
+import glob
+import hashlib
+import os
+import sys
+import tempfile
+
+
+def file_sha256(path, chunk=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def expand_outputs(paths):
+    """展开通配符，返回排序后的绝对路径列表"""
+    files = []
+    for p in paths:
+        matched = glob.glob(p) if glob.has_magic(p) else [p]
+        files.extend(os.path.realpath(m) for m in sorted(matched))
+    return files
+
+
+def mark_done(marker, paths):
+    """原子写入完成标记；任一输出缺失时不写标记并返回 False"""
+    files = expand_outputs(paths)
+    if not files or not all(os.path.isfile(f) for f in files):
+        return False
+    os.makedirs(os.path.dirname(os.path.abspath(marker)), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=".tmp.", dir=os.path.dirname(os.path.abspath(marker)))
+    with os.fdopen(fd, "w") as f:
+        for path in files:
+            f.write(f"{file_sha256(path)}  {path}\n")
+    os.replace(tmp, marker)
+    return True
+
+
+def read_marker(marker):
+    entries = []
+    with open(marker) as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line:
+                continue
+            digest, path = line.split("  ", 1)
+            entries.append((digest, path))
+    return entries
+
+
+def unit_done(marker):
+    """标记存在且所有输出的 sha256 一致时返回 True"""
+    try:
+        entries = read_marker(marker)
+    except (OSError, ValueError):
+        return False
+    if not entries:
+        return False
+    for digest, path in entries:
+        if not os.path.isfile(path) or file_sha256(path) != digest:
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查断点续跑完成标记的状态")
+    parser.add_argument("-d", "--dir", required=True, help="标记目录（out/<name>_out/.done）")
+    parser.add_argument("--prune", action="store_true", help="删除校验失败的标记")
+    args = parser.parse_args()
+
+    markers = sorted(glob.glob(os.path.join(args.dir, "**", "*.done"), recursive=True))
+    done, bad = 0, []
+    for marker in markers:
+        if unit_done(marker):
+            done += 1
+        else:
+            bad.append(marker)
+
+    for marker in bad:
+        print(f"[INVALID] {os.path.relpath(marker, args.dir)}")
+        if args.prune:
+            os.remove(marker)
+    print(f"已完成 {done} 个单元，失效 {len(bad)} 个")
+    if bad and not args.prune:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+链间界面接触的快速检测
+
+在重原子坐标上按互作类型的距离阈值（与 PLIP 的默认阈值一致）查找受体链与配体链之间的
+原子对：疏水（仅与碳相连的碳原子）、氢键（供体-受体 N/O）、盐桥（带电基团）、
+π-π 堆积与 π-阳离子（芳香环中心）。近邻搜索优先使用 scipy 的 cKDTree，
+未安装 scipy 时使用 NumPy 网格哈希，单个复合物通常在几十毫秒内完成。
+
+    scan     输出配体链上的候选突变位点，格式与 Energy_calculate.sh 中的 PLIP_MUT 相同（如 QA24a,KA31a）
+    compare  与 PLIP 结果（PLIP_<name>_<类型>.csv）比较，按互作类型输出位点的一致性
+
+原子类型按残基与原子名判断，不做加氢和几何（角度）检查，因此是 PLIP 的超集近似，
+适合在运行 PLIP/FoldX 之前快速比较不同的链划分。
+"""
+import argparse
+import csv
+import glob
+import itertools
+import os
+import sys
+import time
+
+import numpy as np
+
+from pdb_chains import Structure, normalize_chains
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+AA3_TO_AA1 = {
+    "ALA": "A", "CYS": "C", "ASP": "D", "GLU": "E", "PHE": "F",
+    "GLY": "G", "HIS": "H", "ILE": "I", "LYS": "K", "LEU": "L",
+    "MET": "M", "ASN": "N", "PRO": "P", "GLN": "Q", "ARG": "R",
+    "SER": "S", "THR": "T", "VAL": "V", "TRP": "W", "TYR": "Y",
+}
+
+# 只与碳/氢相连的侧链碳原子（PLIP 的疏水原子）
+HYDROPHOBIC = {
+    "ALA": {"CB"}, "VAL": {"CB", "CG1", "CG2"}, "LEU": {"CB", "CG", "CD1", "CD2"},
+    "ILE": {"CB", "CG1", "CG2", "CD1"}, "MET": {"CB"}, "PHE": {"CB", "CG", "CD1", "CD2", "CE1", "CE2", "CZ"},
+    "TRP": {"CB", "CG", "CD2", "CE3", "CZ2", "CZ3", "CH2"}, "TYR": {"CB", "CG", "CD1", "CD2", "CE1", "CE2"},
+    "PRO": {"CB", "CG"}, "LYS": {"CB", "CG", "CD"}, "ARG": {"CB", "CG"}, "GLU": {"CB", "CG"},
+    "GLN": {"CB", "CG"}, "ASP": {"CB"}, "ASN": {"CB"}, "THR": {"CG2"}, "HIS": {"CB"},
+}
+# 侧链氢键供体/受体（主链 N 为供体、O 为受体，另行处理）
+DONORS = {
+    "SER": {"OG"}, "THR": {"OG1"}, "TYR": {"OH"}, "ASN": {"ND2"}, "GLN": {"NE2"},
+    "HIS": {"ND1", "NE2"}, "LYS": {"NZ"}, "ARG": {"NE", "NH1", "NH2"}, "TRP": {"NE1"}, "CYS": {"SG"},
+}
+ACCEPTORS = {
+    "SER": {"OG"}, "THR": {"OG1"}, "TYR": {"OH"}, "ASN": {"OD1"}, "GLN": {"OE1"},
+    "HIS": {"ND1", "NE2"}, "ASP": {"OD1", "OD2"}, "GLU": {"OE1", "OE2"}, "MET": {"SD"},
+}
+POSITIVE = {"LYS": {"NZ"}, "ARG": {"NE", "NH1", "NH2"}, "HIS": {"ND1", "NE2"}}
+NEGATIVE = {"ASP": {"OD1", "OD2"}, "GLU": {"OE1", "OE2"}}
+RINGS = {
+    "PHE": [("CG", "CD1", "CD2", "CE1", "CE2", "CZ")],
+    "TYR": [("CG", "CD1", "CD2", "CE1", "CE2", "CZ")],
+    "TRP": [("CG", "CD1", "NE1", "CE2", "CD2"), ("CD2", "CE2", "CE3", "CZ2", "CZ3", "CH2")],
+    "HIS": [("CG", "ND1", "CD2", "CE1", "NE2")],
+}
+
+# 各互作类型的距离上限（Å），取 PLIP 的默认值；名称与 PLIP 结果文件中的类型一致
+CUTOFFS = {
+    "hydrophobic_interactions": 4.0,
+    "hydrogen_bonds": 4.1,
+    "salt_bridges": 5.5,
+    "pi_stacks": 5.5,
+    "pi_cation_interactions": 6.0,
+}
+
+
+def pairs_within(a, b, cutoff):
+    """a、b 两组坐标中距离不超过 cutoff 的点对，返回 (a 下标, b 下标, 距离)"""
+    if not len(a) or not len(b):
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0)
+    if cKDTree is not None:
+        matrix = cKDTree(a).sparse_distance_matrix(cKDTree(b), cutoff, output_type="ndarray")
+        return matrix["i"].astype(np.int64), matrix["j"].astype(np.int64), matrix["v"]
+
+    # 网格哈希：边长为 cutoff 的格子，每个点只需检查相邻 27 个格子中的点
+    origin = np.minimum(a.min(axis=0), b.min(axis=0))
+    cell_a = np.floor((a - origin) / cutoff).astype(np.int64) + 1
+    cell_b = np.floor((b - origin) / cutoff).astype(np.int64) + 1
+    dims = np.maximum(cell_a.max(axis=0), cell_b.max(axis=0)) + 2
+
+    def key(cells):
+        return (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+
+    order = np.argsort(key(cell_b), kind="stable")
+    sorted_keys = key(cell_b)[order]
+    ii, jj = [], []
+    for offset in itertools.product((-1, 0, 1), repeat=3):
+        k = key(cell_a + np.array(offset))
+        lo = np.searchsorted(sorted_keys, k, "left")
+        counts = np.searchsorted(sorted_keys, k, "right") - lo
+        total = counts.sum()
+        if not total:
+            continue
+        ii.append(np.repeat(np.arange(len(a)), counts))
+        within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        jj.append(order[np.repeat(lo, counts) + within])
+    if not ii:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0)
+    i, j = np.concatenate(ii), np.concatenate(jj)
+    d = np.linalg.norm(a[i] - b[j], axis=1)
+    keep = d <= cutoff
+    return i[keep], j[keep], d[keep]
+
+
+def element(structure):
+    """元素符号：优先取第 77-78 列，缺失时由原子名推断"""
+    tail = np.char.strip(np.array([t[10:12] for t in structure["tail"]], dtype="U2"))
+    names = np.char.strip(structure["name"])
+    guess = np.array([n.lstrip("0123456789")[:1] for n in names], dtype="U2")
+    return np.where(tail != "", np.char.upper(tail), guess)
+
+
+class Side:
+    """一侧（受体或配体）的重原子及其残基标识"""
+
+    def __init__(self, structure):
+        heavy = element(structure) != "H"
+        s = structure.take(heavy & np.isin(structure["resname"], list(AA3_TO_AA1)))
+        self.xyz = s["xyz"]
+        self.resname = s["resname"]
+        self.name = np.char.strip(s["name"])
+        self.chain = s["chain"]
+        self.resseq = s["resseq"]
+        self.icode = s["icode"]
+        self.residue = np.array([f"{AA3_TO_AA1[r]}{c}{n}{i.strip()}" for r, c, n, i
+                                 in zip(self.resname, self.chain, self.resseq, self.icode)], dtype=str)
+
+    def select(self, table, backbone=()):
+        # 脯氨酸主链 N 没有氢，不是供体
+        mask = np.isin(self.name, list(backbone)) & ~((self.resname == "PRO") & (self.name == "N"))
+        for resname, names in table.items():
+            mask |= (self.resname == resname) & np.isin(self.name, list(names))
+        return np.flatnonzero(mask)
+
+    def rings(self):
+        """芳香环中心：返回 (坐标, 残基标识)"""
+        # 残基标识 -> {原子名: 下标}，只取芳香残基的原子（同名原子取第一个，忽略其余构象）
+        atoms = {}
+        for i in np.flatnonzero(np.isin(self.resname, list(RINGS))):
+            atoms.setdefault(self.residue[i], {}).setdefault(self.name[i], i)
+        centers, labels = [], []
+        for label, names in atoms.items():
+            for ring in RINGS[self.resname[next(iter(names.values()))]]:
+                if all(n in names for n in ring):
+                    centers.append(self.xyz[[names[n] for n in ring]].mean(axis=0))
+                    labels.append(label)
+        return np.array(centers, dtype=np.float64).reshape(-1, 3), np.array(labels, dtype=str)
+
+
+def detect(structure, rec_chains, lig_chains):
+    """返回 [(受体残基, 配体残基, 类型, 距离)]，每对残基每种类型只保留最短距离"""
+    rec = Side(structure.select_chains(rec_chains))
+    lig = Side(structure.select_chains(lig_chains))
+    found = {}
+
+    def add(itype, rec_labels, lig_labels, dist):
+        for r, l, d in zip(rec_labels, lig_labels, dist):
+            key = (r, l, itype)
+            if key not in found or d < found[key]:
+                found[key] = d
+
+    def atoms(itype, rec_idx, lig_idx):
+        i, j, d = pairs_within(rec.xyz[rec_idx], lig.xyz[lig_idx], CUTOFFS[itype])
+        add(itype, rec.residue[rec_idx][i], lig.residue[lig_idx][j], d)
+
+    atoms("hydrophobic_interactions", rec.select(HYDROPHOBIC), lig.select(HYDROPHOBIC))
+    # 氢键：一侧供体对另一侧受体，两个方向都检查
+    atoms("hydrogen_bonds", rec.select(DONORS, ("N",)), lig.select(ACCEPTORS, ("O", "OXT")))
+    atoms("hydrogen_bonds", rec.select(ACCEPTORS, ("O", "OXT")), lig.select(DONORS, ("N",)))
+    atoms("salt_bridges", rec.select(POSITIVE), lig.select(NEGATIVE))
+    atoms("salt_bridges", rec.select(NEGATIVE), lig.select(POSITIVE))
+
+    rec_rings, rec_ring_labels = rec.rings()
+    lig_rings, lig_ring_labels = lig.rings()
+    i, j, d = pairs_within(rec_rings, lig_rings, CUTOFFS["pi_stacks"])
+    add("pi_stacks", rec_ring_labels[i], lig_ring_labels[j], d)
+    rec_pos, lig_pos = rec.select(POSITIVE), lig.select(POSITIVE)
+    i, j, d = pairs_within(rec_rings, lig.xyz[lig_pos], CUTOFFS["pi_cation_interactions"])
+    add("pi_cation_interactions", rec_ring_labels[i], lig.residue[lig_pos][j], d)
+    i, j, d = pairs_within(rec.xyz[rec_pos], lig_rings, CUTOFFS["pi_cation_interactions"])
+    add("pi_cation_interactions", rec.residue[rec_pos][i], lig_ring_labels[j], d)
+
+    return sorted((r, l, t, float(d)) for (r, l, t), d in found.items())
+
+
+def residue_number(label):
+    digits = "".join(ch for ch in label[2:] if ch.isdigit() or ch == "-")
+    return int(digits) if digits.lstrip("-") else 0
+
+
+def positions(labels):
+    """配体残基 -> PositionScan 位点串（按残基号排序，与 Energy_calculate.sh 的 awk 相同）"""
+    unique = sorted(set(labels), key=lambda x: (residue_number(x), x))
+    return ",".join(f"{label}a" for label in unique)
+
+
+def read_plip(paths):
+    """PLIP_<name>_<类型>.csv 中的配体残基，返回 {类型: 残基集合}"""
+    found = {}
+    for path in paths:
+        itype = next((t for t in CUTOFFS if path.endswith(f"_{t}.csv")), None)
+        if itype is None:
+            continue
+        with open(path, newline="") as f:
+            found.setdefault(itype, set()).update(row["lig"] for row in csv.DictReader(f)
+                                                  if row.get("lig") not in (None, "", "NA"))
+    return found
+
+
+def scan(args):
+    start = time.perf_counter()
+    contacts = detect(Structure.read(args.input), normalize_chains(args.rec), normalize_chains(args.lig))
+    elapsed = time.perf_counter() - start
+    if args.contacts:
+        with open(args.contacts, "w", newline="") as f:
+            writer = csv.writer(f, delimiter="\t")
+            writer.writerow(["rec", "lig", "type", "distance"])
+            writer.writerows((r, l, t, f"{d:.2f}") for r, l, t, d in contacts)
+    lig_residues = [l for _, l, _, _ in contacts]
+    print(positions(lig_residues))
+    print(f"  [CONTACT] {len(set(lig_residues))} 个配体残基，{len(contacts)} 对残基接触，"
+          f"{elapsed * 1000:.1f} ms（{'cKDTree' if cKDTree is not None else '网格哈希'}）", file=sys.stderr)
+
+
+def compare(args):
+    contacts = detect(Structure.read(args.input), normalize_chains(args.rec), normalize_chains(args.lig))
+    plip_files = [p for pattern in args.plip for p in sorted(glob.glob(pattern))]
+    plip = read_plip(plip_files)
+    if not plip:
+        print(f"未找到 PLIP 结果: {' '.join(args.plip)}", file=sys.stderr)
+        return 1
+
+    ours = {}
+    for _, lig, itype, _ in contacts:
+        ours.setdefault(itype, set()).add(lig)
+    ours["all"] = set().union(*ours.values()) if ours else set()
+    plip["all"] = set().union(*plip.values())
+
+    rows = []
+    for itype in list(CUTOFFS) + ["all"]:
+        a, b = ours.get(itype, set()), plip.get(itype, set())
+        both = a & b
+        recall = len(both) / len(b) if b else float("nan")
+        precision = len(both) / len(a) if a else float("nan")
+        jaccard = len(both) / len(a | b) if a | b else float("nan")
+        rows.append([itype, len(a), len(b), len(both), f"{recall:.3f}", f"{precision:.3f}", f"{jaccard:.3f}",
+                     ",".join(sorted(b - a, key=residue_number)), ",".join(sorted(a - b, key=residue_number))])
+    header = ["type", "contacts", "plip", "shared", "recall", "precision", "jaccard", "missed", "extra"]
+    out = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        writer = csv.writer(out, delimiter="\t", lineterminator="\n")
+        writer.writerow(header)
+        writer.writerows(rows)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="链间界面接触快速检测（PLIP 的预筛选）")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def common(p):
+        p.add_argument("-i", "--input", required=True, help="复合物 PDB")
+        p.add_argument("-r", "--rec", required=True, help="受体链，如 B 或 HL")
+        p.add_argument("-l", "--lig", required=True, help="配体链（改造目标）")
+
+    p_scan = sub.add_parser("scan", help="输出配体链上的候选突变位点（PLIP_MUT 格式）")
+    common(p_scan)
+    p_scan.add_argument("--contacts", help="残基对接触明细（TSV）")
+
+    p_compare = sub.add_parser("compare", help="与 PLIP 结果比较配体位点的一致性")
+    common(p_compare)
+    p_compare.add_argument("--plip", nargs="+", required=True, help="PLIP_<name>_<类型>.csv（可使用通配符）")
+    p_compare.add_argument("-o", "--output", help="一致性报告（TSV，缺省输出到标准输出）")
+
+    args = parser.parse_args()
+    if args.command == "scan":
+        scan(args)
+    elif args.command == "compare":
+        sys.exit(compare(args))
+
+
+if __name__ == "__main__":
+    main()
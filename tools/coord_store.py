@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+内存映射的结构坐标库
+
+一次运行会留下数千个 PDB 文本文件（mutation/ 下的 FoldX 突变体、resfiles/*/ 下的精修构象、
+拼接后的复合物、docking/best 下的最优对接构象），下游工具每次都要重新解析文本。
+坐标库把它们打包成一个文件：原子信息相同的结构共用一张拓扑表（原子名、残基、链等），
+每个结构只保存一段 float32 坐标，并按结构名、类别、突变体与构象编号建立索引。
+读取时整个文件以 np.memmap 映射，坐标与拓扑直接以视图返回，不复制也不解析文本。
+
+文件布局：
+    0   8 字节标识 TRIMCRD1 + 8 字节索引偏移（uint64，小端）
+    64  各结构的坐标、各拓扑表的字段数组（均按 64 字节对齐）
+    末尾 JSON 索引（拓扑表字段的偏移/类型，结构名 -> 坐标偏移、原子数、拓扑编号等）
+
+    build   打包结构（kind=通配符 或 PDB 路径），--append 时保留已有结构
+    list    按类别、突变体或名称通配符列出结构
+    export  按需导出为 PDB
+    info    原子数、拓扑表数与文件大小
+
+其他工具可用 "<坐标库>::<结构名>" 代替 PDB 路径（pdb_chains.Structure.read）。
+"""
+import argparse
+import fnmatch
+import glob
+import hashlib
+import json
+import os
+import re
+import struct
+import sys
+
+import numpy as np
+
+from pdb_chains import FIELDS, Structure
+
+MAGIC = b"TRIMCRD1"
+ALIGN = 64
+# 拓扑字段：文本字段按字节串保存，其余按原类型
+TOPOLOGY = [(name, f"S{end - start}") for name, start, end in FIELDS] + [
+    ("serial", "<i8"), ("resseq", "<i8"), ("occupancy", "<f4"), ("bfactor", "<f4"),
+]
+# 突变体名称：链 + 残基号 + 突变后氨基酸，如 A24R
+MUTANT = re.compile(r"^[A-Za-z0-9]-?\d+[A-Z]$")
+
+
+def describe(name):
+    """从结构名（相对路径）推断突变体与构象编号：取第一个形如 A24R 的片段，末尾的数字片段为构象编号"""
+    tokens = re.split(r"[/_]", name)
+    mutant = next((t for t in tokens if MUTANT.match(t)), "")
+    decoy = tokens[-1] if tokens[-1].isdigit() else ""
+    return mutant, decoy
+
+
+class CoordStore:
+    """只读打开的坐标库"""
+
+    def __init__(self, path):
+        self.path = path
+        self.data = np.memmap(path, dtype=np.uint8, mode="r")
+        if bytes(self.data[:8]) != MAGIC:
+            raise ValueError(f"{path} 不是坐标库文件")
+        (index_offset,) = struct.unpack("<Q", bytes(self.data[8:16]))
+        index = json.loads(bytes(self.data[index_offset:]).decode())
+        self.topologies = index["topologies"]
+        self.models = {m["name"]: m for m in index["models"]}
+
+    def __len__(self):
+        return len(self.models)
+
+    def __contains__(self, name):
+        return name in self.models
+
+    def _array(self, offset, dtype, count):
+        dtype = np.dtype(dtype)
+        return self.data[offset:offset + count * dtype.itemsize].view(dtype)
+
+    def names(self, pattern=None, kind=None, mutant=None):
+        return [name for name, m in self.models.items()
+                if (pattern is None or fnmatch.fnmatch(name, pattern))
+                and (kind is None or m["kind"] == kind)
+                and (mutant is None or m["mutant"] == mutant)]
+
+    def xyz(self, name):
+        """float32 坐标视图 (原子数, 3)"""
+        m = self.models[name]
+        return self._array(m["offset"], "<f4", m["atoms"] * 3).reshape(-1, 3)
+
+    def topology(self, name):
+        """拓扑字段视图 {字段: 数组}"""
+        topology = self.topologies[self.models[name]["topology"]]
+        return {field: self._array(offset, dtype, topology["atoms"])
+                for field, (offset, dtype) in topology["fields"].items()}
+
+    def structure(self, name):
+        """转换为 pdb_chains.Structure（复制为可写数组，供裁剪、拼接、导出使用）"""
+        fields = {}
+        for field, values in self.topology(name).items():
+            if values.dtype.kind == "S":
+                fields[field] = np.char.decode(values, "ascii")
+            elif values.dtype.kind == "f":
+                fields[field] = values.astype(np.float64)
+            else:
+                fields[field] = np.array(values, dtype=np.int64)
+        fields["xyz"] = self.xyz(name).astype(np.float64)
+        return Structure(fields)
+
+
+class StoreWriter:
+    """顺序写入坐标，关闭时写入拓扑表与索引；先写临时文件，完成后替换"""
+
+    def __init__(self, path):
+        self.path = path
+        self.f = open(f"{path}.tmp", "wb")
+        self.f.write(MAGIC + struct.pack("<Q", 0))
+        self.topologies = {}
+        self.models = []
+
+    def _write(self, array):
+        self.f.write(b"\0" * (-self.f.tell() % ALIGN))
+        offset = self.f.tell()
+        self.f.write(np.ascontiguousarray(array).tobytes())
+        return offset
+
+    def add(self, name, kind, topology, xyz, source=""):
+        """topology 为 {字段: 数组}（字段与 TOPOLOGY 相同），相同拓扑只保存一次"""
+        arrays = {field: np.asarray(topology[field]).astype(dtype) for field, dtype in TOPOLOGY}
+        digest = hashlib.sha1()
+        for field, _ in TOPOLOGY:
+            digest.update(arrays[field].tobytes())
+        key = digest.hexdigest()
+        if key not in self.topologies:
+            self.topologies[key] = (len(self.topologies), arrays)
+        mutant, decoy = describe(name)
+        self.models.append({
+            "name": name, "kind": kind, "mutant": mutant, "decoy": decoy, "source": source,
+            "topology": self.topologies[key][0], "atoms": len(xyz),
+            "offset": self._write(np.asarray(xyz, dtype="<f4")),
+        })
+
+    def close(self):
+        topologies = []
+        for _, arrays in sorted(self.topologies.values(), key=lambda t: t[0]):
+            fields = {field: [self._write(arrays[field]), dtype] for field, dtype in TOPOLOGY}
+            topologies.append({"atoms": len(arrays["serial"]), "fields": fields})
+        index_offset = self.f.tell()
+        self.f.write(json.dumps({"topologies": topologies, "models": self.models}).encode())
+        self.f.seek(8)
+        self.f.write(struct.pack("<Q", index_offset))
+        self.f.close()
+        os.replace(f"{self.path}.tmp", self.path)
+
+
+def expand_inputs(inputs):
+    """kind=通配符 / PDB 路径 -> [(类别, 路径)]"""
+    files = []
+    for item in inputs:
+        kind, sep, pattern = item.partition("=")
+        if not sep:
+            kind, pattern = "pdb", item
+        files.extend((kind, path) for path in sorted(glob.glob(pattern)))
+    return files
+
+
+def build(args):
+    root = os.path.abspath(args.root or os.path.dirname(os.path.abspath(args.output)))
+    files = expand_inputs(args.inputs)
+    names = {}
+    for kind, path in files:
+        names[os.path.splitext(os.path.relpath(os.path.abspath(path), root))[0]] = (kind, path)
+
+    old = CoordStore(args.output) if args.append and os.path.exists(args.output) else None
+    writer = StoreWriter(args.output)
+    try:
+        if old is not None:
+            # 保留已有结构（同名结构以本次输入为准）
+            for name, m in old.models.items():
+                if name not in names:
+                    writer.add(name, m["kind"], old.topology(name), old.xyz(name), m["source"])
+        for name, (kind, path) in names.items():
+            s = Structure.read(path)
+            writer.add(name, kind, s.fields, s["xyz"], os.path.relpath(os.path.abspath(path), root))
+    except BaseException:
+        writer.f.close()
+        os.remove(f"{args.output}.tmp")
+        raise
+    writer.close()
+    print(f"  [STORE] {args.output}: {len(writer.models)} 个结构，{len(writer.topologies)} 张拓扑表，"
+          f"{os.path.getsize(args.output) / 2 ** 20:.1f} MB")
+
+
+def list_models(args):
+    store = CoordStore(args.store)
+    for name in store.names(args.pattern, args.kind, args.mutant):
+        m = store.models[name]
+        print("\t".join([name, m["kind"], m["mutant"] or "-", m["decoy"] or "-", str(m["atoms"])]))
+
+
+def export(args):
+    store = CoordStore(args.store)
+    names = [n for pattern in args.names for n in store.names(pattern)]
+    if not names:
+        sys.exit(f"坐标库中没有匹配的结构: {' '.join(args.names)}")
+    if len(names) == 1 and args.output.endswith(".pdb"):
+        store.structure(names[0]).write(args.output)
+        return
+    for name in names:
+        path = os.path.join(args.output, f"{name}.pdb")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        store.structure(name).write(path)
+
+
+def info(args):
+    store = CoordStore(args.store)
+    atoms = sum(m["atoms"] for m in store.models.values())
+    kinds = {}
+    for m in store.models.values():
+        kinds[m["kind"]] = kinds.get(m["kind"], 0) + 1
+    print(f"结构数: {len(store)}（{', '.join(f'{k} {v}' for k, v in sorted(kinds.items()))}）")
+    print(f"拓扑表: {len(store.topologies)}")
+    print(f"原子数: {atoms}")
+    print(f"文件大小: {os.path.getsize(args.store) / 2 ** 20:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="内存映射的结构坐标库")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_build = sub.add_parser("build", help="把 PDB 打包为坐标库")
+    p_build.add_argument("-o", "--output", required=True, help="坐标库文件（如 out/complex_out/structures.trim）")
+    p_build.add_argument("--root", help="结构名相对的目录（缺省为坐标库所在目录）")
+    p_build.add_argument("--append", action="store_true", help="保留坐标库中已有的结构")
+    p_build.add_argument("inputs", nargs="+", help="kind=通配符（如 \"docking=out/x_out/docking/best/*.pdb\"）或 PDB 路径")
+
+    p_list = sub.add_parser("list", help="列出结构（名称、类别、突变体、构象编号、原子数）")
+    p_list.add_argument("store")
+    p_list.add_argument("pattern", nargs="?", help="结构名通配符")
+    p_list.add_argument("--kind")
+    p_list.add_argument("--mutant", help="如 A24R")
+
+    p_export = sub.add_parser("export", help="导出为 PDB")
+    p_export.add_argument("store")
+    p_export.add_argument("names", nargs="+", help="结构名（可使用通配符）")
+    p_export.add_argument("-o", "--output", required=True, help="输出目录；只导出一个结构时可为 .pdb 文件")
+
+    p_info = sub.add_parser("info", help="坐标库概况")
+    p_info.add_argument("store")
+
+    args = parser.parse_args()
+    {"build": build, "list": list_models, "export": export, "info": info}[args.command](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+TRIM 任务图调度器
+
+每个任务声明自己的输入和输出文件，任务间依赖由“某任务的输入是另一任务的输出”
+自动推导；所有就绪任务共享同一个 CPU 核数预算（THREAD）并发执行。
+成功的任务会写入带输出校验和的完成标记，重跑时跳过已完成且输出完好的任务。
+
+--manifest 批量模式：清单（CSV 或 YAML）中的每个复合物各自构建一组任务，全部放入同一个
+任务图，由一个调度器在同一核数预算内交错执行；各复合物仍输出到 <outdir>/<name>_out。
+"""
+import argparse
+import csv
+import fnmatch
+import glob
+import os
+import signal
+import sys
+import threading
+import time
+
+import checkpoint
+import job_trace
+from exec_backend import LocalBackend
+
+
+def log(msg):
+    print(f"  [{time.strftime('%F %T')}] [DAG] {msg}", flush=True)
+
+
+def path_exists(path):
+    """路径可以是通配符，匹配到任意文件即视为存在"""
+    if glob.has_magic(path):
+        return bool(glob.glob(path))
+    return os.path.exists(path)
+
+
+def path_matches(produced, wanted):
+    """判断某任务的输出是否满足另一任务的输入（两侧都可能是通配符）"""
+    return produced == wanted or fnmatch.fnmatch(produced, wanted) or fnmatch.fnmatch(wanted, produced)
+
+
+class Task:
+    """一个调度单元：一条外部命令及其输入、输出和核数需求
+
+    cores 为最少核数，max_cores 为弹性上限；实际分配的核数会替换命令中的 {cores}。
+    stage/mutant 用于资源记录（job_trace），stage 缺省为任务名。
+    marker 为完成标记路径（缺省为调度器 state_dir 下的 dag/<任务名>.done）。
+    """
+
+    def __init__(self, name, cmd, inputs=(), outputs=(), cores=1, max_cores=None, deps=(),
+                 stage=None, mutant=None, marker=None):
+        self.name = name
+        self.stage = stage or name
+        self.mutant = mutant
+        self.cmd = cmd
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.cores = cores
+        self.max_cores = max(max_cores or cores, cores)
+        self.deps = set(deps)
+        self.marker = marker
+        self.status = "pending"
+        self.granted = 0
+        self.returncode = None
+        self.start = None
+        self.end = None
+
+    def command(self):
+        if isinstance(self.cmd, str):
+            return ["bash", "-c", self.cmd.replace("{cores}", str(self.granted))]
+        return [str(c).replace("{cores}", str(self.granted)) for c in self.cmd]
+
+
+class TaskGraph:
+    def __init__(self):
+        self.tasks = {}
+
+    def add(self, task):
+        if task.name in self.tasks:
+            raise ValueError(f"任务名重复: {task.name}")
+        self.tasks[task.name] = task
+        return task
+
+    def resolve(self):
+        """由输入/输出推导依赖，并检查是否存在环"""
+        for task in self.tasks.values():
+            for wanted in task.inputs:
+                for other in self.tasks.values():
+                    if other is task:
+                        continue
+                    if any(path_matches(p, wanted) for p in other.outputs):
+                        task.deps.add(other.name)
+            unknown = task.deps - set(self.tasks)
+            if unknown:
+                raise ValueError(f"任务 {task.name} 依赖不存在的任务: {', '.join(sorted(unknown))}")
+
+        order, state = [], {}
+
+        def visit(name, stack):
+            if state.get(name) == "done":
+                return
+            if state.get(name) == "visiting":
+                raise ValueError(f"任务图存在环: {' -> '.join(stack + [name])}")
+            state[name] = "visiting"
+            for dep in sorted(self.tasks[name].deps):
+                visit(dep, stack + [name])
+            state[name] = "done"
+            order.append(name)
+
+        for name in self.tasks:
+            visit(name, [])
+        return order
+
+    def ready(self):
+        return [t for t in self.tasks.values()
+                if t.status == "pending" and all(self.tasks[d].status == "done" for d in t.deps)]
+
+
+class Scheduler:
+    """在固定核数预算内调度任务图，按声明顺序优先启动就绪任务；任务由 backend 执行（缺省在本机）"""
+
+    def __init__(self, threads, state_dir=None, backend=None):
+        self.threads = max(1, threads)
+        self.free = self.threads
+        self.state_dir = state_dir
+        self.backend = backend or LocalBackend()
+        self.cond = threading.Condition()
+
+    def marker(self, task):
+        if not task.outputs:
+            return None
+        if task.marker:
+            return task.marker
+        if not self.state_dir:
+            return None
+        return os.path.join(self.state_dir, "dag", f"{task.name}.done")
+
+    def _run_task(self, task):
+        try:
+            rc = self.backend.run(task)
+        except OSError as e:
+            log(f"{task.name} 启动失败: {e}")
+            rc = 127
+        with self.cond:
+            task.end = time.time()
+            task.returncode = rc
+            missing = [p for p in task.outputs if not path_exists(p)]
+            if rc != 0:
+                task.status = "failed"
+                log(f"[FAIL] {task.name} rc={rc}")
+            elif missing:
+                task.status = "failed"
+                log(f"[FAIL] {task.name} 缺少输出: {', '.join(missing)}")
+                job_trace.record_failure(task.stage, task.mutant, task.command(), rc,
+                                         f"missing output: {', '.join(missing)}")
+            else:
+                task.status = "done"
+                log(f"[END] {task.name} {task.end - task.start:.1f}s")
+                marker = self.marker(task)
+                if marker:
+                    checkpoint.mark_done(marker, task.outputs)
+            self.free += task.granted
+            self.cond.notify_all()
+
+    def _skip_blocked(self, graph):
+        changed = True
+        while changed:
+            changed = False
+            for task in graph.tasks.values():
+                if task.status != "pending":
+                    continue
+                blocked = sorted(d for d in task.deps if graph.tasks[d].status in ("failed", "skipped"))
+                if blocked:
+                    task.status = "skipped"
+                    log(f"[SKIP] {task.name} 上游任务失败")
+                    job_trace.record_failure(task.stage, task.mutant, task.command(), "-",
+                                             f"skipped: upstream {', '.join(blocked)} failed")
+                    changed = True
+
+    def _start_ready(self, graph):
+        ready = graph.ready()
+        for i, task in enumerate(ready):
+            marker = self.marker(task)
+            if marker and checkpoint.unit_done(marker):
+                task.status = "done"
+                log(f"[RESUME] {task.name} 已完成，跳过")
+                continue
+            need = min(task.cores, self.threads)
+            if need > self.free:
+                continue
+            missing = [p for p in task.inputs if not path_exists(p)]
+            if missing:
+                task.status = "failed"
+                log(f"[FAIL] {task.name} 缺少输入: {', '.join(missing)}")
+                job_trace.record_failure(task.stage, task.mutant, task.command(), "-",
+                                         f"missing input: {', '.join(missing)}")
+                continue
+            # 弹性核数在同时就绪的任务间均分（多个复合物的任务同时就绪时不被第一个占满）
+            share = max(need, self.free // (len(ready) - i))
+            task.granted = min(task.max_cores, share)
+            self.free -= task.granted
+            task.status = "running"
+            task.start = time.time()
+            log(f"[START] {task.name} cores={task.granted}")
+            threading.Thread(target=self._run_task, args=(task,), daemon=True).start()
+
+    def run(self, graph):
+        graph.resolve()
+        try:
+            with self.cond:
+                while True:
+                    self._skip_blocked(graph)
+                    self._start_ready(graph)
+                    statuses = [t.status for t in graph.tasks.values()]
+                    if "running" not in statuses:
+                        # 缺少输入而失败的任务会让下游变为跳过，再检查一轮
+                        self._skip_blocked(graph)
+                        if not graph.ready():
+                            break
+                        continue
+                    self.cond.wait()
+        except BaseException:
+            # Ctrl-C、SIGTERM 等中止调度时终止正在运行的任务（slurm 后端取消已提交的作业）
+            log("[ABORT] 调度中止，终止运行中的任务")
+            self.backend.cancel()
+            raise
+        return all(t.status == "done" for t in graph.tasks.values())
+
+
+def add_complex(graph, args, pdb, out, rec, lig, prefix="", state_dir=None):
+    """加入一个复合物的 TRIM 任务：WT 精修与链提取只依赖输入结构，可与 PLIP/FoldX 阶段并行
+
+    prefix 为批量模式下的任务名前缀（<复合物>/），state_dir 为该复合物的完成标记目录。
+    """
+    base = os.path.splitext(os.path.basename(pdb))[0]
+    result = os.path.join(out, "result")
+    scripts = os.path.join(args.base_dir, "script")
+    residues = os.path.join(out, f"PLIP_{base}_chain{lig}_residues.txt")
+    filtered = os.path.join(result, "filtered_ddg_mutations.csv")
+    wt_outputs = [
+        os.path.join(out, f"{base}.pdb"),
+        os.path.join(out, f"{base}_{lig}.pdb"),
+        os.path.join(out, f"{base}_{rec}.pdb"),
+    ]
+
+    def add(name, cmd, **kwargs):
+        marker = os.path.join(state_dir, "dag", f"{name}.done") if state_dir else None
+        graph.add(Task(f"{prefix}{name}", cmd, stage=name, mutant=base if prefix else None,
+                       marker=marker, **kwargs))
+
+    add(
+        "interaction_analysis",
+        ["bash", os.path.join(scripts, "interaction_analysis.sh"), pdb, out,
+         rec, lig, base, args.base_dir, args.conda_base, result],
+        inputs=[pdb],
+        outputs=[residues],
+    )
+    add(
+        "wt_prepare",
+        ["bash", os.path.join(scripts, "mutation_evaluate.sh"), pdb, out,
+         rec, lig, result, args.rosetta, args.base_dir, args.conda_base, "{cores}", "1-2"],
+        inputs=[pdb],
+        outputs=wt_outputs,
+        # WT 精修按分片并行；最多占一半核，给随后启动的 FoldX 阶段留出余量
+        max_cores=max(1, args.threads // 2),
+    )
+    add(
+        "energy_calculate",
+        ["bash", os.path.join(scripts, "Energy_calculate.sh"), pdb, out,
+         rec, lig, base, os.path.join(out, "mutation"), os.path.join(out, "energy"),
+         result, args.foldx, args.base_dir, args.conda_base, "{cores}"],
+        inputs=[residues],
+        outputs=[filtered],
+        max_cores=args.threads,
+    )
+    add(
+        "mutation_evaluate",
+        ["bash", os.path.join(scripts, "mutation_evaluate.sh"), pdb, out,
+         rec, lig, result, args.rosetta, args.base_dir, args.conda_base, "{cores}", "3-9"],
+        inputs=[filtered, residues] + wt_outputs,
+        outputs=[os.path.join(result, "interaction_summary.csv")],
+        max_cores=args.threads,
+    )
+
+
+def build_trim_graph(args):
+    graph = TaskGraph()
+    add_complex(graph, args, args.pdb, args.out, args.rec, args.lig)
+    return graph
+
+
+def read_manifest(path):
+    """读取批量清单，返回 [{pdb, rec, lig}]
+
+    CSV 需含表头 pdb,rec_chains,lig_chains；YAML 为同样字段的列表（或 complexes: 下的列表）。
+    相对路径按清单所在目录解析；复合物名取 PDB 文件名，需互不相同。
+    """
+    if path.endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError:
+            sys.exit("YAML 清单需要 PyYAML（已列入 environment.yml，请更新 trim 环境），或改用 CSV 清单")
+        with open(path) as f:
+            rows = yaml.safe_load(f) or []
+        if isinstance(rows, dict):
+            rows = rows.get("complexes") or []
+    else:
+        with open(path, newline="") as f:
+            rows = [r for r in csv.DictReader(f) if any((v or "").strip() for v in r.values())]
+
+    complexes, names = [], set()
+    root = os.path.dirname(os.path.abspath(path))
+    for i, row in enumerate(rows, 1):
+        row = {k.strip(): str(v).strip() for k, v in row.items() if k and v is not None}
+        pdb = row.get("pdb")
+        rec = row.get("rec_chains") or row.get("rec")
+        lig = row.get("lig_chains") or row.get("lig")
+        if not (pdb and rec and lig):
+            raise ValueError(f"{path} 第 {i} 条缺少 pdb/rec_chains/lig_chains")
+        pdb = os.path.normpath(os.path.join(root, pdb))
+        name = os.path.splitext(os.path.basename(pdb))[0]
+        if name in names:
+            raise ValueError(f"{path} 中复合物重名: {name}")
+        names.add(name)
+        complexes.append({"pdb": pdb, "rec": rec, "lig": lig})
+    return complexes
+
+
+def build_batch_graph(args, complexes):
+    """所有复合物的任务放入同一任务图；各复合物的完成标记仍在各自的 <name>_out/.done 下"""
+    graph = TaskGraph()
+    for c in complexes:
+        name = os.path.splitext(os.path.basename(c["pdb"]))[0]
+        out = os.path.join(args.outdir, f"{name}_out")
+        add_complex(graph, args, c["pdb"], out, c["rec"], c["lig"], prefix=f"{name}/",
+                    state_dir=os.path.join(out, ".done"))
+    return graph
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按任务依赖并发执行 TRIM 流程")
+    parser.add_argument("--pdb", help="复合物结构路径")
+    parser.add_argument("--out", help="输出目录（out/<name>_out）")
+    parser.add_argument("--rec", help="受体蛋白链")
+    parser.add_argument("--lig", help="配体蛋白链")
+    parser.add_argument("--manifest", help="批量模式：复合物清单（CSV/YAML，字段 pdb,rec_chains,lig_chains）")
+    parser.add_argument("--outdir", help="批量模式的输出根目录，各复合物输出到 <outdir>/<name>_out")
+    parser.add_argument("--base-dir", required=True, help="TRIM 所在目录")
+    parser.add_argument("--conda-base", required=True, help="conda 安装目录")
+    parser.add_argument("--foldx", required=True, help="FoldX 目录")
+    parser.add_argument("--rosetta", required=True, help="Rosetta bin 目录")
+    parser.add_argument("--threads", type=int, default=os.cpu_count(), help="共享核数预算")
+    parser.add_argument("--state-dir", help="完成标记目录（默认 <out>/.done）")
+    parser.add_argument("--dry-run", action="store_true", help="仅打印任务依赖")
+    args = parser.parse_args()
+
+    if args.manifest:
+        if not args.outdir:
+            parser.error("批量模式需要 --outdir")
+        try:
+            complexes = read_manifest(args.manifest)
+        except ValueError as e:
+            parser.error(str(e))
+        graph = build_batch_graph(args, complexes)
+        state_dir = None
+    else:
+        if not (args.pdb and args.out and args.rec and args.lig):
+            parser.error("需要 --pdb/--out/--rec/--lig，或使用 --manifest")
+        complexes = []
+        graph = build_trim_graph(args)
+        state_dir = args.state_dir or os.path.join(args.out, ".done")
+    order = graph.resolve()
+
+    if args.dry_run:
+        for name in order:
+            task = graph.tasks[name]
+            deps = ", ".join(sorted(task.deps)) or "-"
+            print(f"{name}\tcores={task.cores}-{task.max_cores}\tdeps={deps}")
+        return
+
+    for c in complexes:
+        name = os.path.splitext(os.path.basename(c["pdb"]))[0]
+        out = os.path.join(args.outdir, f"{name}_out")
+        for sub in ("mutation", "energy", "result"):
+            os.makedirs(os.path.join(out, sub), exist_ok=True)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+    ok = Scheduler(args.threads, state_dir).run(graph)
+    for name in order:
+        task = graph.tasks[name]
+        print(f"  {name}: {task.status}")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+流式汇总 ΔΔG：AnalyseComplex 运行期间轮询能量输出目录，每个新出现的 Summary 文件只解析一次，
+结合能与稳定性保存在 位点 × 20 的 NumPy 矩阵中，并持续覆盖写出
+*_binding_ddg.csv / *_stability_ddg.csv 快照（格式与 calculate_ddg_by_position.py 一致）。
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+import numpy as np
+
+from calculate_ddg_by_position import AA3_ORDER, read_foldx_energies
+
+AA_INDEX = {aa: i for i, aa in enumerate(AA3_ORDER)}
+_summary_pat = re.compile(r"Summary_([A-Z]{3})(\d+)_")
+
+
+class DDGMatrix:
+    """按位点增长的能量矩阵，NaN 表示尚未计算"""
+
+    def __init__(self, positions=()):
+        self.positions = []
+        self.index = {}
+        self.binding = np.full((0, len(AA3_ORDER)), np.nan)
+        self.stability = np.full((0, len(AA3_ORDER)), np.nan)
+        for pos in positions:
+            self.row(pos)
+
+    def row(self, pos):
+        if pos not in self.index:
+            self.index[pos] = len(self.positions)
+            self.positions.append(pos)
+            pad = np.full((1, len(AA3_ORDER)), np.nan)
+            self.binding = np.vstack([self.binding, pad])
+            self.stability = np.vstack([self.stability, pad])
+        return self.index[pos]
+
+    def set(self, pos, aa3, inter, stab2):
+        i = self.row(pos)
+        j = AA_INDEX[aa3]
+        self.binding[i, j] = inter
+        self.stability[i, j] = stab2
+
+    def write_csv(self, out_file, values, wt_value):
+        """写出 ΔΔG 快照：先写临时文件再改名，读取方不会看到半个文件"""
+        ddg = np.round(values - wt_value, 2)
+        order = sorted(range(len(self.positions)), key=lambda i: int(self.positions[i]))
+        tmp = f"{out_file}.tmp"
+        with open(tmp, "w", newline="") as f:
+            f.write(",".join(["Position"] + AA3_ORDER) + "\r\n")
+            for i in order:
+                if np.isnan(ddg[i]).all():
+                    continue
+                cells = ["" if np.isnan(v) else f"{v:.2f}" for v in ddg[i]]
+                f.write(",".join([self.positions[i]] + cells) + "\r\n")
+        os.replace(tmp, out_file)
+
+
+class SummaryWatcher:
+    def __init__(self, args):
+        self.args = args
+        self.matrix = DDGMatrix(parse_positions(args.positions))
+        self.seen = {}
+        self.wt = None
+        self.dirty = False
+
+    def scan(self):
+        """解析新增或发生变化的 Summary 文件；写到一半无法解析的文件留到下一轮"""
+        if self.wt is None and os.path.isfile(self.args.wt):
+            try:
+                self.wt = read_foldx_energies(self.args.wt)
+                self.dirty = True
+            except ValueError:
+                pass
+        wt_name = os.path.basename(self.args.wt)
+        try:
+            entries = list(os.scandir(self.args.indir))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            if entry.name == wt_name or not entry.name.startswith("Summary_") \
+                    or not entry.name.endswith(".fxout"):
+                continue
+            m = _summary_pat.search(entry.name)
+            if not m or m.group(1) not in AA_INDEX:
+                continue
+            stat = entry.stat()
+            stamp = (stat.st_mtime_ns, stat.st_size)
+            if self.seen.get(entry.name) == stamp:
+                continue
+            try:
+                inter, stab2 = read_foldx_energies(entry.path)
+            except ValueError:
+                continue
+            aa3, pos = m.groups()
+            self.matrix.set(pos, aa3, inter, stab2)
+            self.seen[entry.name] = stamp
+            self.dirty = True
+
+    def flush(self):
+        if not self.dirty or self.wt is None:
+            return False
+        wt_inter, wt_stab2 = self.wt
+        prefix = os.path.join(self.args.outdir, self.args.name)
+        self.matrix.write_csv(f"{prefix}_binding_ddg.csv", self.matrix.binding, wt_inter)
+        self.matrix.write_csv(f"{prefix}_stability_ddg.csv", self.matrix.stability, wt_stab2)
+        self.dirty = False
+        return True
+
+
+def parse_positions(text):
+    """从 PositionScan 位点串（如 QA24a,KA31a）提取位置编号，预先分配矩阵行"""
+    if not text:
+        return []
+    return [m.group(1) for m in (re.search(r"(\d+)", item) for item in text.split(",")) if m]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="边计算边汇总突变体 ΔΔG")
+    parser.add_argument("--wt", required=True, help="野生型 Summary 文件路径")
+    parser.add_argument("--indir", required=True, help="AnalyseComplex 输出目录")
+    parser.add_argument("--outdir", required=True, help="输出路径")
+    parser.add_argument("--name", required=True, help="输出文件名")
+    parser.add_argument("--positions", default="", help="PositionScan 位点串（可选，用于预分配矩阵）")
+    parser.add_argument("--interval", type=float, default=30, help="轮询间隔（秒）")
+    parser.add_argument("--stop-file", help="该文件出现后做最后一次汇总并退出")
+    parser.add_argument("--once", action="store_true", help="只汇总一次")
+    args = parser.parse_args()
+
+    os.makedirs(args.outdir, exist_ok=True)
+    watcher = SummaryWatcher(args)
+
+    def stop_requested():
+        return bool(args.stop_file) and os.path.exists(args.stop_file)
+
+    while True:
+        stopping = args.once or stop_requested()
+        watcher.scan()
+        if watcher.flush():
+            print(f"[{time.strftime('%F %T')}] 已汇总 {len(watcher.seen)} 个突变体", flush=True)
+        if stopping:
+            break
+        # 分段休眠，收到停止信号后尽快做最后一次汇总
+        deadline = time.time() + args.interval
+        while time.time() < deadline and not stop_requested():
+            time.sleep(min(1.0, args.interval))
+
+    if watcher.wt is None:
+        print(f"错误: 未能读取野生型能量 {args.wt}", file=sys.stderr)
+        sys.exit(1)
+    print(f"已输出 {args.outdir}/{args.name}_binding_ddg.csv")
+    print(f"已输出 {args.outdir}/{args.name}_stability_ddg.csv")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+对接构象的界面 RMSD 聚类与代表构象选取
+
+步骤 [7] 原本只保留每个静默文件中总分最低的一个构象，单个最低分构象受采样噪声影响较大。
+本工具把一个突变体的全部对接构象提取到暂存目录，取参考构象（总分最低者）界面残基的主链原子
+（N/CA/C/O，距另一侧重原子不超过 --interface Å），组成 (构象数, 原子数, 3) 的坐标张量，
+用批量 Kabsch 叠合（由 3×3 协方差矩阵的奇异值直接得到最优叠合 RMSD，不显式旋转坐标）
+计算两两界面 RMSD，再按 GROMOS 方法聚类：反复取 --cutoff 内邻居最多的构象及其邻居成为一类。
+成员数不少于 --min-size 的类中取平均总分最低的一类，输出其中心构象（与同类其他成员 RMSD 之和最小），
+文件名与 decoy_index.py extract 相同（<标签>.pdb），步骤 [8] 无需改动。
+每个静默文件的各构象归属写入 <report-dir>/<name>.tsv。
+"""
+import argparse
+import glob
+import os
+import shutil
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import job_trace
+import scratch
+from decoy_index import DecoyIndex, _decoy_pat, expand
+from interface_crop import interface_mask
+from pdb_chains import Structure, normalize_chains
+
+BACKBONE = ("N", "CA", "C", "O")
+
+
+def pairwise_rmsd(coords, block=256):
+    """coords (n, m, 3) -> (n, n) 最优叠合后的 RMSD
+
+    两两协方差矩阵 H = Xi^T Xj 以一次矩阵乘法成批得到，
+    RMSD^2 = (|Xi|^2 + |Xj|^2 - 2(s1 + s2 + sign(det H)·s3)) / m，s 为 H 的奇异值。
+    """
+    x = coords - coords.mean(axis=1, keepdims=True)
+    n, m, _ = x.shape
+    norms = np.einsum("nij,nij->n", x, x)
+    right = x.transpose(1, 0, 2).reshape(m, n * 3)
+    rmsd = np.empty((n, n))
+    for start in range(0, n, block):
+        left = x[start:start + block]
+        b = len(left)
+        h = (left.transpose(0, 2, 1).reshape(b * 3, m) @ right).reshape(b, 3, n, 3).transpose(0, 2, 1, 3)
+        s = np.linalg.svd(h, compute_uv=False)
+        s[..., 2] *= np.where(np.linalg.det(h) < 0, -1.0, 1.0)
+        msd = (norms[start:start + b, None] + norms[None, :] - 2 * s.sum(axis=-1)) / m
+        rmsd[start:start + b] = np.sqrt(np.clip(msd, 0, None))
+    np.fill_diagonal(rmsd, 0)
+    return rmsd
+
+
+def gromos(rmsd, cutoff):
+    """GROMOS 聚类，返回各类的成员下标（按成类顺序）；邻居数相同时取下标小者（调用方按总分排序）"""
+    neighbors = rmsd <= cutoff
+    left = np.ones(len(rmsd), dtype=bool)
+    clusters = []
+    while left.any():
+        counts = (neighbors[:, left].sum(axis=1)) * left
+        center = int(np.argmax(counts))
+        members = np.flatnonzero(neighbors[center] & left)
+        clusters.append(members)
+        left[members] = False
+    return clusters
+
+
+def choose(rmsd, scores, cutoff, min_size):
+    """(代表构象下标, 各构象所属类编号, 被选中的类编号)；scores 已按从低到高排序"""
+    clusters = gromos(rmsd, cutoff)
+    label = np.empty(len(scores), dtype=np.int64)
+    for c, members in enumerate(clusters):
+        label[members] = c
+    eligible = [c for c, members in enumerate(clusters) if len(members) >= min_size]
+    if not eligible:
+        # 没有足够大的类时取成员最多的类
+        eligible = [max(range(len(clusters)), key=lambda c: len(clusters[c]))]
+    best = min(eligible, key=lambda c: (scores[clusters[c]].mean(), -len(clusters[c]), c))
+    members = clusters[best]
+    medoid = members[int(np.argmin(rmsd[np.ix_(members, members)].sum(axis=1)))]
+    return int(medoid), label, best
+
+
+def read_atoms(path, index, names):
+    """只解析选中原子的坐标；原子顺序与参考构象不一致时返回 None"""
+    lines = []
+    with open(path) as f:
+        for line in f:
+            if line.startswith("ENDMDL"):
+                break
+            if line.startswith(("ATOM  ", "HETATM")):
+                lines.append(line)
+    if len(lines) <= index[-1]:
+        return None
+    picked = [lines[i] for i in index]
+    if any(line[12:16] != name for line, name in zip(picked, names)):
+        return None
+    return [(float(line[30:38]), float(line[38:46]), float(line[46:54])) for line in picked]
+
+
+def extract_all(args, silent, workdir):
+    """把静默文件中的全部构象提取到 workdir"""
+    cmd = [args.app, "-mute", "all", "-in:file:silent", os.path.abspath(silent)]
+    out = open(args.log_out, "a") if args.log_out else subprocess.DEVNULL
+    err = open(args.log_err, "a") if args.log_err else subprocess.DEVNULL
+    try:
+        return job_trace.call(cmd, stage="extract_pdbs", extra={"cluster": True}, mem_key="extract_pdbs",
+                              cwd=workdir, stdout=out, stderr=err)
+    finally:
+        for f in (out, err):
+            if f is not subprocess.DEVNULL:
+                f.close()
+
+
+def cluster_silent(args, silent):
+    """聚类一个静默文件的构象并输出代表构象，返回 (摘要, 错误信息)"""
+    name = os.path.basename(silent)[:-len(args.suffix)] if silent.endswith(args.suffix) else None
+    try:
+        index = DecoyIndex.build(silent)
+        values = index.column(args.column)
+    except KeyError as e:
+        return None, e.args[0]
+    order = np.lexsort((index.tags, values))
+    tags, scores = index.tags[order], values[order]
+    if not len(tags):
+        return None, f"{silent} 中没有构象"
+
+    with scratch.workspace(f".cluster_{name or 'decoys'}.", args.outdir) as workdir:
+        extract_all(args, silent, workdir)
+        paths = [os.path.join(workdir, f"{tag}.pdb") for tag in tags]
+        if not os.path.isfile(paths[0]):
+            return None, f"{tags[0]} 提取失败"
+
+        # 参考构象（总分最低）的界面主链原子
+        ref = Structure.read(paths[0])
+        atom_names = np.char.strip(ref["name"])
+        mask = interface_mask(ref, args.rec, args.lig, args.interface, flank=0) & np.isin(atom_names, BACKBONE)
+        if not mask.any():
+            mask = atom_names == "CA"
+        atoms = np.flatnonzero(mask)
+        if len(atoms) < 3:
+            return None, f"{tags[0]} 中没有可用于叠合的主链原子"
+        names = ref["name"][atoms]
+
+        coords, kept = [], []
+        for i, path in enumerate(paths):
+            xyz = read_atoms(path, atoms, names) if os.path.isfile(path) else None
+            if xyz is not None:
+                coords.append(xyz)
+                kept.append(i)
+        tags, scores = tags[kept], scores[kept]
+        rmsd = pairwise_rmsd(np.array(coords, dtype=np.float64))
+        min_size = args.min_size or max(2, int(np.ceil(args.min_fraction * len(tags))))
+        pick, label, best = choose(rmsd, scores, args.cutoff, min_size)
+
+        # 清理上次运行提取的旧构象（<name>_0001.pdb 等），再写入代表构象
+        if name:
+            for old in glob.glob(os.path.join(args.outdir, f"{glob.escape(name)}_*.pdb")):
+                if _decoy_pat.match(os.path.basename(old)[len(name):]):
+                    os.remove(old)
+        shutil.move(paths[kept[pick]], os.path.join(args.outdir, f"{tags[pick]}.pdb"))
+
+    report = os.path.join(args.report_dir, f"{name or os.path.basename(silent)}.tsv")
+    with open(f"{report}.tmp", "w") as f:
+        f.write("tag\tscore\tcluster\tcluster_size\trmsd_to_selected\tselected\n")
+        sizes = np.bincount(label)
+        for i, tag in enumerate(tags):
+            f.write(f"{tag}\t{scores[i]:.3f}\t{label[i]}\t{sizes[label[i]]}\t{rmsd[i, pick]:.3f}\t"
+                    f"{int(i == pick)}\n")
+    os.replace(f"{report}.tmp", report)
+
+    members = label == best
+    summary = (f"{tags[pick]}: {len(tags)} 个构象，{label.max() + 1} 类，选中类 {int(members.sum())} 个成员"
+               f"（平均 {args.column} {scores[members].mean():.2f}），代表构象 {scores[pick]:.2f}，"
+               f"与最低分构象 {tags[0]} 的界面 RMSD {rmsd[pick, 0]:.2f} Å，{len(atoms)} 个原子")
+    return summary, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对接构象界面 RMSD 聚类，输出最优类的中心构象")
+    parser.add_argument("--app", required=True, help="extract_pdbs 可执行文件")
+    parser.add_argument("--outdir", required=True, help="代表构象的输出目录")
+    parser.add_argument("-r", "--rec", required=True, help="受体链")
+    parser.add_argument("-l", "--lig", required=True, help="配体链")
+    parser.add_argument("-c", "--column", default="score", help="能量列（缺省 score）")
+    parser.add_argument("--interface", type=float, default=10.0, help="界面残基的距离阈值（Å）")
+    parser.add_argument("--cutoff", type=float, default=2.0, help="聚类的界面 RMSD 阈值（Å）")
+    parser.add_argument("--min-size", type=int, default=0, help="参与选取的最小类成员数（0 时按 --min-fraction）")
+    parser.add_argument("--min-fraction", type=float, default=0.1, help="最小类成员数占构象总数的比例")
+    parser.add_argument("--threads", type=int, default=1, help="同时处理的静默文件数")
+    parser.add_argument("--suffix", default="_dock.out", help="静默文件名后缀，用于清理旧构象")
+    parser.add_argument("--report-dir", help="各构象归属表目录（默认 <outdir>/clusters）")
+    parser.add_argument("--log-out", help="Rosetta 标准输出日志")
+    parser.add_argument("--log-err", help="Rosetta 错误日志")
+    parser.add_argument("silents", nargs="*", help="静默文件（可使用通配符）")
+    args = parser.parse_args()
+
+    args.rec, args.lig = normalize_chains(args.rec), normalize_chains(args.lig)
+    args.report_dir = args.report_dir or os.path.join(args.outdir, "clusters")
+    os.makedirs(args.outdir, exist_ok=True)
+    os.makedirs(args.report_dir, exist_ok=True)
+    silents = expand(args.silents)
+    if not silents:
+        print("  [CLUSTER] 没有待聚类的静默文件")
+        return
+
+    failed = 0
+    with ThreadPoolExecutor(max(1, min(args.threads, len(silents)))) as pool:
+        for silent, (summary, error) in zip(silents, pool.map(lambda s: cluster_silent(args, s), silents)):
+            if error:
+                print(f"  [FAILED] {silent}: {error}", file=sys.stderr)
+                failed += 1
+            else:
+                print(f"  [+] {summary}", flush=True)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Rosetta 打分文件 / 静默文件索引与最优构象提取
+
+一次顺序读取即建立按列存储的索引：每个构象标签一行，各打分项为一列 float 数组（列名取自
+SCORE 表头，多个表头的文件按列名对齐），并记录每个构象 SCORE 行的字节偏移，
+可直接定位静默文件中的构象记录。索引支持按任意列取前 k 个构象，替代流程中的
+awk | sort -n | head -1；extract 子命令把多个静默文件中选中的构象分组，
+每组只调用一次 extract_pdbs，各组并行执行。
+"""
+import argparse
+import glob
+import os
+import re
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import job_trace
+
+_decoy_pat = re.compile(r"^_\d+\.pdb$")
+
+
+class DecoyIndex:
+    """一个打分/静默文件的构象索引：tags、offsets 与 {列名: float 数组}"""
+
+    def __init__(self, path, tags, offsets, columns):
+        self.path = path
+        self.tags = tags
+        self.offsets = offsets
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.tags)
+
+    @classmethod
+    def build(cls, path):
+        header, rows, tags, offsets = None, [], [], []
+        offset = 0
+        with open(path, "rb") as f:
+            for raw in f:
+                start, offset = offset, offset + len(raw)
+                if not raw.startswith(b"SCORE:"):
+                    continue
+                tokens = raw.decode().split()
+                if len(tokens) < 2:
+                    continue
+                if tokens[-1] == "description":
+                    cols = tokens[1:-1]
+                    if header is None:
+                        header = cols
+                    order = [cols.index(c) if c in cols else None for c in header]
+                    continue
+                if header is None:
+                    continue
+                values = tokens[1:-1]
+                rows.append([_number(values[i]) if i is not None and i < len(values) else np.nan
+                             for i in order])
+                tags.append(tokens[-1])
+                offsets.append(start)
+
+        header = header or []
+        data = np.array(rows, dtype=np.float64).reshape(len(rows), len(header))
+        columns = {name: data[:, i] for i, name in enumerate(header)}
+        return cls(path, np.array(tags, dtype=str), np.array(offsets, dtype=np.int64), columns)
+
+    def column(self, name=None):
+        """列名缺省时取表头第一列（打分文件的 total_score、静默文件的 score）"""
+        if not self.columns:
+            raise KeyError(f"{self.path} 中没有 SCORE 表头")
+        if name is None:
+            name = next(iter(self.columns))
+        if name not in self.columns:
+            raise KeyError(f"{self.path} 中没有 {name} 列")
+        return self.columns[name]
+
+    def top(self, k=1, column=None, reverse=False):
+        """按列值取前 k 个构象标签；同分时按标签排序，缺失值排在最后"""
+        values = self.column(column)
+        key = -values if reverse else values
+        order = np.lexsort((self.tags, key))
+        return [str(self.tags[i]) for i in order[:k]]
+
+    def record(self, tag):
+        """静默文件中某构象的原始记录（自其 SCORE 行至下一个构象的 SCORE 行）"""
+        i = int(np.flatnonzero(self.tags == tag)[0])
+        end = self.offsets[i + 1] if i + 1 < len(self) else None
+        with open(self.path, "rb") as f:
+            f.seek(self.offsets[i])
+            return f.read() if end is None else f.read(end - self.offsets[i])
+
+
+def _number(text):
+    try:
+        return float(text)
+    except ValueError:
+        return np.nan
+
+
+def expand(paths):
+    files = []
+    for item in paths:
+        files.extend(sorted(glob.glob(item)) if glob.has_magic(item) else [item])
+    return [p for p in files if os.path.isfile(p)]
+
+
+def chunk(items, n):
+    n = max(1, min(n, len(items)))
+    return [items[i::n] for i in range(n)]
+
+
+def top(args):
+    failed = 0
+    for path in expand(args.files):
+        try:
+            tags = DecoyIndex.build(path).top(args.k, args.column, args.reverse)
+        except KeyError as e:
+            print(f"  [WARNING] {e.args[0]}", file=sys.stderr)
+            failed += 1
+            continue
+        for tag in tags:
+            print(f"{path}\t{tag}" if args.with_file else tag)
+    return failed
+
+
+def run_extract(args, group):
+    """一次 extract_pdbs 调用处理一组静默文件及其选中的构象"""
+    silents = [s for s, _ in group]
+    tags = [t for _, ts in group for t in ts]
+    cmd = [args.app, "-mute", "all", "-in:file:silent", *silents, "-in:file:tags", *tags]
+    out = open(args.log_out, "a") if args.log_out else subprocess.DEVNULL
+    err = open(args.log_err, "a") if args.log_err else subprocess.DEVNULL
+    try:
+        job_trace.call(cmd, stage="extract_pdbs", extra={"decoys": len(tags)}, mem_key="extract_pdbs",
+                       cwd=args.outdir, stdout=out, stderr=err)
+    finally:
+        for f in (out, err):
+            if f is not subprocess.DEVNULL:
+                f.close()
+    return [t for t in tags if not os.path.isfile(os.path.join(args.outdir, f"{t}.pdb"))]
+
+
+def extract(args):
+    os.makedirs(args.outdir, exist_ok=True)
+    silents = expand(args.silents)
+    if not silents:
+        print("  [EXTRACT] 没有待提取的静默文件")
+        return 0
+    selected = []
+    for silent in silents:
+        name = os.path.basename(silent)[:-len(args.suffix)] if silent.endswith(args.suffix) else None
+        try:
+            tags = DecoyIndex.build(silent).top(args.k, args.column, args.reverse)
+        except KeyError as e:
+            print(f"  [WARNING] {e.args[0]}", file=sys.stderr)
+            continue
+        if not tags:
+            print(f"  [WARNING] {silent} 中没有构象", file=sys.stderr)
+            continue
+        # 清理上次运行提取的旧构象（<name>_0001.pdb 等）
+        if name:
+            for old in glob.glob(os.path.join(args.outdir, f"{glob.escape(name)}_*.pdb")):
+                if _decoy_pat.match(os.path.basename(old)[len(name):]):
+                    os.remove(old)
+        selected.append((silent, tags))
+    if not selected:
+        return 1
+
+    # 构象标签在各静默文件间唯一，多个文件可在同一次 extract_pdbs 调用中提取
+    groups = chunk(selected, args.threads)
+    with ThreadPoolExecutor(len(groups)) as pool:
+        missing = [t for m in pool.map(lambda g: run_extract(args, g), groups) for t in m]
+    total = sum(len(ts) for _, ts in selected)
+    for _, tags in selected:
+        for tag in tags:
+            if tag not in missing:
+                print(f"  [+] {tag} Done")
+    for tag in missing:
+        print(f"  [FAILED] {tag}", file=sys.stderr)
+    print(f"  [EXTRACT] {total - len(missing)}/{total} 个构象，{len(groups)} 次 extract_pdbs 调用")
+    return len(missing)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rosetta 打分/静默文件索引与最优构象提取")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def query(p):
+        p.add_argument("-c", "--column", help="排序所用的列（缺省为表头第一列）")
+        p.add_argument("-k", type=int, default=1, help="每个文件取前 k 个构象")
+        p.add_argument("--reverse", action="store_true", help="按列值从大到小排序")
+
+    p_top = sub.add_parser("top", help="输出每个文件中前 k 个构象的标签")
+    query(p_top)
+    p_top.add_argument("--with-file", action="store_true", help="每行输出 文件<TAB>标签")
+    p_top.add_argument("files", nargs="*", help="打分文件或静默文件（可使用通配符）")
+
+    p_extract = sub.add_parser("extract", help="按索引选出构象，分组并行调用 extract_pdbs")
+    query(p_extract)
+    p_extract.add_argument("--app", required=True, help="extract_pdbs 可执行文件")
+    p_extract.add_argument("--outdir", required=True, help="提取结构的输出目录")
+    p_extract.add_argument("--threads", type=int, default=1, help="并行的 extract_pdbs 进程数")
+    p_extract.add_argument("--suffix", default="_dock.out", help="静默文件名后缀，用于清理旧构象")
+    p_extract.add_argument("--log-out", help="Rosetta 标准输出日志")
+    p_extract.add_argument("--log-err", help="Rosetta 错误日志")
+    p_extract.add_argument("silents", nargs="*", help="静默文件（可使用通配符）")
+
+    args = parser.parse_args()
+    if args.command == "top":
+        if top(args):
+            sys.exit(1)
+    elif args.command == "extract":
+        if extract(args):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+调度任务的执行后端
+
+dag_runner.Scheduler 决定任务何时启动、分配几个核，后端负责在哪里运行：
+    local  在本机直接运行（原有行为），核数预算即本作业申请的 CPU 数
+    slurm  把就绪任务按核数分组，每组作为一个 SLURM 作业数组（sbatch --array）提交，
+           任务可分布到多个节点；各任务的退出码写入共享目录，按 squeue 轮询收集结果
+两种后端运行的是同一条命令，结果写入同一 out/ 目录结构（需位于各节点共享的文件系统上）。
+
+调度中止（Ctrl-C、SIGTERM、异常）时 Scheduler 调用后端的 cancel()：local 终止正在运行的任务，
+slurm 对已提交且未结束的作业数组执行 scancel。
+sbatch/squeue/scancel 命令可由 TRIM_SBATCH/TRIM_SQUEUE/TRIM_SCANCEL 替换，如用 tools/fake_slurm.py
+在无集群的环境中测试。
+"""
+import getpass
+import os
+import shlex
+import subprocess
+import sys
+import threading
+import time
+
+import job_trace
+
+BACKENDS = ("local", "slurm")
+
+
+class LocalBackend:
+    """在本机运行任务命令"""
+
+    name = "local"
+
+    def __init__(self):
+        self.cancelled = threading.Event()
+        self.running = 0
+        self.cond = threading.Condition()
+
+    def run(self, task):
+        with self.cond:
+            self.running += 1
+        try:
+            # 任务是整段流程脚本，超时与重试由其中的各外部程序自行处理
+            return job_trace.call(task.command(), stage=task.stage, mutant=task.mutant,
+                                  extra={"task": True, "cores": task.granted}, timeout=0, retries=0,
+                                  cancel=self.cancelled)
+        finally:
+            with self.cond:
+                self.running -= 1
+                self.cond.notify_all()
+
+    def cancel(self, wait=10.0):
+        """终止正在运行的任务：任务在独立会话中运行，收不到终端的 Ctrl-C"""
+        self.cancelled.set()
+        with self.cond:
+            self.cond.wait_for(lambda: self.running == 0, timeout=wait)
+
+    def close(self):
+        pass
+
+
+class ArrayJob:
+    """一次 sbatch --array 提交：第 i 个数组任务运行 tasks[i]"""
+
+    def __init__(self, spool, tasks):
+        self.spool = spool
+        self.tasks = tasks
+        self.job_id = None
+        self.results = {}
+        # 连续几次查询不在队列中（退出码文件在共享文件系统上可能稍后才可见）
+        self.absent = 0
+        self.done = threading.Event()
+
+    def rc_path(self, i):
+        return os.path.join(self.spool, f"rc.{i}")
+
+    def collect(self, finished):
+        """读取已写出的退出码；作业已不在队列中时，缺少退出码的任务记为失败"""
+        for i in range(len(self.tasks)):
+            if i in self.results:
+                continue
+            try:
+                with open(self.rc_path(i)) as f:
+                    self.results[i] = int(f.read().strip())
+            except (OSError, ValueError):
+                if finished:
+                    self.results[i] = None
+        if len(self.results) == len(self.tasks):
+            self.done.set()
+
+
+class SlurmBackend:
+    """把任务作为 SLURM 作业数组提交
+
+    任务线程调用 run() 后阻塞；提交线程每隔 window 秒把期间就绪的任务按核数分组，
+    每组一次 sbatch，再每隔 poll 秒查询 squeue，收集各数组任务写出的退出码。
+    """
+
+    name = "slurm"
+
+    def __init__(self, spool, sbatch_args=(), window=10.0, poll=30.0):
+        self.spool = os.path.abspath(spool)
+        self.sbatch = shlex.split(os.environ.get("TRIM_SBATCH") or "sbatch")
+        self.squeue = shlex.split(os.environ.get("TRIM_SQUEUE") or "squeue")
+        self.scancel = shlex.split(os.environ.get("TRIM_SCANCEL") or "scancel")
+        self.sbatch_args = list(sbatch_args)
+        self.window = window
+        self.poll = poll
+        self.pending = []
+        self.jobs = []
+        self.submitted = 0
+        self.cond = threading.Condition()
+        self.closed = False
+        self.cancelled = False
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+
+    def run(self, task):
+        with self.cond:
+            entry = [task, None, None]
+            self.pending.append(entry)
+            self.cond.notify_all()
+            while entry[1] is None:
+                self.cond.wait()
+        array, i = entry[1], entry[2]
+        if array is False:
+            return 1
+        array.done.wait()
+        rc = array.results[i]
+        if rc is None:
+            job_trace.record_failure(task.stage, task.mutant, task.command(), "-",
+                                     f"slurm job {array.job_id}_{i} ended without exit code")
+            return 1
+        return rc
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        self.thread.join()
+
+    def cancel(self):
+        """中止：不再提交排队中的任务，scancel 已提交且尚未结束的作业数组"""
+        with self.cond:
+            self.cancelled = self.closed = True
+            for entry in self.pending:
+                entry[1] = False
+            self.pending = []
+            jobs, self.jobs = self.jobs, []
+            self.cond.notify_all()
+        self._cancel_jobs(jobs)
+
+    def _cancel_jobs(self, jobs):
+        job_ids = [array.job_id for array in jobs]
+        if not job_ids:
+            return
+        try:
+            result = subprocess.run(self.scancel + job_ids, capture_output=True, text=True)
+            detail = result.stderr.strip() if result.returncode else ""
+        except OSError as e:
+            detail = str(e)
+        if detail:
+            print(f"  [SLURM] scancel {' '.join(job_ids)} 失败: {detail}", file=sys.stderr, flush=True)
+        else:
+            print(f"  [SLURM] 已取消作业 {' '.join(job_ids)}", flush=True)
+        for array in jobs:
+            array.collect(finished=True)
+
+    def _loop(self):
+        while True:
+            with self.cond:
+                if self.closed and not self.pending and not self.jobs:
+                    return
+                if self.pending:
+                    # 等待 window 秒，把同一时段就绪的任务合并到同一个作业数组
+                    deadline = time.time() + self.window
+                    while not self.closed and time.time() < deadline:
+                        self.cond.wait(deadline - time.time())
+                    batch, self.pending = self.pending, []
+                else:
+                    batch = []
+                    self.cond.wait(self.poll if self.jobs else None)
+            for group in self._groups(batch):
+                self._submit(group)
+            if self.jobs:
+                self._check()
+
+    @staticmethod
+    def _groups(batch):
+        """同一作业数组中的任务申请相同的核数"""
+        groups = {}
+        for entry in batch:
+            groups.setdefault(entry[0].granted, []).append(entry)
+        return list(groups.values())
+
+    def _submit(self, group):
+        tasks = [entry[0] for entry in group]
+        cores = tasks[0].granted
+        self.submitted += 1
+        spool = os.path.join(self.spool, f"{time.strftime('%Y%m%d-%H%M%S')}-{self.submitted:04d}-{tasks[0].stage}")
+        os.makedirs(spool, exist_ok=True)
+        array = ArrayJob(spool, tasks)
+        trace_tool = os.path.join(os.path.dirname(os.path.abspath(__file__)), "job_trace.py")
+        for i, task in enumerate(tasks):
+            run = [sys.executable, trace_tool, "run", "--stage", task.stage, "--task", "--cores", str(cores),
+                   "--timeout", "0", "--retries", "0"]
+            if task.mutant:
+                run += ["--mutant", task.mutant]
+            with open(os.path.join(spool, f"task.{i}.sh"), "w") as f:
+                f.write(f"cd {shlex.quote(os.getcwd())}\n")
+                f.write(shlex.join(run + ["--"] + task.command()) + "\n")
+        with open(os.path.join(spool, "array.sh"), "w") as f:
+            f.write(
+                "#!/bin/bash\n"
+                "# 内存由 SLURM 按作业分配；共享账本按本机进程号判断预留，跨节点时不适用\n"
+                "unset TRIM_MEM_BUDGET\n"
+                f'dir={shlex.quote(spool)}\n'
+                'i="$SLURM_ARRAY_TASK_ID"\n'
+                'bash "$dir/task.$i.sh"\n'
+                'echo $? > "$dir/rc.$i.tmp" && mv "$dir/rc.$i.tmp" "$dir/rc.$i"\n'
+            )
+        cmd = self.sbatch + [
+            "--parsable",
+            f"--array=0-{len(tasks) - 1}",
+            f"--cpus-per-task={cores}",
+            f"--job-name=TRIM_{tasks[0].stage}",
+            f"--output={spool}/%a.out",
+            f"--error={spool}/%a.err",
+            *self.sbatch_args,
+            os.path.join(spool, "array.sh"),
+        ]
+        try:
+            out = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+            array.job_id = out.strip().split(";")[0]
+        except (OSError, subprocess.CalledProcessError) as e:
+            detail = getattr(e, "stderr", None) or str(e)
+            for task in tasks:
+                job_trace.record_failure(task.stage, task.mutant, cmd, "-", f"sbatch failed: {detail.strip()}")
+            with self.cond:
+                for entry in group:
+                    entry[1] = False
+                self.cond.notify_all()
+            return
+        print(f"  [SLURM] 作业 {array.job_id}: {len(tasks)} 个 {tasks[0].stage} 任务，每个 {cores} 核",
+              flush=True)
+        with self.cond:
+            cancelled = self.cancelled
+            if not cancelled:
+                self.jobs.append(array)
+            for i, entry in enumerate(group):
+                entry[1], entry[2] = array, i
+            self.cond.notify_all()
+        if cancelled:
+            # 提交途中调度已中止
+            self._cancel_jobs([array])
+
+    def _queued(self):
+        """队列中（排队或运行）的作业号；squeue 出错时返回 None，本轮不判定作业结束"""
+        cmd = self.squeue + ["-h", "-u", getpass.getuser(), "-o", "%F"]
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True)
+        except OSError:
+            return None
+        if result.returncode != 0:
+            return None
+        return {line.strip() for line in result.stdout.splitlines() if line.strip()}
+
+    def _check(self):
+        queued = self._queued()
+        for array in list(self.jobs):
+            if queued is not None:
+                array.absent = 0 if array.job_id in queued else array.absent + 1
+            array.collect(finished=array.absent >= 2)
+            if array.done.is_set():
+                with self.cond:
+                    if array in self.jobs:
+                        self.jobs.remove(array)
+
+
+def create(name, spool=None, sbatch_args=""):
+    if name == "local":
+        return LocalBackend()
+    if name == "slurm":
+        # TRIM_SLURM_POLL：查询 squeue 的间隔（秒），用 fake_slurm.py 测试时可调小
+        poll = float(os.environ.get("TRIM_SLURM_POLL") or 30)
+        return SlurmBackend(spool, shlex.split(sbatch_args or ""), window=min(10.0, poll), poll=poll)
+    raise ValueError(f"未知的执行后端: {name}")
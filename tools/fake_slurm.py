@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+本机模拟的 sbatch / squeue / scancel，用于在没有集群的环境中测试 slurm 执行后端
+
+只实现 exec_backend.py 用到的部分：sbatch --array/--parsable/--cpus-per-task/--output/--error，
+squeue -h -o（%F %A %i %j），scancel <作业号>。提交后由后台进程在本机依次运行各数组任务
+（--array=0-9%4 中的 %4 为同时运行数，缺省全部并行），设置 SLURM_ARRAY_TASK_ID 等环境变量。
+作业状态保存在 TRIM_FAKE_SLURM_DIR（默认 /tmp/fake_slurm-<用户名>）。
+    export TRIM_SBATCH="python tools/fake_slurm.py sbatch"
+    export TRIM_SQUEUE="python tools/fake_slurm.py squeue"
+    export TRIM_SCANCEL="python tools/fake_slurm.py scancel"
+"""
+import fcntl
+import getpass
+import json
+import os
+import signal
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+# 带取值（以空格分隔）的 sbatch/squeue 选项，其余选项按 --name=value 或开关处理
+VALUE_OPTIONS = {"-p", "-t", "-c", "-J", "-o", "-e", "-N", "-n", "-A", "-q", "-a", "-u", "-j",
+                 "--partition", "--time", "--mem", "--account", "--qos", "--array",
+                 "--cpus-per-task", "--job-name", "--output", "--error", "--user", "--jobs", "--format"}
+
+
+def spool_dir():
+    path = os.environ.get("TRIM_FAKE_SLURM_DIR") or f"/tmp/fake_slurm-{getpass.getuser()}"
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def next_job_id():
+    with open(os.path.join(spool_dir(), "counter"), "a+") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        f.seek(0)
+        job_id = int(f.read().strip() or 1000) + 1
+        f.seek(0)
+        f.truncate()
+        f.write(str(job_id))
+    return job_id
+
+
+def parse_options(argv):
+    options, i = {}, 0
+    while i < len(argv) and argv[i].startswith("-"):
+        arg = argv[i]
+        if "=" in arg:
+            name, value = arg.split("=", 1)
+        elif arg in VALUE_OPTIONS:
+            name, value = arg, argv[i + 1]
+            i += 1
+        else:
+            name, value = arg, True
+        options[name] = value
+        i += 1
+    return options, argv[i:]
+
+
+def parse_array(spec):
+    """0-9 / 1,3,5 / 0-9%4 -> (下标列表, 同时运行数)"""
+    spec, _, limit = (spec or "0").partition("%")
+    indexes = []
+    for part in spec.split(","):
+        start, _, end = part.partition("-")
+        indexes.extend(range(int(start), int(end or start) + 1))
+    return indexes, int(limit) if limit else None
+
+
+def sbatch(argv):
+    options, rest = parse_options(argv)
+    if not rest:
+        sys.exit("sbatch: 缺少作业脚本")
+    indexes, limit = parse_array(options.get("--array") or options.get("-a"))
+    job_id = next_job_id()
+    job = {
+        "id": job_id,
+        "name": options.get("--job-name") or options.get("-J") or os.path.basename(rest[0]),
+        "script": [os.path.abspath(rest[0])] + rest[1:],
+        "indexes": indexes,
+        "limit": limit,
+        "cpus": options.get("--cpus-per-task") or options.get("-c") or "1",
+        "output": options.get("--output") or options.get("-o") or "slurm-%A_%a.out",
+        "error": options.get("--error") or options.get("-e"),
+        "cwd": os.getcwd(),
+    }
+    with open(os.path.join(spool_dir(), f"{job_id}.json"), "w") as f:
+        json.dump(job, f)
+    runner = subprocess.Popen([sys.executable, os.path.abspath(__file__), "_run", str(job_id)],
+                              stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                              start_new_session=True)
+    with open(os.path.join(spool_dir(), f"{job_id}.pid"), "w") as f:
+        f.write(str(runner.pid))
+    print(job_id if "--parsable" in options else f"Submitted batch job {job_id}")
+
+
+def run_job(job_id):
+    with open(os.path.join(spool_dir(), f"{job_id}.json")) as f:
+        job = json.load(f)
+
+    def expand(pattern, index):
+        return os.path.join(job["cwd"], pattern.replace("%A", str(job_id)).replace("%a", str(index))
+                            .replace("%j", str(job_id)))
+
+    def run_index(index):
+        env = dict(os.environ, SLURM_JOB_ID=str(job_id), SLURM_ARRAY_JOB_ID=str(job_id),
+                   SLURM_ARRAY_TASK_ID=str(index), SLURM_CPUS_PER_TASK=str(job["cpus"]),
+                   SLURM_JOB_NAME=job["name"])
+        with open(expand(job["output"], index), "a") as out:
+            err = open(expand(job["error"], index), "a") if job["error"] else out
+            try:
+                subprocess.call(["bash"] + job["script"], cwd=job["cwd"], env=env, stdout=out, stderr=err)
+            finally:
+                if err is not out:
+                    err.close()
+
+    try:
+        with ThreadPoolExecutor(job["limit"] or len(job["indexes"]) or 1) as pool:
+            list(pool.map(run_index, job["indexes"]))
+    finally:
+        # 作业结束后 squeue 不再列出该作业
+        try:
+            os.remove(os.path.join(spool_dir(), f"{job_id}.pid"))
+        except FileNotFoundError:
+            pass
+
+
+def running_jobs():
+    jobs = []
+    for name in sorted(os.listdir(spool_dir())):
+        if not name.endswith(".pid"):
+            continue
+        job_id = name[:-4]
+        try:
+            with open(os.path.join(spool_dir(), name)) as f:
+                os.kill(int(f.read()), 0)
+            with open(os.path.join(spool_dir(), f"{job_id}.json")) as f:
+                jobs.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return jobs
+
+
+def squeue(argv):
+    options, _ = parse_options(argv)
+    fmt = options.get("-o") or options.get("--format") or "%i %j"
+    wanted = set(str(options.get("-j") or options.get("--jobs") or "").replace(",", " ").split())
+    if "-h" not in options and "--noheader" not in options:
+        print(fmt.replace("%F", "ARRAY_JOB_ID").replace("%A", "JOBID").replace("%i", "JOBID")
+              .replace("%j", "NAME"))
+    for job in running_jobs():
+        if wanted and str(job["id"]) not in wanted:
+            continue
+        print(fmt.replace("%F", str(job["id"])).replace("%A", str(job["id"]))
+              .replace("%i", f"{job['id']}_[{job['indexes'][0]}-{job['indexes'][-1]}]")
+              .replace("%j", job["name"]))
+
+
+def scancel(argv):
+    for job_id in argv:
+        try:
+            with open(os.path.join(spool_dir(), f"{job_id.split('_')[0]}.pid")) as f:
+                os.killpg(int(f.read()), signal.SIGTERM)
+        except (OSError, ValueError):
+            print(f"scancel: 作业 {job_id} 不存在", file=sys.stderr)
+
+
+def main():
+    if len(sys.argv) < 2:
+        sys.exit("用法: fake_slurm.py sbatch|squeue|scancel ...")
+    command, argv = sys.argv[1], sys.argv[2:]
+    if command == "sbatch":
+        sbatch(argv)
+    elif command == "squeue":
+        squeue(argv)
+    elif command == "scancel":
+        scancel(argv)
+    elif command == "_run":
+        run_job(int(argv[0]))
+    else:
+        sys.exit(f"未知命令: {command}")
+
+
+if __name__ == "__main__":
+    main()
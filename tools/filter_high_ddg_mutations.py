@@ -16,6 +16,15 @@ def find_file_by_pattern(directory, keyword):
         print(f"发现多个文件包含 '{keyword}'，将使用第一个：{files[0]}")
     return files[0]
 
+def load_store(path):
+    """从 NPZ 存储构建与 CSV 融合结果相同的长表（按 氨基酸、位点 排序，与 melt 顺序一致）"""
+    from calculate_ddg_by_position import AA3_ORDER
+    from fxout_store import load_ddg
+
+    aa_rank = {aa: i for i, aa in enumerate(AA3_ORDER)}
+    rows = sorted((r for r in load_ddg(path) if r[1] in aa_rank), key=lambda r: (aa_rank[r[1]], r[0]))
+    return pd.DataFrame(rows, columns=["Position", "mut_aa", "binding_ddg", "stability_ddg"])
+
 def main():
     parser = argparse.ArgumentParser(description="筛选 binding_ddG > 阈值 且 stability_ddG < 阈值 的突变并计算加权score")
     parser.add_argument("--dir", required=True, help="包含 ddG CSV 文件的目录")
@@ -25,22 +34,27 @@ def main():
     parser.add_argument("--stab_threshold", type=float, default=1.5, help="stability_ddG 阈值（默认 0.5）")
     parser.add_argument("--w_binding", type=float, default=0.5, help="binding_ddG 权重（默认 0.5）")
     parser.add_argument("--w_stability", type=float, default=0.5, help="stability_ddG 权重（默认 0）")
+    parser.add_argument("--store", help="fxout_store.py 生成的 NPZ 存储（指定后不再读取 ddG CSV 文件）")
     args = parser.parse_args()
 
-    binding_file = find_file_by_pattern(args.dir, "binding_ddg")
-    stability_file = find_file_by_pattern(args.dir, "stability_ddg")
+    if args.store:
+        merged = load_store(args.store)
+        print(f"使用存储：{args.store}")
+    else:
+        binding_file = find_file_by_pattern(args.dir, "binding_ddg")
+        stability_file = find_file_by_pattern(args.dir, "stability_ddg")
 
-    print(f"使用文件：\n  binding: {binding_file}\n  stability: {stability_file}")
+        print(f"使用文件：\n  binding: {binding_file}\n  stability: {stability_file}")
 
-    bind_df = pd.read_csv(binding_file)
-    stab_df = pd.read_csv(stability_file)
+        bind_df = pd.read_csv(binding_file)
+        stab_df = pd.read_csv(stability_file)
 
-    if "Position" not in bind_df.columns or "Position" not in stab_df.columns:
-        raise ValueError("输入文件中未找到 'Position' 列，请检查文件格式。")
+        if "Position" not in bind_df.columns or "Position" not in stab_df.columns:
+            raise ValueError("输入文件中未找到 'Position' 列，请检查文件格式。")
 
-    bind_melt = bind_df.melt(id_vars=["Position"], var_name="mut_aa", value_name="binding_ddg")
-    stab_melt = stab_df.melt(id_vars=["Position"], var_name="mut_aa", value_name="stability_ddg")
-    merged = pd.merge(bind_melt, stab_melt, on=["Position", "mut_aa"], how="inner")
+        bind_melt = bind_df.melt(id_vars=["Position"], var_name="mut_aa", value_name="binding_ddg")
+        stab_melt = stab_df.melt(id_vars=["Position"], var_name="mut_aa", value_name="stability_ddg")
+        merged = pd.merge(bind_melt, stab_melt, on=["Position", "mut_aa"], how="inner")
 
     merged["binding_ddg"] = pd.to_numeric(merged["binding_ddg"], errors="coerce")
     merged["stability_ddg"] = pd.to_numeric(merged["stability_ddg"], errors="coerce")
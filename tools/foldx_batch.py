@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+FoldX AnalyseComplex 批量调度
+
+把突变体结构分组写入 pdb-list 文件，每个 foldx 进程通过 --pdb-list 处理一组结构，
+只加载一次 rotabase 和参数；与野生型相同的“突变”（如 Q24 -> GLN24）以及非标准残基
+变体不再提交计算。已完成或已缓存的突变体在分组前剔除。
+"""
+import argparse
+import glob
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import checkpoint
+import fxout_store
+import result_cache
+
+AA1_TO_AA3 = {
+    "A": "ALA", "R": "ARG", "N": "ASN", "D": "ASP", "C": "CYS",
+    "E": "GLU", "Q": "GLN", "G": "GLY", "H": "HIS", "I": "ILE",
+    "L": "LEU", "K": "LYS", "M": "MET", "F": "PHE", "P": "PRO",
+    "S": "SER", "T": "THR", "W": "TRP", "Y": "TYR", "V": "VAL",
+}
+AC_PREFIXES = ["Summary", "Interaction", "Interface_Residues", "Indiv_energies"]
+
+_mut_pat = re.compile(r"^([A-Z0-9]{3})(\d+)_")
+
+
+def wt_residues(positions):
+    """解析 PositionScan 位点串（如 QA24a,KA31a），返回 {位置: 野生型三字母}"""
+    wt = {}
+    for item in positions.split(","):
+        m = re.match(r"^([A-Z])[A-Za-z](\d+)", item.strip())
+        if m and m.group(1) in AA1_TO_AA3:
+            wt[m.group(2)] = AA1_TO_AA3[m.group(1)]
+    return wt
+
+
+def select_mutants(mutdir, base, positions):
+    """返回需要计算的结构：Repair 野生型 + 标准氨基酸的非同义突变体"""
+    wt = wt_residues(positions)
+    repair = f"{base}_Repair.pdb"
+    selected, skipped = [], 0
+    for path in sorted(glob.glob(os.path.join(mutdir, "*.pdb"))):
+        name = os.path.basename(path)
+        if name == repair:
+            selected.append(path)
+            continue
+        m = _mut_pat.match(name)
+        if not m or m.group(1) not in AA1_TO_AA3.values() or wt.get(m.group(2)) == m.group(1):
+            skipped += 1
+            continue
+        selected.append(path)
+    return selected, skipped
+
+
+def ac_outputs(energy_out, name):
+    return [p for p in (os.path.join(energy_out, f"{prefix}_{name}_AC.fxout") for prefix in AC_PREFIXES)
+            if os.path.isfile(p)]
+
+
+def unit_paths(args, pdb):
+    name = os.path.splitext(os.path.basename(pdb))[0]
+    marker = os.path.join(args.state, "analyse_complex", f"{name}.done")
+    return name, marker
+
+
+def cache_key(args, pdb):
+    if not args.cache_dir:
+        return None
+    return result_cache.make_key([pdb], ["AnalyseComplex", args.chains, f"foldx={args.foldx_version}"])
+
+
+def plan(args):
+    """剔除已完成/已缓存的突变体，其余分组写入 pdb-list 文件，输出各列表路径"""
+    cache = result_cache.ResultCache(args.cache_dir) if args.cache_dir else None
+    mutants, skipped = select_mutants(args.mutdir, args.base, args.positions)
+    # 已合并进 NPZ 存储的结构视为完成（小文件可能已被清理，标记随之失效）
+    stored = set(fxout_store.FxoutStore.load(args.store).records) if args.store else set()
+
+    todo, done, cached = [], 0, 0
+    for pdb in mutants:
+        name, marker = unit_paths(args, pdb)
+        if name in stored or checkpoint.unit_done(marker):
+            done += 1
+            continue
+        key = cache_key(args, pdb)
+        if cache and cache.get(key, args.energy_out) is not None:
+            if checkpoint.mark_done(marker, ac_outputs(args.energy_out, name)):
+                cached += 1
+                continue
+        todo.append(pdb)
+
+    print(f"  [PLAN] 共 {len(mutants)} 个结构：已完成 {done}，缓存命中 {cached}，"
+          f"待计算 {len(todo)}，跳过同义/非标准突变 {skipped}", file=sys.stderr)
+
+    os.makedirs(args.listdir, exist_ok=True)
+    for old in glob.glob(os.path.join(args.listdir, "batch_*.txt")):
+        os.remove(old)
+    if not todo:
+        return
+
+    size = args.batch_size or -(-len(todo) // args.workers)
+    for i in range(0, len(todo), size):
+        list_file = os.path.join(args.listdir, f"batch_{i // size:04d}.txt")
+        with open(list_file, "w") as f:
+            for pdb in todo[i:i + size]:
+                f.write(os.path.basename(pdb) + "\n")
+        print(list_file)
+
+
+def collect(args):
+    """一个批次结束后逐个登记结果：写入缓存并写完成标记，返回缺失的突变体数"""
+    cache = result_cache.ResultCache(args.cache_dir) if args.cache_dir else None
+    missing = 0
+    with open(args.list) as f:
+        names = [line.strip() for line in f if line.strip()]
+    for fname in names:
+        pdb = os.path.join(args.mutdir, fname)
+        name, marker = unit_paths(args, pdb)
+        outputs = ac_outputs(args.energy_out, name)
+        if not os.path.isfile(os.path.join(args.energy_out, f"Summary_{name}_AC.fxout")):
+            print(f"  [MISSING] {name}", file=sys.stderr)
+            missing += 1
+            continue
+        if cache:
+            cache.put(cache_key(args, pdb), outputs)
+        checkpoint.mark_done(marker, outputs)
+    if cache and os.environ.get("TRIM_CACHE_MAX_SIZE"):
+        cache.evict(result_cache.parse_size(os.environ["TRIM_CACHE_MAX_SIZE"]))
+    return missing
+
+
+def run_foldx(foldx, chains, mutdir, outdir, pdb=None, pdb_list=None):
+    cmd = [foldx, "--command=AnalyseComplex", f"--pdb-dir={mutdir}",
+           f"--analyseComplexChains={chains}", f"--output-dir={outdir}", "--screen=false"]
+    cmd.append(f"--pdb-list={pdb_list}" if pdb_list else f"--pdb={pdb}")
+    return subprocess.call(cmd, cwd=outdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def bench(args):
+    """对比逐个结构启动 foldx 与按 pdb-list 批量处理的吞吐量（突变体/秒）"""
+    mutants, _ = select_mutants(args.mutdir, args.base, args.positions)
+    mutants = mutants[:args.n]
+    if not mutants:
+        print("未找到可用于测试的突变体结构", file=sys.stderr)
+        sys.exit(1)
+
+    tmp = tempfile.mkdtemp(prefix="foldx_bench_")
+    try:
+        single_out = os.path.join(tmp, "single")
+        os.makedirs(single_out)
+        t0 = time.time()
+        with ThreadPoolExecutor(args.workers) as pool:
+            list(pool.map(lambda p: run_foldx(args.foldx, args.chains, args.mutdir, single_out,
+                                              pdb=os.path.basename(p)), mutants))
+        single = time.time() - t0
+
+        batch_out = os.path.join(tmp, "batch")
+        os.makedirs(batch_out)
+        size = -(-len(mutants) // args.workers)
+        lists = []
+        for i in range(0, len(mutants), size):
+            list_file = os.path.join(tmp, f"batch_{i // size}.txt")
+            with open(list_file, "w") as f:
+                f.write("\n".join(os.path.basename(p) for p in mutants[i:i + size]) + "\n")
+            lists.append(list_file)
+        t0 = time.time()
+        with ThreadPoolExecutor(args.workers) as pool:
+            list(pool.map(lambda l: run_foldx(args.foldx, args.chains, args.mutdir, batch_out,
+                                              pdb_list=l), lists))
+        batched = time.time() - t0
+
+        n_single = len(glob.glob(os.path.join(single_out, "Summary_*.fxout")))
+        n_batch = len(glob.glob(os.path.join(batch_out, "Summary_*.fxout")))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print(f"突变体数: {len(mutants)}  并行数: {args.workers}")
+    print(f"逐个启动: {single:8.1f} s  {n_single / single:6.2f} mutants/s  ({n_single} 个结果)")
+    print(f"批量列表: {batched:8.1f} s  {n_batch / batched:6.2f} mutants/s  ({n_batch} 个结果)")
+    print(f"加速比: {single / batched:.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FoldX AnalyseComplex 批量调度")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def common(p):
+        p.add_argument("--mutdir", required=True, help="突变体结构目录（mutation）")
+        p.add_argument("--base", required=True, help="复合物名称")
+        p.add_argument("--positions", required=True, help="PositionScan 位点串，如 QA24a,KA31a")
+        p.add_argument("--chains", required=True, help="AnalyseComplex 链分组，如 B,A")
+
+    p_plan = sub.add_parser("plan", help="生成批次 pdb-list 文件")
+    common(p_plan)
+    p_plan.add_argument("--energy-out", required=True, help="能量输出目录")
+    p_plan.add_argument("--state", required=True, help="完成标记目录")
+    p_plan.add_argument("--listdir", required=True, help="pdb-list 文件输出目录")
+    p_plan.add_argument("--workers", type=int, default=1, help="并行 foldx 进程数")
+    p_plan.add_argument("--batch-size", type=int, default=0, help="每批结构数（默认均分给各进程）")
+    p_plan.add_argument("--foldx-version", default="", help="FoldX 版本指纹")
+    p_plan.add_argument("--cache-dir", default=os.environ.get("TRIM_CACHE_DIR"), help="结果缓存目录")
+    p_plan.add_argument("--store", help="fxout_store.py 的 NPZ 存储，其中已有的结构不再计算")
+
+    p_collect = sub.add_parser("collect", help="登记一个批次的计算结果")
+    p_collect.add_argument("--list", required=True, help="pdb-list 文件")
+    p_collect.add_argument("--mutdir", required=True)
+    p_collect.add_argument("--chains", required=True)
+    p_collect.add_argument("--energy-out", required=True)
+    p_collect.add_argument("--state", required=True)
+    p_collect.add_argument("--foldx-version", default="")
+    p_collect.add_argument("--cache-dir", default=os.environ.get("TRIM_CACHE_DIR"))
+
+    p_bench = sub.add_parser("bench", help="对比逐个与批量 AnalyseComplex 的吞吐量")
+    common(p_bench)
+    p_bench.add_argument("--foldx", required=True, help="foldx 可执行文件")
+    p_bench.add_argument("--workers", type=int, default=4, help="并行 foldx 进程数")
+    p_bench.add_argument("-n", type=int, default=40, help="参与测试的突变体数")
+
+    args = parser.parse_args()
+    if args.command == "plan":
+        plan(args)
+    elif args.command == "collect":
+        if collect(args):
+            sys.exit(1)
+    elif args.command == "bench":
+        bench(args)
+
+
+if __name__ == "__main__":
+    main()
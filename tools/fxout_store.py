@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+FoldX AnalyseComplex 输出的列式合并存储（NPZ）
+
+把 energy 目录中每个突变体的 Summary / Interaction / Interface_Residues / Indiv_energies
+四类 .fxout 小文件解析进一个 NPZ 文件：每行一个结构，以 链、位置、野生型残基、突变残基 为键，
+保留所有能量项。合并后可选择删除小文件，calculate_ddg_by_position.py 与
+filter_high_ddg_mutations.py 可直接读取该存储。
+"""
+import argparse
+import glob
+import os
+import re
+import sys
+
+import numpy as np
+
+AA1_TO_AA3 = {
+    "A": "ALA", "R": "ARG", "N": "ASN", "D": "ASP", "C": "CYS",
+    "E": "GLU", "Q": "GLN", "G": "GLY", "H": "HIS", "I": "ILE",
+    "L": "LEU", "K": "LYS", "M": "MET", "F": "PHE", "P": "PRO",
+    "S": "SER", "T": "THR", "W": "TRP", "Y": "TYR", "V": "VAL",
+}
+FXOUT_TYPES = ["Summary", "Interaction", "Interface_Residues", "Indiv_energies"]
+# 与 calculate_ddg_by_position.read_foldx_energies 相同的两列（按空白分隔的第 6、8 列）
+BINDING_TERM = "interaction_energy"
+STABILITY_TERM = "stability_group2"
+
+_file_pat = re.compile(r"^(Summary|Interaction|Interface_Residues|Indiv_energies)_(.+)_AC\.fxout$")
+_mut_pat = re.compile(r"^([A-Z0-9]{3})(\d+)_")
+
+
+def is_data_line(tokens):
+    """fxout 数据行：首列为结构路径（./<结构>.pdb 或 --pdb-dir 给出的绝对路径），
+    本模块与 calculate_ddg_by_position.read_foldx_energies 共用，入库与直接读取认定的数据行一致"""
+    return bool(tokens) and (tokens[0].startswith("./") or tokens[0].endswith(".pdb"))
+
+
+def parse_table(path):
+    """解析 fxout 表格：返回 [(列名列表, 数据行)]，列名取数据行之前最近的表头"""
+    rows, header = [], None
+    with open(path) as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line.strip():
+                continue
+            cells = line.split("\t")
+            tokens = line.split()
+            if is_data_line(tokens):
+                names = header if header and len(header) == len(tokens) else \
+                    [f"col{i}" for i in range(len(tokens))]
+                rows.append((names, tokens))
+            elif cells[0].strip() == "Pdb":
+                header = [c.strip() for c in cells if c.strip()]
+    return rows
+
+
+def to_float(text):
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def parse_structure(indir, name):
+    """解析一个结构的四类 fxout 文件，返回 (数值项 dict, 界面残基字符串, 已读取的文件列表)"""
+    terms, interface, used = {}, "", []
+    for ftype in FXOUT_TYPES:
+        path = os.path.join(indir, f"{ftype}_{name}_AC.fxout")
+        if not os.path.isfile(path):
+            continue
+        used.append(path)
+        if ftype == "Interface_Residues":
+            with open(path) as f:
+                lines = [l.strip() for l in f if l.strip()]
+            # 最后一行为界面残基列表（如 QA24 KA31 ...）
+            interface = " ".join(lines[-1].split()) if lines else ""
+            continue
+        for names, tokens in parse_table(path):
+            prefix = ftype
+            if ftype == "Indiv_energies" and len(tokens) > 1:
+                prefix = f"{ftype}:{tokens[1]}"
+            for col, value in zip(names[1:], tokens[1:]):
+                v = to_float(value)
+                if v is not None:
+                    terms[f"{prefix}:{col}"] = v
+            # parse_table 只返回 is_data_line 认定的数据行
+            if ftype == "Summary" and BINDING_TERM not in terms and len(tokens) > 7:
+                binding, stability = to_float(tokens[5]), to_float(tokens[7])
+                if binding is not None and stability is not None:
+                    terms[BINDING_TERM] = binding
+                    terms[STABILITY_TERM] = stability
+    return terms, interface, used
+
+
+def wt_map(positions):
+    """PositionScan 位点串（如 QA24a）-> {位置: (链, 野生型三字母)}"""
+    result = {}
+    for item in (positions or "").split(","):
+        m = re.match(r"^([A-Z])([A-Za-z])(\d+)", item.strip())
+        if m and m.group(1) in AA1_TO_AA3:
+            result[int(m.group(3))] = (m.group(2), AA1_TO_AA3[m.group(1)])
+    return result
+
+
+class FxoutStore:
+    """内存中的列式表：键列 + 数值矩阵 + 界面残基文本列"""
+
+    def __init__(self):
+        self.records = {}
+
+    @classmethod
+    def load(cls, path):
+        store = cls()
+        if not os.path.isfile(path):
+            return store
+        with np.load(path, allow_pickle=False) as data:
+            columns = list(data["columns"])
+            values = data["values"]
+            for i, name in enumerate(data["name"]):
+                terms = {c: float(v) for c, v in zip(columns, values[i]) if not np.isnan(v)}
+                store.records[str(name)] = {
+                    "chain": str(data["chain"][i]),
+                    "position": int(data["position"][i]),
+                    "wt": str(data["wt"][i]),
+                    "mut": str(data["mut"][i]),
+                    "is_wt": bool(data["is_wt"][i]),
+                    "terms": terms,
+                    "interface_residues": str(data["interface_residues"][i]),
+                }
+        return store
+
+    def add(self, name, terms, interface, wt_positions, wt_name):
+        m = _mut_pat.match(name)
+        if name == wt_name or not m:
+            is_wt = name == wt_name
+            chain, position, wt, mut = "", -1, "", "WT" if is_wt else ""
+        else:
+            position = int(m.group(2))
+            chain, wt = wt_positions.get(position, ("", ""))
+            mut, is_wt = m.group(1), False
+        self.records[name] = {
+            "chain": chain, "position": position, "wt": wt, "mut": mut, "is_wt": is_wt,
+            "terms": terms, "interface_residues": interface,
+        }
+
+    def save(self, path):
+        names = sorted(self.records, key=lambda n: (self.records[n]["position"], self.records[n]["mut"], n))
+        columns = sorted({c for r in self.records.values() for c in r["terms"]})
+        col_index = {c: j for j, c in enumerate(columns)}
+        values = np.full((len(names), len(columns)), np.nan)
+        for i, name in enumerate(names):
+            for c, v in self.records[name]["terms"].items():
+                values[i, col_index[c]] = v
+
+        def column(key, dtype=None):
+            return np.array([self.records[n][key] for n in names], dtype=dtype)
+
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez_compressed(
+                f,
+                name=np.array(names, dtype=str),
+                chain=column("chain", str),
+                position=column("position", np.int32),
+                wt=column("wt", str),
+                mut=column("mut", str),
+                is_wt=column("is_wt", bool),
+                columns=np.array(columns, dtype=str),
+                values=values,
+                interface_residues=column("interface_residues", str),
+            )
+        os.replace(tmp, path)
+
+
+def load_ddg(path):
+    """读取存储并计算 ΔΔG（相对 Repair 野生型），返回
+    [(位置, 突变三字母, binding_ddg, stability_ddg)]，数值保留两位小数，与 CSV 表一致"""
+    store = FxoutStore.load(path)
+    wt = [r for r in store.records.values() if r["is_wt"]]
+    if not wt or BINDING_TERM not in wt[0]["terms"]:
+        raise ValueError(f"{path} 中未找到野生型能量")
+    wt_bind = wt[0]["terms"][BINDING_TERM]
+    wt_stab = wt[0]["terms"][STABILITY_TERM]
+    rows = []
+    for r in store.records.values():
+        if r["is_wt"] or r["position"] < 0 or BINDING_TERM not in r["terms"]:
+            continue
+        rows.append((r["position"], r["mut"],
+                     round(r["terms"][BINDING_TERM] - wt_bind, 2),
+                     round(r["terms"][STABILITY_TERM] - wt_stab, 2)))
+    return rows
+
+
+def ingest(args):
+    store = FxoutStore.load(args.out)
+    names = set()
+    for path in glob.glob(os.path.join(args.indir, "*_AC.fxout")):
+        m = _file_pat.match(os.path.basename(path))
+        if m:
+            names.add(m.group(2))
+
+    wt_positions = wt_map(args.positions)
+    wt_name = f"{args.base}_Repair"
+    ingested, used_files = 0, []
+    for name in sorted(names):
+        terms, interface, used = parse_structure(args.indir, name)
+        if BINDING_TERM not in terms:
+            print(f"  [WARNING] {name} 的 Summary 文件不完整，跳过", file=sys.stderr)
+            continue
+        store.add(name, terms, interface, wt_positions, wt_name)
+        used_files.extend(used)
+        ingested += 1
+
+    store.save(args.out)
+    print(f"已合并 {ingested} 个结构（累计 {len(store.records)} 个）-> {args.out}")
+
+    if args.delete:
+        for path in used_files:
+            os.remove(path)
+        print(f"已删除 {len(used_files)} 个 fxout 小文件")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="将 FoldX AnalyseComplex 的 fxout 小文件合并为列式 NPZ 存储")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_ingest = sub.add_parser("ingest", help="解析并合并 fxout 文件（增量追加到已有存储）")
+    p_ingest.add_argument("--indir", required=True, help="AnalyseComplex 输出目录")
+    p_ingest.add_argument("--out", required=True, help="NPZ 存储路径")
+    p_ingest.add_argument("--base", required=True, help="复合物名称（用于识别 <name>_Repair 野生型）")
+    p_ingest.add_argument("--positions", default="", help="PositionScan 位点串，用于补全链与野生型残基")
+    p_ingest.add_argument("--delete", action="store_true", help="合并成功后删除已解析的 fxout 文件")
+
+    p_show = sub.add_parser("show", help="打印存储中的 ΔΔG")
+    p_show.add_argument("store", help="NPZ 存储路径")
+
+    args = parser.parse_args()
+    if args.command == "ingest":
+        ingest(args)
+    elif args.command == "show":
+        for pos, mut, bind, stab in sorted(load_ddg(args.store)):
+            print(f"{pos}\t{mut}\t{bind:.2f}\t{stab:.2f}")
+
+
+if __name__ == "__main__":
+    main()
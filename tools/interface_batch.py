@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+InterfaceAnalyzer 批量评估
+
+把待评估的结构分成 THREAD 组写入 -l 列表文件，每个 InterfaceAnalyzer 进程处理一组结构，
+Rosetta 数据库与 ref2015 打分函数每组只加载一次；合并的打分输出再按 description 拆回
+每个结构的打分片段（scores/<name>.sc），与逐个结构运行的输出一致。
+"""
+import argparse
+import glob
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import job_trace
+import scratch
+
+_suffix_pat = re.compile(r"^_\d+$")
+
+
+def chunk(items, n):
+    """均分为 n 组（保持原顺序）"""
+    n = max(1, min(n, len(items)))
+    size, extra = divmod(len(items), n)
+    groups, start = [], 0
+    for i in range(n):
+        end = start + size + (1 if i < extra else 0)
+        groups.append(items[start:end])
+        start = end
+    return groups
+
+
+def ia_command(args, outfile, pdb=None, pdb_list=None):
+    cmd = [args.ia]
+    cmd += ["-l", pdb_list] if pdb_list else ["-s", pdb]
+    cmd += [
+        "-interface", args.interface,
+        "-scorefxn", "ref2015",
+        "-pack_input", "false",
+        "-pack_separated", "false",
+        "-mute", "all",
+        "-out:file:score_only", outfile,
+    ]
+    return cmd
+
+
+def run_ia(args, cmd):
+    out = open(args.log_out, "a") if args.log_out else subprocess.DEVNULL
+    err = open(args.log_err, "a") if args.log_err else subprocess.DEVNULL
+    try:
+        return job_trace.call(cmd, stage="InterfaceAnalyzer", mem_key="InterfaceAnalyzer",
+                              stdout=out, stderr=err)
+    finally:
+        for f in (out, err):
+            if f is not subprocess.DEVNULL:
+                f.close()
+
+
+def owner(desc, names):
+    """description 为 <结构名>_0001 形式，返回对应的结构名（取最长匹配）"""
+    best = None
+    for name in names:
+        if desc == name or (desc.startswith(name) and _suffix_pat.match(desc[len(name):])):
+            if best is None or len(name) > len(best):
+                best = name
+    return best
+
+
+def split_scores(score_file, names, scores_dir):
+    """把一组结构的打分文件拆成每个结构一个片段，返回已写出的结构名"""
+    sequence, header, rows = "SEQUENCE:\n", None, {}
+    with open(score_file) as f:
+        for line in f:
+            if line.startswith("SEQUENCE:"):
+                sequence = line
+            elif line.startswith("SCORE:"):
+                desc = line.split()[-1]
+                if desc == "description":
+                    header = line
+                    continue
+                name = owner(desc, names)
+                if name:
+                    rows.setdefault(name, []).append(line)
+    if header is None:
+        return set()
+    for name, lines in rows.items():
+        fragment = os.path.join(scores_dir, f"{name}.sc")
+        tmp = f"{fragment}.tmp"
+        with open(tmp, "w") as f:
+            f.write(sequence)
+            f.write(header)
+            f.writelines(lines)
+        os.replace(tmp, fragment)
+    return set(rows)
+
+
+def run_chunk(args, pdbs, workdir, index):
+    names = [os.path.splitext(os.path.basename(p))[0] for p in pdbs]
+    list_file = os.path.join(workdir, f"batch_{index:04d}.txt")
+    score_file = os.path.join(workdir, f"batch_{index:04d}.sc")
+    with open(list_file, "w") as f:
+        f.write("\n".join(os.path.abspath(p) for p in pdbs) + "\n")
+    rc = run_ia(args, ia_command(args, score_file, pdb_list=list_file))
+    written = split_scores(score_file, names, args.scores_dir) if os.path.isfile(score_file) else set()
+    missing = [(n, p) for n, p in zip(names, pdbs) if n not in written]
+    if rc != 0 or missing:
+        print(f"  [WARNING] batch_{index:04d}: rc={rc}，缺少 {len(missing)} 个结构的打分，逐个重试",
+              file=sys.stderr)
+    # 一个结构出错会让整组中止，缺少打分的结构逐个以 -s 重跑，只有单独运行仍失败的才算失败
+    for name, pdb in missing:
+        single = os.path.join(workdir, f"batch_{index:04d}_{name}.sc")
+        run_ia(args, ia_command(args, single, pdb=pdb))
+        if os.path.isfile(single) and split_scores(single, [name], args.scores_dir):
+            written.add(name)
+        else:
+            print(f"  [FAILED] {name}: InterfaceAnalyzer 未输出打分", file=sys.stderr)
+    return len(written)
+
+
+def run(args):
+    pdbs = [p for p in args.structures if p.strip()]
+    if not pdbs:
+        return 0
+    os.makedirs(args.scores_dir, exist_ok=True)
+    # 列表与合并打分文件放在暂存目录（TRIM_STAGING=1 时为节点本地），只写回每个结构的打分片段
+    workdir = scratch.mkdtemp(".ia_batch.", args.scores_dir)
+    try:
+        groups = chunk(pdbs, args.threads)
+        with ThreadPoolExecutor(len(groups)) as pool:
+            done = sum(pool.map(lambda ig: run_chunk(args, ig[1], workdir, ig[0]), enumerate(groups)))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(f"  [IA] {done}/{len(pdbs)} 个结构完成界面打分（{len(groups)} 个批次）")
+    return len(pdbs) - done
+
+
+def bench(args):
+    """对比逐个结构启动 InterfaceAnalyzer 与按 -l 列表批量处理的耗时"""
+    pdbs = sorted(glob.glob(os.path.join(args.dir, "*.pdb")))[:args.n]
+    if not pdbs:
+        print("未找到可用于测试的结构", file=sys.stderr)
+        sys.exit(1)
+
+    tmp = tempfile.mkdtemp(prefix="ia_bench_")
+    try:
+        single_dir = os.path.join(tmp, "single")
+        os.makedirs(single_dir)
+        t0 = time.time()
+        with ThreadPoolExecutor(args.threads) as pool:
+            list(pool.map(lambda p: run_ia(args, ia_command(
+                args, os.path.join(single_dir, os.path.basename(p)[:-4] + ".sc"), pdb=p)), pdbs))
+        single = time.time() - t0
+
+        args.scores_dir = os.path.join(tmp, "batch")
+        t0 = time.time()
+        run(argparse.Namespace(**{**vars(args), "structures": pdbs}))
+        batched = time.time() - t0
+
+        n_single = len(glob.glob(os.path.join(single_dir, "*.sc")))
+        n_batch = len(glob.glob(os.path.join(args.scores_dir, "*.sc")))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print(f"结构数: {len(pdbs)}  并行数: {args.threads}")
+    print(f"逐个启动: {single:8.1f} s  {n_single / single:6.2f} structures/s  ({n_single} 个结果)")
+    print(f"批量列表: {batched:8.1f} s  {n_batch / batched:6.2f} structures/s  ({n_batch} 个结果)")
+    print(f"加速比: {single / batched:.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="InterfaceAnalyzer 批量界面评估")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def common(p):
+        p.add_argument("--ia", required=True, help="InterfaceAnalyzer 可执行文件")
+        p.add_argument("--interface", required=True, help="界面链分组，如 B_A")
+        p.add_argument("--threads", type=int, default=1, help="并行进程数（即批次数）")
+        p.add_argument("--log-out", help="Rosetta 标准输出日志")
+        p.add_argument("--log-err", help="Rosetta 错误日志")
+
+    p_run = sub.add_parser("run", help="批量评估结构并拆分为逐结构打分片段")
+    common(p_run)
+    p_run.add_argument("--scores-dir", required=True, help="打分片段输出目录")
+    p_run.add_argument("structures", nargs="*", help="待评估的结构")
+
+    p_bench = sub.add_parser("bench", help="对比逐个与批量 InterfaceAnalyzer 的耗时")
+    common(p_bench)
+    p_bench.add_argument("--dir", required=True, help="结构目录（如 docking/best）")
+    p_bench.add_argument("-n", type=int, default=40, help="参与测试的结构数")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        if run(args):
+            sys.exit(1)
+    elif args.command == "bench":
+        bench(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+PLIP 前的界面裁剪
+
+PLIP 统计的各类互作距离上限都不超过 6 Å，只有受体-配体界面附近的残基可能参与，
+大受体的其余残基只会拖慢 PLIP 的加氢、成键与互作识别。按重原子间距离保留距另一侧
+任一重原子不超过 margin Å 的残基（整个残基保留，并带上序列上相邻的 flank 个残基，
+避免界面残基的主链被截断），写成只含受体链与配体链的精简 PDB，链名与残基号不变。
+
+    crop    裁剪单个结构
+    verify  在参考结构集上分别用完整结构和裁剪结构运行 PLIP，比较 summary.py 使用的各类型互作数
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from contact_scan import element, pairs_within
+from pdb_chains import Structure, normalize_chains
+
+
+def interface_mask(structure, rec_chains, lig_chains, margin, flank=1):
+    """界面壳层内的原子（布尔数组）"""
+    chain = structure["chain"]
+    heavy = element(structure) != "H"
+    rec = np.flatnonzero(np.isin(chain, rec_chains) & heavy)
+    lig = np.flatnonzero(np.isin(chain, lig_chains) & heavy)
+
+    # 残基编号：按在文件中首次出现的顺序，便于向序列相邻的残基扩展
+    keys = np.char.add(np.char.add(chain, "|"), np.char.add(structure["resseq"].astype(str), structure["icode"]))
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    rank = np.empty(len(first), dtype=np.int64)
+    rank[np.argsort(first)] = np.arange(len(first))
+    residue = rank[inverse]
+    residue_chain = chain[np.sort(first)]
+
+    i, j, _ = pairs_within(structure["xyz"][rec], structure["xyz"][lig], margin)
+    near = np.zeros(len(first), dtype=bool)
+    near[residue[rec[i]]] = True
+    near[residue[lig[j]]] = True
+    core = near.copy()
+    for shift in range(1, flank + 1):
+        same = residue_chain[shift:] == residue_chain[:-shift]
+        near[shift:] |= core[:-shift] & same
+        near[:-shift] |= core[shift:] & same
+    return np.isin(chain, list(rec_chains) + list(lig_chains)) & near[residue]
+
+
+def crop_pdb(input_pdb, output_pdb, rec_chains, lig_chains, margin, flank=1):
+    """写出界面壳层结构，返回 (保留原子数, 原子总数)"""
+    structure = Structure.read(input_pdb)
+    mask = interface_mask(structure, rec_chains, lig_chains, margin, flank)
+    structure.take(mask).write(output_pdb)
+    return int(mask.sum()), len(structure)
+
+
+def crop(args):
+    start = time.perf_counter()
+    kept, total = crop_pdb(args.input, args.output, normalize_chains(args.rec), normalize_chains(args.lig),
+                           args.margin, args.flank)
+    print(f"  [CROP] {os.path.basename(args.input)}: 保留 {kept}/{total} 个原子，"
+          f"{(time.perf_counter() - start) * 1000:.1f} ms", file=sys.stderr)
+
+
+def verify(args):
+    """完整结构与裁剪结构的 PLIP 互作数应一致；有差异时退出码为 1"""
+    import plip_engine
+
+    rec, lig = normalize_chains(args.rec), normalize_chains(args.lig)
+    try:
+        plip_engine.init_worker(str([rec, lig]))
+    except ImportError:
+        sys.exit("verify 需要 PLIP，请在 trim 环境中运行")
+    itypes = list(plip_engine.REPORT_FIELDS)
+    print("\t".join(["name", "atoms", "kept", "full_s", "crop_s"] + itypes + ["status"]))
+    mismatched = 0
+    for pdb in args.inputs:
+        name = os.path.splitext(os.path.basename(pdb))[0]
+        with tempfile.TemporaryDirectory(prefix=f".crop_{name}.") as tmp:
+            cropped = os.path.join(tmp, os.path.basename(pdb))
+            kept, total = crop_pdb(pdb, cropped, rec, lig, args.margin, args.flank)
+            start = time.perf_counter()
+            _, full_rows, full_error = plip_engine.analyze(pdb)
+            middle = time.perf_counter()
+            _, crop_rows, crop_error = plip_engine.analyze(cropped)
+            end = time.perf_counter()
+        if full_error or crop_error:
+            print(f"  [FAILED] {name}: {full_error or crop_error}", file=sys.stderr)
+            mismatched += 1
+            continue
+        counts, same = [], True
+        for itype in itypes:
+            a, b = len(full_rows[itype]), len(crop_rows[itype])
+            counts.append(str(a) if a == b else f"{a}->{b}")
+            same &= a == b
+        mismatched += not same
+        print("\t".join([name, str(total), str(kept), f"{middle - start:.2f}", f"{end - middle:.2f}"]
+                        + counts + ["ok" if same else "DIFF"]), flush=True)
+    return 1 if mismatched else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="把复合物裁剪为界面壳层，缩短 PLIP 的运行时间")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def common(p):
+        p.add_argument("-r", "--rec", required=True, help="受体链，如 B 或 HL")
+        p.add_argument("-l", "--lig", required=True, help="配体链")
+        p.add_argument("--margin", type=float, default=10.0, help="距另一侧重原子的距离上限（Å）")
+        p.add_argument("--flank", type=int, default=1, help="额外保留的序列相邻残基数")
+
+    p_crop = sub.add_parser("crop", help="裁剪单个结构")
+    p_crop.add_argument("-i", "--input", required=True, help="复合物 PDB")
+    p_crop.add_argument("-o", "--output", required=True, help="裁剪后的 PDB")
+    common(p_crop)
+
+    p_verify = sub.add_parser("verify", help="比较完整结构与裁剪结构的 PLIP 互作数")
+    p_verify.add_argument("inputs", nargs="+", help="参考结构")
+    common(p_verify)
+
+    args = parser.parse_args()
+    if args.command == "crop":
+        crop(args)
+    elif args.command == "verify":
+        sys.exit(verify(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+"""
+外部程序调用的资源记录与汇总
+
+流程启动的每个外部程序（FoldX、Rosetta、PLIP 等）都经由本模块运行，结束后向
+TRIM_TRACE 指定的 JSONL 文件追加一条记录：阶段、突变体、墙钟时间、用户态/内核态
+CPU 时间、峰值内存（RSS）与退出码。TRIM_TRACE 为空时不做任何记录。
+    Python 内：job_trace.call(cmd, stage="relax", stdout=...)
+    Shell 内：traced <阶段> <命令...>（utils.sh，内部调用 run 子命令）
+report 子命令按阶段汇总耗时、核利用率、各突变体的关键路径与耗时异常的任务。
+"""
+import argparse
+import fcntl
+import json
+import os
+import resource
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import mem_gate
+
+
+def trace_path():
+    return os.environ.get("TRIM_TRACE") or None
+
+
+def default_mutant():
+    return os.environ.get("TRIM_MUTANT") or None
+
+
+def write_record(record, path=None):
+    """追加一行 JSON；多个进程同时写入时用文件锁保证每行完整"""
+    path = path or trace_path()
+    if not path:
+        return
+    line = json.dumps(record, ensure_ascii=False, sort_keys=True) + "\n"
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            f.write(line)
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def make_record(stage, mutant, cmd, start, end, rc, usage, **extra):
+    record = {
+        "stage": stage,
+        "mutant": mutant,
+        "program": os.path.basename(str(cmd[0])) if cmd else None,
+        "cmd": " ".join(str(c) for c in cmd),
+        "start": round(start, 3),
+        "wall": round(end - start, 3),
+        "user": round(usage.ru_utime, 3),
+        "sys": round(usage.ru_stime, 3),
+        "max_rss_kb": usage.ru_maxrss,
+        "rc": rc,
+        "host": socket.gethostname(),
+        "pid": os.getpid(),
+    }
+    record.update(extra)
+    return record
+
+
+def parse_duration(text):
+    """解析 90 / 30m / 12h / 2d 形式的时长（秒），0 或空表示不限时"""
+    text = str(text).strip().lower()
+    if not text:
+        return 0
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    if text[-1] in units:
+        return float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+
+def job_timeout(stage):
+    """TRIM_JOB_TIMEOUT 形如 "12h" 或 "docking_protocol=48h,PositionScan=2h,12h"（无阶段名的为缺省值）"""
+    default = 0
+    for item in (os.environ.get("TRIM_JOB_TIMEOUT") or "").split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            if name.strip() == stage:
+                return parse_duration(value)
+        elif item.strip():
+            default = parse_duration(item)
+    return default
+
+
+def job_retries():
+    return int(os.environ.get("TRIM_JOB_RETRIES") or 0)
+
+
+def record_failure(stage, mutant, cmd, rc, reason, attempts=1):
+    """追加到失败清单 TRIM_FAILURES（TSV），流程结束时据此列出失败的任务及原因"""
+    path = os.environ.get("TRIM_FAILURES")
+    print(f"  [FAILED] {stage} {mutant or '-'}: {reason}", file=sys.stderr, flush=True)
+    if not path:
+        return
+    cmd = " ".join(str(c) for c in cmd) if isinstance(cmd, (list, tuple)) else str(cmd)
+    row = [time.strftime("%F %T"), stage, mutant or "-", str(attempts), str(rc), reason, cmd]
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            if f.tell() == 0:
+                f.write("time\tstage\tmutant\tattempts\trc\treason\tcmd\n")
+            f.write("\t".join(c.replace("\t", " ").replace("\n", " ") for c in row) + "\n")
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def describe(rc, reason):
+    if reason:
+        return reason
+    if rc < 0:
+        return f"killed by signal {-rc}"
+    return f"exit code {rc}"
+
+
+def kill_group(proc):
+    """终止进程及其派生的子进程（mpirun、shell 包装脚本等）；进程以独立会话启动，进程组号即其 pid"""
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def run_once(cmd, stage, mutant, extra, mem_key, timeout, cancel, kwargs):
+    """运行一次并记录资源占用；超时或被取消时终止整个进程组，返回 (退出码, 失败原因)"""
+    gate = mem_gate.Admission(mem_key) if mem_key and mem_gate.enabled() else None
+    usage, state = None, {}
+    if gate:
+        gate.acquire()
+    try:
+        start = time.time()
+        try:
+            proc = subprocess.Popen(cmd, start_new_session=True, **kwargs)
+        except OSError as e:
+            write_record(make_record(stage, mutant, cmd, start, time.time(), 127,
+                                     resource.struct_rusage((0,) * 16), **extra))
+            return 127, f"start failed: {e.strerror}"
+        if gate:
+            gate.watch(proc.pid)
+        finished = threading.Event()
+        if timeout or cancel:
+            def watchdog():
+                deadline = start + timeout if timeout else None
+                while not finished.wait(0.5):
+                    if cancel is not None and cancel.is_set():
+                        state["reason"] = "cancelled"
+                    elif deadline and time.time() >= deadline:
+                        state["reason"] = f"timeout after {timeout:.0f}s"
+                    else:
+                        continue
+                    kill_group(proc)
+                    return
+            threading.Thread(target=watchdog, daemon=True).start()
+        try:
+            _, status, usage = os.wait4(proc.pid, 0)
+        except BaseException:
+            kill_group(proc)
+            proc.wait()
+            raise
+        finally:
+            finished.set()
+        proc.returncode = os.waitstatus_to_exitcode(status)
+    finally:
+        if gate:
+            gate.release(usage.ru_maxrss if usage else None)
+    rc = proc.returncode
+    if state.get("reason", "").startswith("timeout"):
+        rc = 124
+    write_record(make_record(stage, mutant, cmd, start, time.time(), rc, usage,
+                             **extra, **({"reason": state["reason"]} if state else {})))
+    return rc, state.get("reason")
+
+
+def call(cmd, stage, mutant=None, extra=None, mem_key=None, timeout=None, retries=None,
+         reseed=None, cancel=None, **kwargs):
+    """与 subprocess.call 相同，另记录子进程（含其已回收的子孙进程）的资源占用
+
+    extra 为附加到记录中的字段（如调度任务标记 task=True）。给出 mem_key 且设置了
+    TRIM_MEM_BUDGET 时，启动前经 mem_gate 按内存预算准入，结束后以实际峰值更新估计。
+    timeout（秒，缺省取 TRIM_JOB_TIMEOUT，0 为不限时）到期时终止进程，返回 124；
+    失败后最多重试 retries 次（缺省取 TRIM_JOB_RETRIES），reseed(第几次重试) 返回换用新随机种子的命令。
+    cancel 为 threading.Event，置位后终止进程且不再重试（推测执行中落后的副本）。
+    重试用尽仍失败时写入失败清单 TRIM_FAILURES。
+    """
+    timeout = job_timeout(stage) if timeout is None else timeout
+    retries = job_retries() if retries is None else retries
+    gated = mem_key and mem_gate.enabled()
+    if not (trace_path() or gated or timeout or retries or cancel):
+        return subprocess.call(cmd, **kwargs)
+    extra = dict(extra or {})
+    if mem_key:
+        extra["mem_key"] = mem_key
+    mutant = mutant or default_mutant()
+
+    for attempt in range(retries + 1):
+        if attempt and reseed:
+            cmd = reseed(attempt)
+        rc, reason = run_once(cmd, stage, mutant, {**extra, "attempt": attempt + 1},
+                              mem_key if gated else None, timeout, cancel, kwargs)
+        if rc == 0 or (cancel is not None and cancel.is_set()) or rc == 127:
+            break
+        if attempt < retries:
+            print(f"  [RETRY] {stage} {mutant or '-'}: {describe(rc, reason)}，第 {attempt + 1} 次重试",
+                  file=sys.stderr, flush=True)
+    if rc != 0 and not (cancel is not None and cancel.is_set()):
+        record_failure(stage, mutant, cmd, rc, describe(rc, reason), attempt + 1)
+    return rc
+
+
+@contextmanager
+def measure(stage, name, mutant=None):
+    """记录进程内完成的一项工作（如工作进程中的 PLIP 分析）；峰值内存为所在进程的峰值"""
+    if not trace_path():
+        yield
+        return
+    before = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.time()
+    rc = 0
+    try:
+        yield
+    except BaseException:
+        rc = 1
+        raise
+    finally:
+        after = resource.getrusage(resource.RUSAGE_SELF)
+        usage = resource.struct_rusage(
+            (after.ru_utime - before.ru_utime, after.ru_stime - before.ru_stime, after.ru_maxrss)
+            + (0,) * 13)
+        write_record(make_record(stage, mutant or default_mutant(), [name], start, time.time(), rc,
+                                 usage, inprocess=True))
+
+
+# ---------------------------------------------------------------- report
+
+def load(paths):
+    records = []
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    print(f"  [WARNING] 跳过无法解析的记录: {line[:80]}", file=sys.stderr)
+    return records
+
+
+def fmt_time(seconds):
+    if seconds >= 3600:
+        return f"{seconds / 3600:.2f}h"
+    if seconds >= 60:
+        return f"{seconds / 60:.1f}m"
+    return f"{seconds:.1f}s"
+
+
+def fmt_mem(kb):
+    return f"{kb / 1048576:.2f}G" if kb >= 1048576 else f"{kb / 1024:.0f}M"
+
+
+def span(records):
+    start = min(r["start"] for r in records)
+    end = max(r["start"] + r["wall"] for r in records)
+    return start, end
+
+
+def busy_time(records):
+    """按时间线合并各任务的运行区间，返回至少有一个任务在运行的总时长"""
+    intervals = sorted((r["start"], r["start"] + r["wall"]) for r in records)
+    total, cur_start, cur_end = 0.0, None, None
+    for s, e in intervals:
+        if cur_end is None or s > cur_end:
+            if cur_end is not None:
+                total += cur_end - cur_start
+            cur_start, cur_end = s, e
+        else:
+            cur_end = max(cur_end, e)
+    if cur_end is not None:
+        total += cur_end - cur_start
+    return total
+
+
+def report(args):
+    records = [r for r in load(args.traces) if "wall" in r and r["start"] >= args.since]
+    if not records:
+        print("没有可汇总的记录", file=sys.stderr)
+        return 1
+    tools = [r for r in records if not r.get("task")]
+    tasks = [r for r in records if r.get("task")]
+    jobs = tools or records
+    start, end = span(records)
+    elapsed = max(end - start, 1e-9)
+    cpu = sum(r["user"] + r["sys"] for r in jobs)
+
+    print(f"记录数: {len(records)}（外部程序 {len(tools)}，调度任务 {len(tasks)}）")
+    print(f"总耗时: {fmt_time(elapsed)}  CPU 时间: {fmt_time(cpu)}", end="")
+    if args.cores:
+        print(f"  核利用率: {cpu / (elapsed * args.cores):.1%}（{args.cores} 核）")
+    else:
+        print(f"  平均并发: {cpu / elapsed:.2f} 核")
+    failed = [r for r in records if r.get("rc")]
+    if failed:
+        print(f"失败: {len(failed)} 个任务退出码非零")
+
+    by_stage = defaultdict(list)
+    for r in jobs:
+        by_stage[r["stage"]].append(r)
+
+    print("\n[阶段]")
+    print(f"{'stage':<22}{'jobs':>6}{'span':>9}{'busy':>9}{'longest':>9}{'wall':>9}"
+          f"{'cpu':>9}{'cores':>7}{'maxRSS':>8}{'fail':>6}")
+    for stage, rs in sorted(by_stage.items(), key=lambda kv: span(kv[1])[0]):
+        s, e = span(rs)
+        wall = sum(r["wall"] for r in rs)
+        stage_cpu = sum(r["user"] + r["sys"] for r in rs)
+        busy = busy_time(rs)
+        print(f"{stage:<22}{len(rs):>6}{fmt_time(e - s):>9}{fmt_time(busy):>9}"
+              f"{fmt_time(max(r['wall'] for r in rs)):>9}{fmt_time(wall):>9}{fmt_time(stage_cpu):>9}"
+              f"{stage_cpu / max(busy, 1e-9):>7.2f}{fmt_mem(max(r['max_rss_kb'] for r in rs)):>8}"
+              f"{sum(1 for r in rs if r.get('rc')):>6}")
+
+    # 各突变体依次经过的外部程序耗时之和即其关键路径，最长者决定流程的下限
+    by_mutant = defaultdict(list)
+    for r in jobs:
+        if r.get("mutant"):
+            by_mutant[r["mutant"]].append(r)
+    if by_mutant:
+        chains = sorted(by_mutant.items(), key=lambda kv: -busy_time(kv[1]))
+        print(f"\n[关键路径] 耗时最长的 {min(args.top, len(chains))} 个突变体")
+        for mutant, rs in chains[:args.top]:
+            # 同一阶段的并行分片按运行区间合并，不重复计时
+            stages = defaultdict(list)
+            for r in rs:
+                stages[r["stage"]].append(r)
+            parts = {k: busy_time(v) for k, v in stages.items()}
+            detail = "  ".join(f"{k}={fmt_time(v)}" for k, v in sorted(parts.items(), key=lambda kv: -kv[1]))
+            print(f"  {mutant:<24}{fmt_time(sum(parts.values())):>9}  {detail}")
+
+    # 同阶段内耗时超过中位数 threshold 倍的任务
+    outliers = []
+    for stage, rs in by_stage.items():
+        if len(rs) < 3:
+            continue
+        median = statistics.median(r["wall"] for r in rs)
+        for r in rs:
+            if median > 0 and r["wall"] > args.threshold * median:
+                outliers.append((r["wall"] / median, stage, r))
+    outliers.sort(key=lambda x: -x[0])
+    print(f"\n[异常耗时] 超过同阶段中位数 {args.threshold:g} 倍的任务: {len(outliers)}")
+    for ratio, stage, r in outliers[:args.top]:
+        print(f"  {stage:<22}{r.get('mutant') or '-':<24}{fmt_time(r['wall']):>9}  x{ratio:.1f}"
+              f"  rc={r.get('rc')}  {fmt_mem(r['max_rss_kb'])}")
+
+    if tasks:
+        print("\n[调度任务]")
+        for r in sorted(tasks, key=lambda r: -r["wall"])[:args.top]:
+            name = r["stage"] + (f":{r['mutant']}" if r.get("mutant") else "")
+            print(f"  {name:<40}{fmt_time(r['wall']):>9}  rc={r.get('rc')}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="外部程序资源记录与汇总")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_run = sub.add_parser("run", help="运行一条命令并记录其资源占用")
+    p_run.add_argument("--stage", required=True, help="阶段名（如 relax、docking）")
+    p_run.add_argument("--mutant", help="突变体（缺省取环境变量 TRIM_MUTANT）")
+    p_run.add_argument("--mem-key", help="按内存预算准入时的程序/协议标识（见 mem_gate.py）")
+    p_run.add_argument("--timeout", help="超时时长（如 2h，缺省取 TRIM_JOB_TIMEOUT）")
+    p_run.add_argument("--retries", type=int, help="失败后的重试次数（缺省取 TRIM_JOB_RETRIES）")
+    p_run.add_argument("--task", action="store_true", help="记录为调度任务（exec_backend 提交到集群的任务）")
+    p_run.add_argument("--cores", type=int, help="调度任务分配的核数")
+    p_run.add_argument("cmd", nargs=argparse.REMAINDER, help="-- 之后为要运行的命令")
+
+    p_fail = sub.add_parser("fail", help="向失败清单追加一条记录（Shell 中检测到的失败）")
+    p_fail.add_argument("--stage", required=True, help="阶段名")
+    p_fail.add_argument("--mutant", help="突变体（缺省取环境变量 TRIM_MUTANT）")
+    p_fail.add_argument("--reason", required=True, help="失败原因")
+
+    p_report = sub.add_parser("report", help="汇总 JSONL 记录")
+    p_report.add_argument("traces", nargs="+", help="JSONL 记录文件")
+    p_report.add_argument("--since", type=float, default=0,
+                          help="只汇总该时刻（Unix 时间戳）之后开始的记录，如本次运行的启动时间")
+    p_report.add_argument("--cores", type=int, help="运行时的核数预算（THREAD），用于计算核利用率")
+    p_report.add_argument("--top", type=int, default=10, help="关键路径与异常任务的显示条数")
+    p_report.add_argument("--threshold", type=float, default=3.0, help="异常耗时判定倍数（相对同阶段中位数）")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        cmd = args.cmd[1:] if args.cmd[:1] == ["--"] else args.cmd
+        if not cmd:
+            parser.error("缺少要运行的命令")
+        timeout = parse_duration(args.timeout) if args.timeout is not None else None
+        extra = {"task": True, "cores": args.cores} if args.task else None
+        # 子进程在独立会话中，收不到发给本进程组的 SIGTERM：转为 SystemExit，由 call 终止子进程组
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+        rc = call(cmd, args.stage, args.mutant, extra=extra, mem_key=args.mem_key, timeout=timeout,
+                  retries=args.retries)
+        sys.exit(rc if rc >= 0 else 128 - rc)
+    elif args.command == "fail":
+        record_failure(args.stage, args.mutant or default_mutant(), "", 1, args.reason)
+    elif args.command == "report":
+        sys.exit(report(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+按内存预算准入外部程序
+
+relax/docking 等程序在启动前向共享账本（TRIM_MEM_LEDGER，JSON + 文件锁）申请内存：
+预计峰值取该程序与协议（mem_key，如 relax:<flags 指纹>）以往运行的峰值 RSS，
+只有已登记的占用加上本次预计不超过 TRIM_MEM_BUDGET 时才启动，否则等待其他任务结束。
+账本由所有进程（xargs 子进程、流水线中的各突变体、rosetta_shards 的各分片）共用，
+因此并发数随各阶段的实际内存需求变化，不再由 THREAD 一个数决定。
+
+尚无记录的 mem_key 按 TRIM_MEM_DEFAULT 预留；运行中会定期读取进程的峰值内存并上调预留，
+结束后以实际峰值更新该 mem_key 的估计。也可用 learn 子命令从 job_trace 记录预先学习。
+TRIM_MEM_BUDGET 为空时不做任何限制。
+"""
+import argparse
+import fcntl
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from result_cache import parse_size
+
+# 每个 mem_key 保留的最近峰值个数，估计值取其中最大者
+HISTORY = 20
+# 估计值的安全系数
+MARGIN = 1.1
+POLL = 2.0
+
+
+def enabled():
+    return bool(os.environ.get("TRIM_MEM_BUDGET")) and bool(os.environ.get("TRIM_MEM_LEDGER"))
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def peak_rss_kb(pid):
+    """进程当前的峰值内存（/proc/<pid>/status 中的 VmHWM），读取失败返回 0"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+class Ledger:
+    """共享账本：reservations 为正在运行任务的预留，peaks 为各 mem_key 的历史峰值（KB）"""
+
+    def __init__(self, path, budget_kb, default_kb):
+        self.path = path
+        self.budget_kb = budget_kb
+        self.default_kb = default_kb
+
+    @classmethod
+    def from_env(cls):
+        budget = parse_size(os.environ["TRIM_MEM_BUDGET"]) // 1024
+        default = parse_size(os.environ.get("TRIM_MEM_DEFAULT") or "2G") // 1024
+        return cls(os.environ["TRIM_MEM_LEDGER"], budget, default)
+
+    @contextmanager
+    def locked(self):
+        """加锁读写账本，清理已退出进程留下的预留"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(f"{self.path}.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                data = {"reservations": {}, "peaks": {}}
+                if os.path.exists(self.path):
+                    with open(self.path) as f:
+                        try:
+                            data.update(json.load(f))
+                        except json.JSONDecodeError:
+                            pass
+                data["reservations"] = {k: v for k, v in data["reservations"].items()
+                                        if pid_alive(v["pid"])}
+                yield data
+                tmp = f"{self.path}.tmp"
+                with open(tmp, "w") as f:
+                    json.dump(data, f, indent=1, sort_keys=True)
+                os.replace(tmp, self.path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def estimate(self, data, key):
+        peaks = data["peaks"].get(key)
+        return int(max(peaks) * MARGIN) if peaks else self.default_kb
+
+    def try_reserve(self, key, pid):
+        """预计占用不超预算（或当前没有任何预留）时登记并返回预留编号，否则返回 None"""
+        with self.locked() as data:
+            need = self.estimate(data, key)
+            used = sum(r["kb"] for r in data["reservations"].values())
+            if data["reservations"] and used + need > self.budget_kb:
+                return None
+            rid = uuid.uuid4().hex[:12]
+            data["reservations"][rid] = {"pid": pid, "key": key, "kb": need, "since": time.time()}
+            return rid
+
+    def update(self, rid, observed_kb):
+        """运行中观测到的峰值超过预留时上调预留"""
+        with self.locked() as data:
+            r = data["reservations"].get(rid)
+            if r and observed_kb * MARGIN > r["kb"]:
+                r["kb"] = int(observed_kb * MARGIN)
+
+    def release(self, rid, key, peak_kb=None):
+        with self.locked() as data:
+            data["reservations"].pop(rid, None)
+            if peak_kb:
+                data["peaks"][key] = (data["peaks"].get(key, []) + [int(peak_kb)])[-HISTORY:]
+
+    def learn(self, key, peak_kb):
+        with self.locked() as data:
+            data["peaks"][key] = (data["peaks"].get(key, []) + [int(peak_kb)])[-HISTORY:]
+
+
+class Admission:
+    """一次准入：acquire 阻塞到预算允许为止；watch 在任务运行期间上调预留"""
+
+    def __init__(self, key):
+        self.key = key
+        self.ledger = Ledger.from_env()
+        self.rid = None
+        self._stop = threading.Event()
+        self._watcher = None
+
+    def acquire(self):
+        waited = 0.0
+        while True:
+            # 预留先记在当前进程名下，子进程启动后由 watch 跟踪其内存
+            self.rid = self.ledger.try_reserve(self.key, os.getpid())
+            if self.rid:
+                if waited:
+                    print(f"  [MEM] {self.key} 等待内存 {waited:.0f}s 后启动", file=sys.stderr, flush=True)
+                return
+            time.sleep(POLL)
+            waited += POLL
+
+    def watch(self, pid):
+        def loop():
+            while not self._stop.wait(POLL):
+                observed = peak_rss_kb(pid)
+                if observed:
+                    self.ledger.update(self.rid, observed)
+        self._watcher = threading.Thread(target=loop, daemon=True)
+        self._watcher.start()
+
+    def release(self, peak_kb=None):
+        self._stop.set()
+        if self._watcher:
+            self._watcher.join()
+        if self.rid:
+            self.ledger.release(self.rid, self.key, peak_kb)
+            self.rid = None
+
+
+def learn(args):
+    """从 job_trace 的 JSONL 记录学习各 mem_key（缺省为 stage）的峰值内存"""
+    ledger = Ledger(args.ledger, 0, 0)
+    n = 0
+    for path in args.traces:
+        with open(path) as f:
+            for line in f:
+                try:
+                    r = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if r.get("task") or r.get("inprocess") or not r.get("max_rss_kb"):
+                    continue
+                ledger.learn(r.get("mem_key") or r["stage"], r["max_rss_kb"])
+                n += 1
+    print(f"已学习 {n} 条记录 -> {ledger.path}")
+
+
+def show(args):
+    with open(args.ledger) as f:
+        data = json.load(f)
+    print(f"{'mem_key':<32}{'runs':>6}{'peak':>10}{'estimate':>10}")
+    for key, peaks in sorted(data.get("peaks", {}).items()):
+        print(f"{key:<32}{len(peaks):>6}{max(peaks) / 1048576:>9.2f}G{max(peaks) * MARGIN / 1048576:>9.2f}G")
+    reservations = [r for r in data.get("reservations", {}).values() if pid_alive(r["pid"])]
+    used = sum(r["kb"] for r in reservations)
+    print(f"运行中: {len(reservations)} 个任务，预留 {used / 1048576:.2f}G")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按内存预算准入外部程序")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_learn = sub.add_parser("learn", help="从 job_trace 记录学习各程序的峰值内存")
+    p_learn.add_argument("--ledger", default=os.environ.get("TRIM_MEM_LEDGER"), help="账本文件")
+    p_learn.add_argument("traces", nargs="+", help="job_trace 的 JSONL 记录")
+
+    p_show = sub.add_parser("show", help="显示各程序的峰值估计与当前预留")
+    p_show.add_argument("--ledger", default=os.environ.get("TRIM_MEM_LEDGER"), help="账本文件")
+
+    args = parser.parse_args()
+    if not args.ledger:
+        parser.error("缺少 --ledger（或环境变量 TRIM_MEM_LEDGER）")
+    if args.command == "learn":
+        learn(args)
+    elif args.command == "show":
+        show(args)
+
+
+if __name__ == "__main__":
+    main()
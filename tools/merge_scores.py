@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+合并 Rosetta 打分文件片段
+
+步骤 [8] 中每个结构的 InterfaceAnalyzer 结果写入单独的打分文件（docking/best/scores/<name>.sc），
+本工具按文件名排序后合并为一个 score.sc：SEQUENCE 行与 SCORE 表头只保留一次，
+各片段的列按第一个片段的表头对齐，同一输入总是得到逐字节相同的输出。
+"""
+import argparse
+import glob
+import os
+import sys
+
+
+def read_fragment(path):
+    """返回 (SEQUENCE 行, 表头列名, 数据行列表)"""
+    sequence, header, rows = None, None, []
+    with open(path) as f:
+        for line in f:
+            if line.startswith("SEQUENCE:"):
+                sequence = sequence or line.rstrip("\n")
+                continue
+            if not line.startswith("SCORE:"):
+                continue
+            tokens = line.split()
+            if tokens[-1] == "description":
+                header = tokens
+                continue
+            rows.append(tokens)
+    return sequence, header, rows
+
+
+def format_rows(rows):
+    """按列宽右对齐，与 Rosetta 打分文件的排版一致"""
+    widths = [max(len(r[i]) for r in rows) for i in range(len(rows[0]))]
+    lines = []
+    for r in rows:
+        cells = [r[0]] + [r[i].rjust(widths[i]) for i in range(1, len(r) - 1)] + [r[-1]]
+        lines.append(" ".join(cells))
+    return lines
+
+
+def merge(paths):
+    sequence, header, rows = None, None, []
+    for path in sorted(paths, key=os.path.basename):
+        seq, cols, data = read_fragment(path)
+        if not data:
+            print(f"  [WARNING] {path} 中没有打分记录", file=sys.stderr)
+            continue
+        if cols is None:
+            print(f"  [WARNING] {path} 缺少表头，跳过", file=sys.stderr)
+            continue
+        sequence = sequence or seq
+        if header is None:
+            header = cols
+        for tokens in data:
+            if cols != header:
+                # 列顺序不同时按列名对齐，缺失的列记为 NA
+                values = dict(zip(cols, tokens))
+                tokens = [values.get(c, "NA") for c in header]
+            rows.append(tokens)
+    if header is None:
+        return []
+    lines = [sequence if sequence is not None else "SEQUENCE:"]
+    lines.extend(format_rows([header] + rows))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按文件名顺序合并 Rosetta 打分文件片段")
+    parser.add_argument("-o", "--output", required=True, help="合并后的 score.sc")
+    parser.add_argument("inputs", nargs="+", help="打分文件片段（可使用通配符）")
+    args = parser.parse_args()
+
+    paths = []
+    for item in args.inputs:
+        paths.extend(glob.glob(item) if glob.has_magic(item) else [item])
+    lines = merge([p for p in paths if os.path.isfile(p)])
+    if not lines:
+        print("没有可合并的打分记录", file=sys.stderr)
+        sys.exit(1)
+
+    tmp = f"{args.output}.tmp"
+    with open(tmp, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp, args.output)
+    print(f"已合并 {len(lines) - 2} 条打分记录 -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
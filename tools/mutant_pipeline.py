@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+突变体评估的逐突变体流水线
+
+mutation_evaluate.sh 的步骤 [4]–[7]（FixBB+精修 → 链拼接 → 局部对接 → 提取最优构象）
+按突变体拆成独立任务链：每个突变体完成上一步后立即进入下一步，不再等待全部突变体完成同一步。
+步骤 [8]（界面评估）不在流水线内：InterfaceAnalyzer 与 PLIP 进程的启动开销远大于单个结构的计算量，
+流水线结束后由 mutation_evaluate.sh 对全部待评估结构（含野生型）一次分组批量运行。
+所有任务由 dag_runner.Scheduler 在同一个核数预算内调度，就绪任务中后面的步骤优先启动，
+让已进入后段的突变体尽快完成；对接任务按突变体数分配弹性核数，突变体少时每个对接占用更多核。
+--backend slurm 时各任务以 SLURM 作业数组提交到多个节点（见 exec_backend.py），核数预算为 --slurm-cores。
+"""
+import argparse
+import os
+import signal
+import sys
+
+import exec_backend
+from dag_runner import Scheduler, Task, TaskGraph
+
+STAGES = [
+    (4, "relax"),
+    (5, "merge"),
+    (6, "dock"),
+    (7, "extract"),
+]
+
+
+def read_mutants(joblist):
+    with open(joblist) as f:
+        return [line.split("\t")[0].strip() for line in f if line.strip()]
+
+
+def build_graph(mutants, command, threads):
+    """每个突变体一条 4→7 的任务链"""
+    graph = TaskGraph()
+    dock_cores = max(1, threads // max(1, len(mutants)))
+    # 按步骤倒序加入任务：Scheduler 按加入顺序启动就绪任务，靠后的步骤先拿到核
+    for step, stage in reversed(STAGES):
+        for mut in mutants:
+            prev = [f"{s}:{mut}" for st, s in STAGES if st == step - 1]
+            graph.add(Task(
+                f"{stage}:{mut}",
+                command + ["{cores}", str(step), mut],
+                max_cores=dock_cores if stage == "dock" else 1,
+                deps=prev,
+                stage=stage,
+                mutant=mut,
+            ))
+    return graph
+
+
+def main():
+    parser = argparse.ArgumentParser(description="逐突变体流水线执行 mutation_evaluate.sh 步骤 [4]-[7]")
+    parser.add_argument("--joblist", required=True, help="步骤 [3] 生成的 joblist.tsv")
+    parser.add_argument("--threads", type=int, default=1, help="共享核数预算")
+    parser.add_argument("--backend", choices=exec_backend.BACKENDS, default=os.environ.get("TRIM_BACKEND") or "local",
+                        help="执行后端：local（本机）/ slurm（作业数组，缺省取 TRIM_BACKEND）")
+    parser.add_argument("--slurm-cores", type=int, default=int(os.environ.get("TRIM_SLURM_CORES") or 0),
+                        help="slurm 后端同时占用的核数上限（缺省取 TRIM_SLURM_CORES，0 表示与 --threads 相同）")
+    parser.add_argument("--sbatch-args", default=os.environ.get("TRIM_SLURM_ARGS", ""),
+                        help="附加的 sbatch 参数，如 \"--partition=cpu --mem=8G\"（缺省取 TRIM_SLURM_ARGS）")
+    parser.add_argument("--spool", help="slurm 作业脚本与退出码目录（默认 joblist 所在目录下的 .slurm）")
+    parser.add_argument("command", nargs=argparse.REMAINDER,
+                        help="-- 之后为 mutation_evaluate.sh 及其前 8 个参数，核数/步骤/突变体由本工具追加")
+    args = parser.parse_args()
+
+    command = args.command[1:] if args.command[:1] == ["--"] else args.command
+    if not command:
+        parser.error("缺少 mutation_evaluate.sh 命令")
+
+    mutants = read_mutants(args.joblist)
+    threads = args.threads
+    if args.backend == "slurm" and args.slurm_cores:
+        threads = args.slurm_cores
+    spool = args.spool or os.path.join(os.path.dirname(os.path.abspath(args.joblist)), ".slurm")
+    backend = exec_backend.create(args.backend, spool, args.sbatch_args)
+    graph = build_graph(mutants, command, threads)
+    # SIGTERM（作业超时、上层流程被终止）与 Ctrl-C 一样中止调度，由 Scheduler 取消运行中的任务
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+    try:
+        ok = Scheduler(threads, backend=backend).run(graph)
+    finally:
+        backend.close()
+
+    failed = sorted(t.name for t in graph.tasks.values() if t.status != "done")
+    print(f"  [PIPELINE] {len(mutants)} 个突变体，{len(graph.tasks) - len(failed)}/{len(graph.tasks)} 个任务完成")
+    for name in failed:
+        print(f"  [PIPELINE] {name}: {graph.tasks[name].status}")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+轻量 PDB 读写：按链提取与拼接
+
+以 NumPy 数组保存 ATOM/HETATM 记录（坐标为 float 数组，其余字段按 PDB 固定列保存），
+替代每次都要启动 PyMOL 解释器的 pymol_chains.py，命令行保持一致：
+    extract -i complex.pdb -c A,B -o out.pdb
+    merge   -i lig.pdb rec.pdb -o merged.pdb
+另提供 batch 模式，按清单在一个进程内完成全部突变体的拼接（共用的受体结构只读取一次）。
+
+输出为标准 PDB 固定列格式：每条链的原子连续排列，链之间写 TER，末尾写 END，
+原子序号从 1 重新编号，可直接作为 Rosetta docking_protocol 的输入。
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+# (字段, 起始列, 结束列)，列号从 0 开始，与 PDB 格式说明一致
+FIELDS = [
+    ("record", 0, 6),
+    ("name", 12, 16),
+    ("altloc", 16, 17),
+    ("resname", 17, 20),
+    ("chain", 21, 22),
+    ("icode", 26, 27),
+    ("tail", 66, 80),  # segid / element / charge，原样保留
+]
+
+
+def normalize_chains(chains):
+    """A / AB / A,B / A+B -> ['A', 'B']"""
+    chains = chains.strip()
+    if "+" not in chains and "," not in chains:
+        return list(chains)
+    return [c.strip() for c in chains.replace(",", "+").split("+") if c.strip()]
+
+
+def _float(text, default):
+    text = text.strip()
+    return float(text) if text else default
+
+
+class Structure:
+    """一组原子记录，各字段为等长的 NumPy 数组"""
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    def __len__(self):
+        return len(self.fields["xyz"])
+
+    def __getitem__(self, key):
+        return self.fields[key]
+
+    @classmethod
+    def read(cls, path):
+        """读取第一个 MODEL 的 ATOM/HETATM 记录，忽略其余行（如 Rosetta 附加的能量表）
+
+        path 为 "<坐标库>::<结构名>" 时从 coord_store 坐标库读取
+        """
+        if "::" in path:
+            from coord_store import CoordStore
+            store, name = path.split("::", 1)
+            return CoordStore(store).structure(name)
+        raw = {name: [] for name, _, _ in FIELDS}
+        serial, resseq, xyz, occupancy, bfactor = [], [], [], [], []
+        with open(path) as f:
+            for line in f:
+                if line.startswith("ENDMDL"):
+                    break
+                if not line.startswith(("ATOM  ", "HETATM")):
+                    continue
+                line = line.rstrip("\n").ljust(80)
+                for name, start, end in FIELDS:
+                    raw[name].append(line[start:end])
+                serial.append(int(line[6:11]))
+                resseq.append(int(line[22:26]))
+                xyz.append((float(line[30:38]), float(line[38:46]), float(line[46:54])))
+                occupancy.append(_float(line[54:60], 1.0))
+                bfactor.append(_float(line[60:66], 0.0))
+
+        fields = {name: np.array(values, dtype=f"U{end - start}") for (name, start, end), values
+                  in zip(FIELDS, raw.values())}
+        fields["serial"] = np.array(serial, dtype=np.int64)
+        fields["resseq"] = np.array(resseq, dtype=np.int64)
+        fields["xyz"] = np.array(xyz, dtype=np.float64).reshape(-1, 3)
+        fields["occupancy"] = np.array(occupancy, dtype=np.float64)
+        fields["bfactor"] = np.array(bfactor, dtype=np.float64)
+        return cls(fields)
+
+    def take(self, index):
+        return Structure({k: v[index] for k, v in self.fields.items()})
+
+    def select_chains(self, chains):
+        return self.take(np.isin(self["chain"], chains))
+
+    @classmethod
+    def concat(cls, structures):
+        structures = [s for s in structures if len(s)]
+        if not structures:
+            return cls.read(os.devnull)
+        return cls({k: np.concatenate([s[k] for s in structures]) for k in structures[0].fields})
+
+    def grouped_by_chain(self):
+        """按链首次出现的顺序把同一条链的原子排在一起（链内保持原顺序）"""
+        chain = self["chain"]
+        _, first = np.unique(chain, return_index=True)
+        rank = {c: r for r, c in enumerate(chain[np.sort(first)])}
+        order = np.argsort([rank[c] for c in chain], kind="stable")
+        return self.take(order)
+
+    def lines(self):
+        """按 PDB 固定列输出，原子序号重新编号，链之间插入 TER"""
+        f = self.fields
+        out, serial = [], 0
+        for i in range(len(self)):
+            serial += 1
+            x, y, z = f["xyz"][i]
+            out.append(
+                f"{f['record'][i]:<6}{serial:>5} {f['name'][i]:<4}{f['altloc'][i]:1}"
+                f"{f['resname'][i]:>3} {f['chain'][i]:1}{f['resseq'][i]:>4}{f['icode'][i]:1}   "
+                f"{x:8.3f}{y:8.3f}{z:8.3f}{f['occupancy'][i]:6.2f}{f['bfactor'][i]:6.2f}"
+                f"{f['tail'][i]}".rstrip()
+            )
+            if i + 1 == len(self) or f["chain"][i + 1] != f["chain"][i]:
+                serial += 1
+                out.append(
+                    f"TER   {serial:>5}      {f['resname'][i]:>3} {f['chain'][i]:1}"
+                    f"{f['resseq'][i]:>4}{f['icode'][i]:1}".rstrip()
+                )
+        out.append("END")
+        return out
+
+    def write(self, path):
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            f.write("\n".join(self.lines()) + "\n")
+        os.replace(tmp, path)
+
+
+def extract_chains(input_pdb, chains, output_pdb):
+    chains = normalize_chains(chains)
+    selected = Structure.read(input_pdb).select_chains(chains)
+    if not len(selected):
+        print(f"[ERROR] {input_pdb} 中没有链 {'+'.join(chains)} 的原子", file=sys.stderr)
+        sys.exit(1)
+    selected.grouped_by_chain().write(output_pdb)
+    print(f"[OK] Extract chains {'+'.join(chains)} -> {output_pdb}")
+
+
+def merge_structures(structures):
+    return Structure.concat([s.grouped_by_chain() for s in structures])
+
+
+def merge_pdbs(pdb_list, output_pdb):
+    merge_structures([Structure.read(p) for p in pdb_list]).write(output_pdb)
+    print(f"[OK] Merged {len(pdb_list)} PDBs -> {output_pdb}")
+
+
+def merge_batch(manifest):
+    """清单每行：输出文件<TAB>输入1<TAB>输入2...；同一输入文件只读取一次"""
+    cache, failed, merged = {}, 0, 0
+    with (sys.stdin if manifest == "-" else open(manifest)) as f:
+        jobs = [line.rstrip("\n").split("\t") for line in f if line.strip()]
+    for output, *inputs in jobs:
+        try:
+            for p in inputs:
+                if p not in cache:
+                    cache[p] = Structure.read(p)
+            merge_structures([cache[p] for p in inputs]).write(output)
+            merged += 1
+        except (OSError, ValueError) as e:
+            print(f"  [FAILED] {output}: {e}", file=sys.stderr)
+            failed += 1
+    print(f"[OK] Merged {merged}/{len(jobs)} structures")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PDB utility: extract chains or merge PDBs")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    # ---------- extract ----------
+    p_extract = subparsers.add_parser("extract", help="Extract specified chains from a complex")
+    p_extract.add_argument("-i", "--input", required=True, help="Input complex PDB")
+    p_extract.add_argument("-c", "--chains", required=True, help="Chains to extract, e.g. A or A,B or A+B")
+    p_extract.add_argument("-o", "--output", required=True, help="Output PDB")
+
+    # ---------- merge ----------
+    p_merge = subparsers.add_parser("merge", help="Merge multiple PDBs into one")
+    p_merge.add_argument("-i", "--inputs", nargs="+", required=True, help="Input PDB files (space separated)")
+    p_merge.add_argument("-o", "--output", required=True, help="Output merged PDB")
+
+    # ---------- batch ----------
+    p_batch = subparsers.add_parser("batch", help="Merge many PDB groups in one process")
+    p_batch.add_argument("-m", "--manifest", required=True,
+                         help="TSV: output<TAB>input1<TAB>input2...（- 表示标准输入）")
+
+    args = parser.parse_args()
+
+    if args.command == "extract":
+        extract_chains(args.input, args.chains, args.output)
+    elif args.command == "merge":
+        merge_pdbs(args.inputs, args.output)
+    elif args.command == "batch":
+        if merge_batch(args.manifest):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
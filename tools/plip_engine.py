@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+进程内 PLIP 互作分析
+
+常驻进程池直接调用 PLIP 的 Python API 分析每个结构，在内存中按 plip_extract.parse_plip_xml
+相同的规则生成 rec/lig/distance/angle 行，由主进程统一写出 PLIP_<name>_<类型>.csv，
+省去逐个结构启动 plip 命令、XML 序列化/解析以及逐个文件启动 plip_extract.py 的开销。
+每个结构另写一个 <name>.json（各类型互作数），作为完成标记的校验对象。
+指定 --crop-margin 时先把结构裁剪为界面壳层（interface_crop.py）再交给 PLIP。
+"""
+import argparse
+import ast
+import json
+import os
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import job_trace
+import scratch
+from interface_crop import crop_pdb
+from plip_extract import add_interaction, new_interactions, write_interactions
+
+# PLIP 报告中各互作类型（与 XML 中的元素名一致）对应的 BindingSiteReport 属性
+REPORT_FIELDS = {
+    "hydrophobic_interactions": ("hydrophobic_features", "hydrophobic_info"),
+    "hydrogen_bonds": ("hbond_features", "hbond_info"),
+    "salt_bridges": ("saltbridge_features", "saltbridge_info"),
+    "pi_stacks": ("pistacking_features", "pistacking_info"),
+    "pi_cation_interactions": ("pication_features", "pication_info"),
+    "halogen_bonds": ("halogen_features", "halogen_info"),
+    "metal_complexes": ("metal_features", "metal_info"),
+}
+
+
+def init_worker(chains):
+    """导入 PLIP 并设置链分组（等同于命令行的 --chains）
+
+    主进程在创建进程池前先调用一次，fork 出的工作进程直接继承已导入的模块，
+    一次调用只付一次 PLIP/OpenBabel 的导入开销；工作进程中再次调用只重设配置。
+    """
+    from plip.basic import config
+    from plip.exchange.report import BindingSiteReport  # noqa: F401
+    from plip.structure.preparation import PDBComplex  # noqa: F401
+    config.CHAINS = ast.literal_eval(chains) if chains else None
+    config.QUIET = True
+    config.SILENT = True
+
+
+def record_getter(features, values):
+    """按 XML 的取值方式读取字段：标签名为特征名小写，坐标等元组字段没有文本"""
+    record = {f.lower(): v for f, v in zip(features, values)}
+
+    def findtext(key):
+        if key not in record:
+            return None
+        value = record[key]
+        return "" if isinstance(value, tuple) else str(value)
+    return findtext
+
+
+def analyze(pdb, crop=None):
+    """在工作进程中分析一个结构，返回 (结构名, {类型: 行列表}, 错误信息)
+
+    crop 为 (受体链, 配体链, margin) 时分析裁剪后的界面壳层结构
+    """
+    from plip.exchange.report import BindingSiteReport
+    from plip.structure.preparation import PDBComplex
+
+    name = os.path.splitext(os.path.basename(pdb))[0]
+    tmp = tempfile.mkdtemp(prefix=f".plip_{name}.", dir=scratch.root() if scratch.enabled() else None)
+    try:
+        with job_trace.measure("plip", name):
+            mol = PDBComplex()
+            mol.output_path = tmp
+            if crop:
+                cropped = os.path.join(tmp, os.path.basename(pdb))
+                crop_pdb(pdb, cropped, *crop)
+                pdb = cropped
+            mol.load_pdb(pdb)
+            for ligand in mol.ligands:
+                mol.characterize_complex(ligand)
+
+            interactions = new_interactions()
+            # 与 XML 报告相同：按结合位点名称排序后依次输出
+            for site in sorted(mol.interaction_sets):
+                report = BindingSiteReport(mol.interaction_sets[site])
+                for itype, (features_attr, info_attr) in REPORT_FIELDS.items():
+                    features = getattr(report, features_attr)
+                    for values in getattr(report, info_attr):
+                        add_interaction(interactions[itype], itype, record_getter(features, values))
+        return name, {k: v["rows"] for k, v in interactions.items()}, None
+    except Exception as e:
+        return name, None, f"{type(e).__name__}: {e}"
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="进程池内调用 PLIP，直接输出互作残基 CSV")
+    parser.add_argument("-i", "--inputs", nargs="+", required=True, help="待分析的结构")
+    parser.add_argument("-c", "--chains", required=True, help="链分组，如 \"[['B'], ['A']]\"")
+    parser.add_argument("-o", "--outdir", required=True, help="CSV 输出目录（如 docking/best/analysis）")
+    parser.add_argument("-s", "--summary-dir", required=True, help="每个结构的互作计数 JSON 输出目录")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count(), help="进程数")
+    parser.add_argument("--crop-margin", type=float, default=0,
+                        help="先裁剪为距另一侧不超过该距离（Å）的界面残基再分析，0 为分析完整结构")
+    args = parser.parse_args()
+
+    crop = None
+    if args.crop_margin > 0:
+        rec, lig = ast.literal_eval(args.chains)[:2]
+        crop = (rec, lig, args.crop_margin)
+
+    os.makedirs(args.summary_dir, exist_ok=True)
+    init_worker(args.chains)
+    failed = 0
+    workers = max(1, min(args.workers, len(args.inputs)))
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(args.chains,)) as pool:
+        futures = [pool.submit(analyze, pdb, crop) for pdb in args.inputs]
+        for future in as_completed(futures):
+            name, rows, error = future.result()
+            if error:
+                print(f"  [FAILED] {name}: {error}", file=sys.stderr)
+                failed += 1
+                continue
+            interactions = new_interactions()
+            for itype, data in interactions.items():
+                data["rows"] = rows[itype]
+                # 清理上次运行留下的同名 CSV（本次可能没有该类型的互作）
+                stale = os.path.join(args.outdir, f"PLIP_{name}_{itype}.csv")
+                if os.path.exists(stale):
+                    os.remove(stale)
+            write_interactions(name, args.outdir, interactions)
+
+            summary = os.path.join(args.summary_dir, f"{name}.json")
+            with open(f"{summary}.tmp", "w") as f:
+                json.dump({itype: len(r) for itype, r in rows.items()}, f, sort_keys=True)
+            os.replace(f"{summary}.tmp", summary)
+            print(f"[✓] {name} Done！", flush=True)
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -36,18 +36,17 @@ def convert_three_to_one(aa_three, aa_dict):
     else:
         raise TypeError("输入数据必须是字符串或列表")
 
-def parse_plip_xml(xml_file, outdir):
-    tree = ET.parse(xml_file)
-    root = tree.getroot()
-    res_dict = {
-        "ALA": "A", "CYS": "C", "ASP": "D", "GLU": "E", "PHE": "F",
-        "GLY": "G", "HIS": "H", "ILE": "I", "LYS": "K", "LEU": "L",
-        "MET": "M", "ASN": "N", "PRO": "P", "GLN": "Q", "ARG": "R",
-        "SER": "S", "THR": "T", "VAL": "V", "TRP": "W", "TYR": "Y"
-    }
+RES_DICT = {
+    "ALA": "A", "CYS": "C", "ASP": "D", "GLU": "E", "PHE": "F",
+    "GLY": "G", "HIS": "H", "ILE": "I", "LYS": "K", "LEU": "L",
+    "MET": "M", "ASN": "N", "PRO": "P", "GLN": "Q", "ARG": "R",
+    "SER": "S", "THR": "T", "VAL": "V", "TRP": "W", "TYR": "Y"
+}
 
-    # 存储不同相互作用类型的残基对与相关参数
-    interactions = {
+
+def new_interactions():
+    """存储不同相互作用类型的残基对与相关参数"""
+    return {
         "hydrophobic_interactions": {
             "rows": [],
             "header": ["rec", "lig", "distance"]
@@ -78,46 +77,47 @@ def parse_plip_xml(xml_file, outdir):
         }
     }
 
-    # 遍历不同的 interaction 类型
-    for itype, data in interactions.items():
-        for inter in root.findall(f".//{itype}/*"):
-            # 受体残基
-            rec_resnr = inter.findtext("resnr")
-            rec_restype = convert_three_to_one(inter.findtext("restype"), res_dict)
-            rec_reschain = inter.findtext("reschain")
-            rec = f"{rec_restype}{rec_reschain}{rec_resnr}" if rec_resnr and rec_restype and rec_reschain else "NA"
-
-            # 配体残基
-            lig_resnr = inter.findtext("resnr_lig")
-            lig_restype = convert_three_to_one(inter.findtext("restype_lig"), res_dict)
-            lig_reschain = inter.findtext("reschain_lig")
-            lig = f"{lig_restype}{lig_reschain}{lig_resnr}" if lig_resnr and lig_restype and lig_reschain else "NA"
-
-            # 公共参数
-            hbond_dict = inter.findtext("dist_h-a")
-            hbond_angle = inter.findtext("don_angle")
-            distance = inter.findtext("distance") or inter.findtext("dist") or ""
-            angle = inter.findtext("angle") or ""
-            offset = inter.findtext("offset") or ""
-
-            # 按类型保存
-            if itype == "hydrogen_bonds":
-                data["rows"].append([rec, lig, hbond_dict, hbond_angle])
-            elif itype == "salt_bridges":
-                data["rows"].append([rec, lig, distance])
-            elif itype == "hydrophobic_interactions":
-                data["rows"].append([rec, lig, distance])
-            elif itype == "pi_stacks":
-                data["rows"].append([rec, lig, distance, angle, offset])
-            elif itype == "pi_cation_interactions":
-                data["rows"].append([rec, lig, distance])
-            elif itype == "halogen_bonds":
-                data["rows"].append([rec, lig, distance, angle])
-            elif itype == "metal_complexes":
-                data["rows"].append([rec, lig, distance])
-
-    # 写入文件
-    prefix = os.path.splitext(os.path.basename(xml_file))[0]
+
+def add_interaction(data, itype, findtext):
+    """按类型保存一条相互作用；findtext(字段名) 返回 PLIP 报告中该字段的文本（XML 标签名）"""
+    # 受体残基
+    rec_resnr = findtext("resnr")
+    rec_restype = convert_three_to_one(findtext("restype"), RES_DICT)
+    rec_reschain = findtext("reschain")
+    rec = f"{rec_restype}{rec_reschain}{rec_resnr}" if rec_resnr and rec_restype and rec_reschain else "NA"
+
+    # 配体残基
+    lig_resnr = findtext("resnr_lig")
+    lig_restype = convert_three_to_one(findtext("restype_lig"), RES_DICT)
+    lig_reschain = findtext("reschain_lig")
+    lig = f"{lig_restype}{lig_reschain}{lig_resnr}" if lig_resnr and lig_restype and lig_reschain else "NA"
+
+    # 公共参数
+    hbond_dict = findtext("dist_h-a")
+    hbond_angle = findtext("don_angle")
+    distance = findtext("distance") or findtext("dist") or ""
+    angle = findtext("angle") or ""
+    offset = findtext("offset") or ""
+
+    # 按类型保存
+    if itype == "hydrogen_bonds":
+        data["rows"].append([rec, lig, hbond_dict, hbond_angle])
+    elif itype == "salt_bridges":
+        data["rows"].append([rec, lig, distance])
+    elif itype == "hydrophobic_interactions":
+        data["rows"].append([rec, lig, distance])
+    elif itype == "pi_stacks":
+        data["rows"].append([rec, lig, distance, angle, offset])
+    elif itype == "pi_cation_interactions":
+        data["rows"].append([rec, lig, distance])
+    elif itype == "halogen_bonds":
+        data["rows"].append([rec, lig, distance, angle])
+    elif itype == "metal_complexes":
+        data["rows"].append([rec, lig, distance])
+
+
+def write_interactions(prefix, outdir, interactions):
+    """写入文件：每种相互作用类型一个 PLIP_<prefix>_<类型>.csv"""
     os.makedirs(outdir, exist_ok=True)
     for itype, data in interactions.items():
         if data["rows"]: 
@@ -125,6 +125,20 @@ def parse_plip_xml(xml_file, outdir):
             write_csv(fname, data["rows"], data["header"])
             print(f"[+] 写入 {fname}，共 {len(data['rows'])} 条")
 
+
+def parse_plip_xml(xml_file, outdir):
+    tree = ET.parse(xml_file)
+    root = tree.getroot()
+    interactions = new_interactions()
+
+    # 遍历不同的 interaction 类型
+    for itype, data in interactions.items():
+        for inter in root.findall(f".//{itype}/*"):
+            add_interaction(data, itype, inter.findtext)
+
+    prefix = os.path.splitext(os.path.basename(xml_file))[0]
+    write_interactions(prefix, outdir, interactions)
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="解析 PLIP XML 并提取残基对及互作信息")
     parser.add_argument("-i", "--input", required=True, help="PLIP 生成的 XML 文件")
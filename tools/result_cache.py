@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+FoldX / Rosetta 结果缓存（内容寻址）
+
+缓存键由输入结构（文件名+内容）、突变信息、软件版本指纹和协议参数共同哈希得到，
+同一复合物换阈值、换权重或换受体链重跑时可直接复用已算过的突变体结果。
+缓存按总大小做 LRU 淘汰：命中会刷新条目时间，超出上限时先删最久未使用的条目。
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+UNITS = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+
+
+def parse_size(text):
+    """解析 500M / 100G 形式的容量"""
+    text = str(text).strip().upper().rstrip("B")
+    if text and text[-1] in UNITS:
+        return int(float(text[:-1]) * UNITS[text[-1]])
+    return int(text)
+
+
+def default_cache_dir():
+    return os.environ.get("TRIM_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "trim")
+
+
+def hash_file(h, path, chunk=1 << 20):
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+
+
+def tool_version(path, memo_dir=None):
+    """软件版本指纹：可执行文件（解析软链接后）内容的 sha256
+
+    Rosetta 的可执行文件可达数百 MB，memo_dir 下的 versions.json 按（路径, 大小, 修改时间）
+    记住已算过的指纹，文件未变时不再重新读取
+    """
+    real = os.path.realpath(path)
+    st = os.stat(real)
+    stamp = [st.st_size, st.st_mtime_ns]
+    memo = os.path.join(memo_dir, "versions.json") if memo_dir else None
+    versions = {}
+    if memo:
+        try:
+            with open(memo) as f:
+                versions = json.load(f)
+        except (OSError, ValueError):
+            versions = {}
+        if versions.get(real, [])[:2] == stamp:
+            return versions[real][2]
+    h = hashlib.sha256()
+    hash_file(h, real)
+    version = h.hexdigest()[:16]
+    if memo:
+        versions[real] = stamp + [version]
+        os.makedirs(memo_dir, exist_ok=True)
+        tmp = f"{memo}.tmp.{os.getpid()}"
+        with open(tmp, "w") as f:
+            json.dump(versions, f)
+        os.replace(tmp, memo)
+    return version
+
+
+def make_key(inputs, tags):
+    h = hashlib.sha256()
+    for path in inputs:
+        h.update(b"file\0" + os.path.basename(path).encode() + b"\0")
+        hash_file(h, path)
+    for tag in tags:
+        h.update(b"tag\0" + tag.encode() + b"\0")
+    return h.hexdigest()
+
+
+class ResultCache:
+    def __init__(self, root):
+        self.root = root
+        self.objects = os.path.join(root, "objects")
+
+    def entry(self, key):
+        return os.path.join(self.objects, key[:2], key)
+
+    def get(self, key, dest):
+        """命中时把缓存文件复制到 dest 并刷新 LRU 时间
+
+        复制途中条目可能被另一进程的 evict 删除：此时删掉已恢复的文件，按未命中处理
+        """
+        entry = self.entry(key)
+        meta_path = os.path.join(entry, "meta.json")
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        os.makedirs(dest, exist_ok=True)
+        restored = []
+        try:
+            for name in meta["files"]:
+                target = os.path.join(dest, name)
+                tmp = f"{target}.tmp.{os.getpid()}"
+                try:
+                    shutil.copyfile(os.path.join(entry, "files", name), tmp)
+                    os.replace(tmp, target)
+                finally:
+                    if os.path.exists(tmp):
+                        os.remove(tmp)
+                restored.append(target)
+            now = time.time()
+            os.utime(entry, (now, now))
+        except OSError:
+            for path in restored:
+                if os.path.exists(path):
+                    os.remove(path)
+            return None
+        return restored
+
+    def put(self, key, paths):
+        """写入条目：先在临时目录组装，再整体改名，避免读到半个条目"""
+        entry = self.entry(key)
+        if os.path.isdir(entry):
+            return False
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        tmp = tempfile.mkdtemp(prefix=".tmp.", dir=os.path.dirname(entry))
+        try:
+            os.makedirs(os.path.join(tmp, "files"))
+            names, size = [], 0
+            for path in paths:
+                name = os.path.basename(path)
+                shutil.copyfile(path, os.path.join(tmp, "files", name))
+                names.append(name)
+                size += os.path.getsize(path)
+            with open(os.path.join(tmp, "meta.json"), "w") as f:
+                json.dump({"files": names, "size": size, "created": time.time()}, f)
+            os.rename(tmp, entry)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            if os.path.isdir(entry):
+                return False
+            raise
+        return True
+
+    def entries(self):
+        """返回 [(最近使用时间, 大小, 条目路径)]"""
+        result = []
+        if not os.path.isdir(self.objects):
+            return result
+        for prefix in os.listdir(self.objects):
+            pdir = os.path.join(self.objects, prefix)
+            for key in os.listdir(pdir):
+                if key.startswith(".tmp."):
+                    continue
+                entry = os.path.join(pdir, key)
+                try:
+                    with open(os.path.join(entry, "meta.json")) as f:
+                        size = json.load(f)["size"]
+                    result.append((os.path.getmtime(entry), size, entry))
+                except (OSError, ValueError, KeyError):
+                    continue
+        return result
+
+    def evict(self, max_size):
+        """按最近使用时间从旧到新删除条目，直到总大小不超过上限"""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, entry in entries:
+            if total <= max_size:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            removed += 1
+        return removed, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FoldX / Rosetta 结果缓存")
+    parser.add_argument("--cache-dir", default=default_cache_dir(), help="缓存目录（默认 $TRIM_CACHE_DIR）")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_version = sub.add_parser("version", help="输出软件版本指纹")
+    p_version.add_argument("tool", help="可执行文件路径")
+
+    p_key = sub.add_parser("key", help="计算缓存键")
+    p_key.add_argument("-i", "--input", action="append", default=[], help="输入结构/文件（可多次指定）")
+    p_key.add_argument("-t", "--tag", action="append", default=[], help="突变、版本、协议参数等（可多次指定）")
+
+    p_get = sub.add_parser("get", help="取出缓存结果，未命中返回 1")
+    p_get.add_argument("key")
+    p_get.add_argument("dest", help="恢复到的目录")
+
+    p_put = sub.add_parser("put", help="写入缓存结果")
+    p_put.add_argument("key")
+    p_put.add_argument("files", nargs="+")
+    p_put.add_argument("--max-size", default=os.environ.get("TRIM_CACHE_MAX_SIZE"),
+                       help="写入后按 LRU 淘汰到该容量以下（默认 $TRIM_CACHE_MAX_SIZE）")
+
+    p_evict = sub.add_parser("evict", help="按 LRU 淘汰缓存")
+    p_evict.add_argument("--max-size", required=True, help="容量上限，如 100G")
+
+    sub.add_parser("stats", help="缓存条目数与总大小")
+
+    args = parser.parse_args()
+    cache = ResultCache(args.cache_dir)
+
+    if args.command == "version":
+        print(tool_version(args.tool, args.cache_dir))
+    elif args.command == "key":
+        print(make_key(args.input, args.tag))
+    elif args.command == "get":
+        if cache.get(args.key, args.dest) is None:
+            sys.exit(1)
+    elif args.command == "put":
+        missing = [f for f in args.files if not os.path.isfile(f)]
+        if missing:
+            print(f"缓存写入失败，文件不存在: {', '.join(missing)}", file=sys.stderr)
+            sys.exit(1)
+        cache.put(args.key, args.files)
+        if args.max_size:
+            cache.evict(parse_size(args.max_size))
+    elif args.command == "evict":
+        removed, total = cache.evict(parse_size(args.max_size))
+        print(f"已淘汰 {removed} 个条目，剩余 {total / (1 << 30):.2f} GB")
+    elif args.command == "stats":
+        entries = cache.entries()
+        total = sum(size for _, size, _ in entries)
+        print(f"{len(entries)} 个条目，共 {total / (1 << 30):.2f} GB  ({cache.root})")
+
+
+if __name__ == "__main__":
+    main()
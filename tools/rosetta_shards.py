@@ -0,0 +1,465 @@
+#!/usr/bin/env python3
+"""
+Rosetta 构象分片采样
+
+把一个输入的 -nstruct N 拆成若干独立分片，每个分片使用不同的随机种子（-run:jran）并写入
+各自的临时目录，全部结束后合并打分文件 / 静默文件，并把构象编号改写为连续的
+<name>_0001 ... <name>_N，与单进程运行的输出布局一致，下游按合并结果挑选最优构象。
+多个输入共用一个进程池：输入数少于核数时按核数增加每个输入的分片数，保证核始终占满。
+
+自适应采样（--batch）：按批生成构象，每批结束后检查最优总分的改进量与前 k 个构象的分数离散度，
+两者都低于阈值即停止该输入的采样，-nstruct 作为上限；每个输入实际使用的构象数写入 --report。
+
+TRIM_STAGING=1 时分片目录位于节点本地暂存目录（scratch.py），合并时只写回打分文件与
+--keep 指定的最优构象（静默文件只保留这些构象的记录，全部 SCORE 行另存为同名 .sc）。
+"""
+import argparse
+import fcntl
+import hashlib
+import os
+import re
+import shlex
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import job_trace
+import scratch
+
+_tag_pat = re.compile(r"^(.*_)(\d+)$")
+# 静默文件/打分文件的表头行，合并时只保留第一个分片的
+HEADER_PREFIXES = ("SEQUENCE:", "REMARK BINARY")
+# 推测执行检查落后分片的间隔（秒），以及启动副本前分片至少已运行的时间
+SPECULATE_POLL = 5.0
+SPECULATE_MIN_AGE = 60.0
+# 分片失败重试时的种子增量（远大于分片数，不与其它分片的种子重合）
+RESEED_STEP = 10007
+
+
+def split_nstruct(nstruct, shards):
+    """把 nstruct 尽量均匀地分给 shards 个分片，返回各分片的构象数"""
+    shards = max(1, min(shards, nstruct))
+    size, extra = divmod(nstruct, shards)
+    return [size + (1 if i < extra else 0) for i in range(shards)]
+
+
+def shards_per_input(n_inputs, threads, nstruct):
+    """每个输入的分片数：输入越少分片越多，所有分片数之和不少于核数"""
+    if n_inputs == 0:
+        return 0
+    return max(1, min(nstruct, -(-threads // n_inputs)))
+
+
+def is_header(line):
+    if line.startswith(HEADER_PREFIXES):
+        return True
+    tokens = line.split()
+    return len(tokens) > 1 and tokens[0] == "SCORE:" and tokens[-1] == "description"
+
+
+def renumber(tag, offset):
+    m = _tag_pat.match(tag)
+    if not m:
+        return tag
+    digits = m.group(2)
+    return f"{m.group(1)}{int(digits) + offset:0{len(digits)}d}"
+
+
+def rename_line(line, tags):
+    """行尾为构象标签时替换为新标签（静默文件每行都以标签结尾）"""
+    body = line.rstrip("\n")
+    parts = body.rsplit(None, 1)
+    if len(parts) == 2 and parts[1] in tags:
+        body = body[:len(body) - len(parts[1])] + tags[parts[1]]
+    return body + "\n"
+
+
+def read_scores(path):
+    """从打分文件或静默文件的 SCORE 行读取 {构象标签: 总分}（total_score 或 score 列）"""
+    scores, col = {}, None
+    with open(path) as f:
+        for line in f:
+            if not line.startswith("SCORE:"):
+                continue
+            tokens = line.split()
+            if is_header(line):
+                for name in ("total_score", "score"):
+                    if name in tokens:
+                        col = tokens.index(name)
+                        break
+                continue
+            try:
+                scores[tokens[-1]] = float(tokens[col]) if col is not None else float("nan")
+            except (IndexError, ValueError):
+                scores[tokens[-1]] = float("nan")
+    return scores
+
+
+def read_tags(path):
+    return list(read_scores(path))
+
+
+def line_tag(line):
+    parts = line.split()
+    return parts[-1] if parts else None
+
+
+def merge_text(sources, dest, keep=None, scores_only=False):
+    """合并分片文本文件：表头取第一个分片，其余逐行改写标签后追加
+
+    keep 为保留的构象标签（新标签）集合，其余构象的行不写出；scores_only 时只写出 SCORE 行。
+    """
+    tmp = f"{dest}.tmp"
+    with open(tmp, "w") as out:
+        for i, (path, tags) in enumerate(sources):
+            with open(path) as f:
+                for line in f:
+                    header = is_header(line)
+                    if i > 0 and header:
+                        continue
+                    if scores_only and not line.startswith("SCORE:"):
+                        continue
+                    line = rename_line(line, tags)
+                    if keep is not None and not header and line_tag(line) not in keep:
+                        continue
+                    out.write(line)
+    os.replace(tmp, dest)
+
+
+class ShardJob:
+    def __init__(self, args, pdb, index, nstruct, offset):
+        self.pdb = pdb
+        self.index = index
+        self.nstruct = nstruct
+        self.offset = offset
+        self.seed = args.seed + index
+        stem = os.path.splitext(os.path.basename(pdb))[0]
+        self.workdir = os.path.join(args.shard_root, stem, f"s{index:02d}")
+
+    def command(self, args, workdir=None, seed=None):
+        cmd = [args.app, "-s", self.pdb] + shlex.split(args.flags) + [
+            "-nstruct", str(self.nstruct),
+            "-run:constant_seed", "-run:jran", str(seed or self.seed),
+            "-mute", "all",
+            "-out:path:all", workdir or self.workdir,
+            "-overwrite",
+        ]
+        if args.suffix:
+            cmd += ["-out:suffix", args.suffix]
+        if args.silent:
+            cmd += ["-out:file:silent", os.path.basename(silent_name(args, self.pdb))]
+        return cmd
+
+    def run(self, args, workdir=None, cancel=None):
+        """在 workdir（缺省为本分片目录）中运行；失败重试时换用新的随机种子"""
+        workdir = workdir or self.workdir
+        stem = os.path.splitext(os.path.basename(self.pdb))[0]
+        stage = os.path.basename(args.app).split(".")[0]
+        # 同一程序不同参数（如是否 -ex1 -ex2）的内存峰值分开估计
+        mem_key = f"{stage}:{hashlib.sha1(args.flags.encode()).hexdigest()[:8]}"
+
+        def reseed(attempt):
+            shutil.rmtree(workdir, ignore_errors=True)
+            os.makedirs(workdir)
+            return self.command(args, workdir, seed=self.seed + RESEED_STEP * attempt)
+
+        with open(args.log_out, "a") as out, open(args.log_err, "a") as err:
+            return job_trace.call(reseed(0), stage=stage,
+                                  mutant=job_trace.default_mutant() or stem,
+                                  extra={"shard": self.index, "nstruct": self.nstruct},
+                                  mem_key=mem_key, reseed=reseed, cancel=cancel,
+                                  stdout=out, stderr=err)
+
+
+def run_jobs(args, jobs):
+    """运行一批分片，返回 {分片: 退出码}
+
+    开启 --speculate 时，队列已空且有空闲线程，而某分片的运行时间超过已完成分片中位数的
+    --straggler-factor 倍，就在另一目录用相同种子启动它的副本；先成功的副本被采用，
+    另一个被终止。两个副本的输出相同，合并结果不受哪个副本胜出影响。
+    """
+    codes, durations = {}, []
+    pending = list(jobs)
+    running = {}  # future -> (分片, 工作目录, 取消事件, 启动时间)
+    with ThreadPoolExecutor(args.threads) as pool:
+        def launch(job, workdir):
+            cancel = threading.Event()
+            future = pool.submit(job.run, args, workdir, cancel)
+            running[future] = (job, workdir, cancel, time.time())
+
+        while pending or running:
+            while pending and len(running) < args.threads:
+                launch(pending.pop(0), None)
+            done, _ = wait(running, timeout=SPECULATE_POLL, return_when=FIRST_COMPLETED)
+            for future in done:
+                job, workdir, _, started = running.pop(future)
+                rc = future.result()
+                if codes.get(job) == 0:
+                    # 另一个副本已胜出，清理被终止副本的目录
+                    if workdir and workdir != job.workdir:
+                        shutil.rmtree(workdir, ignore_errors=True)
+                    continue
+                copies = [v for v in running.values() if v[0] is job]
+                if rc == 0:
+                    codes[job] = 0
+                    durations.append(time.time() - started)
+                    if workdir:
+                        job.workdir = workdir
+                    for _, _, cancel, _ in copies:
+                        cancel.set()
+                elif not copies:
+                    codes[job] = rc
+
+            if not (args.speculate and durations and not pending):
+                continue
+            limit = max(SPECULATE_MIN_AGE, args.straggler_factor * statistics.median(durations))
+            now = time.time()
+            for job, workdir, _, started in list(running.values()):
+                if len(running) >= args.threads:
+                    break
+                if workdir is None and job not in codes and now - started > limit \
+                        and sum(1 for v in running.values() if v[0] is job) == 1:
+                    print(f"  [SPECULATE] {os.path.basename(job.pdb)} 分片 {job.index} "
+                          f"已运行 {now - started:.0f}s，启动副本", flush=True)
+                    launch(job, f"{job.workdir}.spec")
+    return codes
+
+
+def tag_source(args, job):
+    """分片中记录构象标签与分数的文件：静默文件或打分文件"""
+    if args.silent:
+        return os.path.join(job.workdir, os.path.basename(silent_name(args, job.pdb)))
+    scorefiles = sorted(f for f in os.listdir(job.workdir) if f.endswith(".sc"))
+    return os.path.join(job.workdir, scorefiles[0]) if scorefiles else None
+
+
+def silent_name(args, pdb):
+    stem = os.path.splitext(os.path.basename(pdb))[0]
+    return os.path.join(args.outdir, args.silent.replace("{name}", stem))
+
+
+def best_tags(args, jobs, k):
+    """所有分片中总分最低的 k 个构象（新标签）"""
+    scores = {}
+    for job in jobs:
+        source = tag_source(args, job)
+        if source and os.path.isfile(source):
+            scores.update({renumber(t, job.offset): s for t, s in read_scores(source).items()})
+    ranked = sorted((s, t) for t, s in scores.items() if s == s)
+    return {t for _, t in ranked[:k]}
+
+
+def merge_shards(args, pdb, jobs):
+    """合并一个输入的所有分片：改写构象编号、合并打分/静默文件、移动结构文件
+
+    --keep k 时只写回总分最低的 k 个构象，打分文件保留全部构象的分数。
+    """
+    keep = best_tags(args, jobs, args.keep) if args.keep else None
+    score_sources, silent_sources = {}, []
+    for job in jobs:
+        files = sorted(os.listdir(job.workdir))
+        scorefiles = [f for f in files if f.endswith(".sc")]
+        silent = os.path.basename(silent_name(args, pdb)) if args.silent else None
+        source = tag_source(args, job)
+        tags = {}
+        if source and os.path.isfile(source):
+            tags = {t: renumber(t, job.offset) for t in read_tags(source)}
+        for name in scorefiles:
+            score_sources.setdefault(name, []).append((os.path.join(job.workdir, name), tags))
+        if silent:
+            silent_sources.append((os.path.join(job.workdir, silent), tags))
+        for name in files:
+            stem, ext = os.path.splitext(name)
+            if ext == ".pdb" and (keep is None or tags.get(stem, stem) in keep):
+                # 暂存目录与 outdir 可能不在同一文件系统
+                shutil.move(os.path.join(job.workdir, name),
+                            os.path.join(args.outdir, tags.get(stem, stem) + ext))
+
+    for name, sources in score_sources.items():
+        merge_text(sources, os.path.join(args.outdir, name))
+    if silent_sources:
+        merge_text(silent_sources, silent_name(args, pdb), keep)
+        if keep is not None:
+            merge_text(silent_sources, os.path.splitext(silent_name(args, pdb))[0] + ".sc", scores_only=True)
+    shard_root = os.path.dirname(jobs[0].workdir)
+    shutil.rmtree(shard_root, ignore_errors=True)
+    try:
+        os.rmdir(os.path.dirname(shard_root))
+    except OSError:
+        pass
+
+
+class Sampling:
+    """一个输入的采样进度：已提交的分片、每批后的最优分数与收敛状态"""
+
+    def __init__(self, pdb):
+        self.pdb = pdb
+        self.jobs = []
+        self.decoys = 0
+        self.best_history = []
+        self.scores = []
+        self.converged = False
+        self.failed = False
+
+    def add_batch(self, args, n, shards):
+        new = []
+        for size in split_nstruct(n, shards):
+            job = ShardJob(args, self.pdb, len(self.jobs), size, self.decoys)
+            self.jobs.append(job)
+            self.decoys += size
+            new.append(job)
+        return new
+
+    def update(self, args, jobs):
+        for job in jobs:
+            source = tag_source(args, job)
+            if source and os.path.isfile(source):
+                self.scores.extend(v for v in read_scores(source).values() if v == v)
+        if self.scores:
+            self.best_history.append(min(self.scores))
+
+    def top_spread(self, k):
+        top = sorted(self.scores)[:k]
+        return top[-1] - top[0] if top else float("nan")
+
+    def check(self, args):
+        """最优总分在最近一批中的改进不超过 tol，且前 k 个分数的离散度不超过 spread 时收敛"""
+        if len(self.scores) < max(args.min_decoys, args.top_k) or len(self.best_history) < 2:
+            return False
+        improvement = self.best_history[-2] - self.best_history[-1]
+        return improvement <= args.tol and self.top_spread(args.top_k) <= args.spread
+
+
+def write_report(path, samples, args):
+    """按输入更新采样报告（TSV），保留此前运行中其它输入的记录
+
+    多个进程可能同时更新同一份报告：读-改-写在同目录 .<报告名>.lock 的排他锁内完成，
+    临时文件名唯一，改名后其它进程读到的总是完整的报告
+    """
+    header = ["name", "decoys", "cap", "rounds", "best", f"top{args.top_k}_spread", "status"]
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f".{os.path.basename(path)}.lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            rows = {}
+            if os.path.isfile(path):
+                with open(path) as f:
+                    lines = [line.rstrip("\n").split("\t") for line in f if line.strip()]
+                rows = {cols[0]: cols for cols in lines[1:]}
+            for sample in samples:
+                name = os.path.splitext(os.path.basename(sample.pdb))[0]
+                status = "failed" if sample.failed else ("converged" if sample.converged else "cap")
+                best = f"{sample.best_history[-1]:.3f}" if sample.best_history else "nan"
+                rows[name] = [name, str(sample.decoys), str(args.nstruct), str(len(sample.best_history)),
+                              best, f"{sample.top_spread(args.top_k):.3f}", status]
+            fd, tmp = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, "w") as f:
+                    f.write("\t".join(header) + "\n")
+                    for name in sorted(rows):
+                        f.write("\t".join(rows[name]) + "\n")
+                os.chmod(tmp, 0o644)
+                os.replace(tmp, path)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def run(args):
+    if args.inputs == "-":
+        inputs = [line.strip() for line in sys.stdin if line.strip()]
+    else:
+        with open(args.inputs) as f:
+            inputs = [line.strip() for line in f if line.strip()]
+    if not inputs:
+        return 0
+    os.makedirs(args.outdir, exist_ok=True)
+    if scratch.enabled():
+        args.shard_root = scratch.mkdtemp("trim_shards.", args.outdir)
+    else:
+        args.shard_root = os.path.join(args.outdir, ".shards")
+    try:
+        return sample_and_merge(args, inputs)
+    finally:
+        if scratch.enabled():
+            shutil.rmtree(args.shard_root, ignore_errors=True)
+
+
+def sample_and_merge(args, inputs):
+    samples = [Sampling(pdb) for pdb in inputs]
+    batch = args.batch or args.nstruct
+    while True:
+        active = [s for s in samples if not (s.converged or s.failed) and s.decoys < args.nstruct]
+        if not active:
+            break
+        n = min(batch, args.nstruct - min(s.decoys for s in active))
+        per_input = shards_per_input(len(active), args.threads, n)
+        round_jobs = {s: s.add_batch(args, min(n, args.nstruct - s.decoys), per_input) for s in active}
+        print(f"  [SHARD] {len(active)} 个输入 × {per_input} 个分片，每个输入 {n} 个构象"
+              f"（上限 {args.nstruct}，并行 {args.threads}）", flush=True)
+
+        codes = run_jobs(args, [job for jobs in round_jobs.values() for job in jobs])
+        for sample, jobs in round_jobs.items():
+            if any(codes[job] != 0 for job in jobs):
+                sample.failed = True
+                continue
+            sample.update(args, jobs)
+            if args.batch:
+                sample.converged = sample.check(args)
+
+    failed = 0
+    for sample in samples:
+        name = os.path.basename(sample.pdb)
+        if sample.failed:
+            print(f"  [FAILED] {name}", flush=True)
+            failed += 1
+            continue
+        merge_shards(args, sample.pdb, sample.jobs)
+        note = "（已收敛）" if sample.converged else ""
+        print(f"  [MERGED] {name}: {sample.decoys} 个构象，{len(sample.jobs)} 个分片{note}", flush=True)
+    if args.report:
+        write_report(args.report, samples, args)
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按分片并行运行 Rosetta 并合并构象")
+    parser.add_argument("--app", required=True, help="Rosetta 可执行文件（relax / docking_protocol 等）")
+    parser.add_argument("--flags", required=True, help="协议参数（不含 -nstruct，需写成 --flags=\"...\"）")
+    parser.add_argument("--nstruct", type=int, required=True, help="每个输入的总构象数（自适应采样时为上限）")
+    parser.add_argument("--threads", type=int, default=os.cpu_count(), help="并行进程数")
+    parser.add_argument("--seed", type=int, default=1111, help="第一个分片的随机种子，其余依次加一")
+    parser.add_argument("--outdir", required=True, help="输出目录")
+    parser.add_argument("--suffix", default="", help="-out:suffix（如 _relax）")
+    parser.add_argument("--silent", default="", help="静默文件名模板，如 {name}_dock.out（不指定则输出 PDB）")
+    parser.add_argument("--inputs", default="-", help="输入结构列表文件，每行一个（默认读取标准输入）")
+    parser.add_argument("--batch", type=int, default=0, help="自适应采样每批构象数（0 表示一次生成 nstruct 个）")
+    parser.add_argument("--min-decoys", type=int, default=0, help="自适应采样判断收敛前的最少构象数")
+    parser.add_argument("--top-k", type=int, default=5, help="计算分数离散度的最优构象数")
+    parser.add_argument("--tol", type=float, default=0.5, help="最近一批最优总分改进不超过该值（REU）视为收敛")
+    parser.add_argument("--spread", type=float, default=2.0, help="前 k 个构象分数极差不超过该值（REU）视为收敛")
+    parser.add_argument("--speculate", action="store_true", default=os.environ.get("TRIM_SPECULATE") == "1",
+                        help="为落后的分片在空闲线程上启动相同种子的副本（缺省取 TRIM_SPECULATE）")
+    parser.add_argument("--straggler-factor", type=float, default=1.5,
+                        help="运行时间超过已完成分片中位数的该倍数视为落后")
+    parser.add_argument("--keep", type=int, default=0,
+                        help="只写回总分最低的 k 个构象（0 表示全部），打分文件保留全部构象的分数")
+    parser.add_argument("--report", help="每个输入实际采样构象数的报告（TSV）")
+    parser.add_argument("--log-out", default=os.devnull, help="Rosetta 标准输出日志")
+    parser.add_argument("--log-err", default=os.devnull, help="Rosetta 错误日志")
+    args = parser.parse_args()
+
+    if run(args):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+节点本地暂存目录
+
+TRIM_STAGING=1 时，分片采样、InterfaceAnalyzer 批次、PLIP 等任务在节点本地目录
+（TRIM_SCRATCH，缺省为运行节点的 $TMPDIR 或 /tmp）中运行，只把下游需要的结果
+（合并后的打分、最优构象、每个结构的打分片段等）写回共享文件系统上的 out/，
+其余中间文件随暂存目录一起删除，避免大量小文件读写压垮共享存储的元数据服务。
+未开启时各工具仍在 out/ 下的原位置运行。
+"""
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+
+def enabled():
+    return os.environ.get("TRIM_STAGING") == "1"
+
+
+def root():
+    """暂存根目录：在运行任务的节点上解析（SLURM 各节点的 $TMPDIR 不同）"""
+    return os.environ.get("TRIM_SCRATCH") or os.environ.get("TMPDIR") or tempfile.gettempdir()
+
+
+def mkdtemp(prefix, fallback):
+    """开启暂存时在本地创建临时目录，否则在 fallback（共享目录）下创建"""
+    base = root() if enabled() else fallback
+    os.makedirs(base, exist_ok=True)
+    return tempfile.mkdtemp(prefix=prefix, dir=base)
+
+
+@contextmanager
+def workspace(prefix, fallback):
+    """with 块结束时删除的临时工作目录"""
+    path = mkdtemp(prefix, fallback)
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
@@ -64,4 +64,113 @@ NATRO
 start
 ${resi} ${chain} PIKAA ${aa}
 EOF
-}
\ No newline at end of file
+}
+
+# 判断步骤编号是否在执行范围内（如 "1-9"、"1-2"、"3,5,7-9"）
+step_enabled() {
+    local step=$1
+    local spec=${2:-1-9}
+    local item
+
+    IFS=',' read -ra items <<< "$spec"
+    for item in "${items[@]}"; do
+        if [[ "$item" == *-* ]]; then
+            (( step >= ${item%-*} && step <= ${item#*-} )) && return 0
+        else
+            (( step == item )) && return 0
+        fi
+    done
+    return 1
+}
+
+# 断点续跑：完成标记为输出文件的 sha256 清单（sha256sum 格式，绝对路径），
+# 标记存在且所有输出校验一致才视为该单元已完成
+unit_done() {
+    local marker=$1
+    [[ -s "$marker" ]] && sha256sum --check --status "$marker" 2>/dev/null
+}
+
+# 原子写入完成标记：先写临时文件再改名，进程中途被杀不会留下半个标记
+mark_done() {
+    local marker=$1
+    shift
+    local files=()
+    local f
+    for f in "$@"; do
+        [[ -f "$f" ]] || return 1
+        files+=("$(readlink -f "$f")")
+    done
+    (( ${#files[@]} > 0 )) || return 1
+    mkdir -p "$(dirname "$marker")"
+    sha256sum "${files[@]}" > "${marker}.tmp.$$" && mv -f "${marker}.tmp.$$" "$marker"
+}
+
+export -f unit_done mark_done
+
+# 结果缓存（TRIM_CACHE_DIR 为空时关闭），供 xargs 子进程调用
+TRIM_HOME="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+export TRIM_HOME
+
+# 软件版本指纹（缓存键的一部分）
+tool_version() {
+    [[ -n "$TRIM_CACHE_DIR" ]] || return 0
+    python "$TRIM_HOME/tools/result_cache.py" version "$1"
+}
+
+# cache_key -i <输入文件> ... -t <标签> ...
+cache_key() {
+    [[ -n "$TRIM_CACHE_DIR" ]] || return 0
+    python "$TRIM_HOME/tools/result_cache.py" key "$@"
+}
+
+# cache_fetch <键> <目标目录>：命中返回 0
+cache_fetch() {
+    [[ -n "$TRIM_CACHE_DIR" && -n "$1" ]] || return 1
+    python "$TRIM_HOME/tools/result_cache.py" get "$1" "$2" 2>/dev/null
+}
+
+# cache_store <键> <文件...>
+cache_store() {
+    [[ -n "$TRIM_CACHE_DIR" && -n "$1" ]] || return 0
+    python "$TRIM_HOME/tools/result_cache.py" put "$@"
+}
+
+export -f tool_version cache_key cache_fetch cache_store
+
+# 资源记录：traced <阶段> <命令...>，TRIM_TRACE 非空时经 job_trace.py 运行并追加一条 JSONL 记录
+# （墙钟/CPU 时间、峰值内存、退出码），突变体取自环境变量 TRIM_MUTANT；
+# TRIM_MEM_BUDGET 非空时同时按阶段的历史内存峰值准入（mem_gate.py）；
+# 按 TRIM_JOB_TIMEOUT 限时、失败后重试 TRIM_JOB_RETRIES 次，最终失败写入失败清单 TRIM_FAILURES
+traced() {
+    local stage=$1
+    shift
+    if [[ -n "$TRIM_TRACE$TRIM_MEM_BUDGET$TRIM_JOB_TIMEOUT" || "${TRIM_JOB_RETRIES:-0}" != "0" ]]; then
+        python "$TRIM_HOME/tools/job_trace.py" run --stage "$stage" --mem-key "$stage" -- "$@"
+    else
+        "$@"
+    fi
+}
+
+# record_failure <阶段> <原因>：Shell 中检测到的失败（如程序未产生输出）写入失败清单
+record_failure() {
+    if [[ -n "$TRIM_FAILURES" ]]; then
+        python "$TRIM_HOME/tools/job_trace.py" fail --stage "$1" --reason "$2"
+    else
+        echo "  [FAILED] $1 ${TRIM_MUTANT:--}: $2" >&2
+    fi
+}
+
+export -f traced record_failure
+
+# scratch_dir <前缀> [共享目录]：TRIM_STAGING=1 时在节点本地暂存目录（TRIM_SCRATCH，缺省 $TMPDIR）
+# 创建临时目录并输出其路径；未开启时在给出的共享目录下创建，未给出则不输出（调用方沿用原目录）
+scratch_dir() {
+    if [[ "${TRIM_STAGING:-0}" == "1" ]]; then
+        local base="${TRIM_SCRATCH:-${TMPDIR:-/tmp}}"
+        mkdir -p "$base" && mktemp -d "$base/trim_$1.XXXXXX"
+    elif [[ -n "$2" ]]; then
+        mkdir -p "$2" && mktemp -d "$2/.trim_$1.XXXXXX"
+    fi
+}
+
+export -f scratch_dir